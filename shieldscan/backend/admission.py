@@ -0,0 +1,152 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import AsyncSessionLocal
+import models.db
+from telemetry import Gauge
+
+# Scans running at once in this process; beyond it new scans are refused instead of queued
+SCAN_MAX_IN_FLIGHT = int(os.environ.get("SCAN_MAX_IN_FLIGHT", "50"))
+# Per-client token buckets: scans per minute (sustained) and burst size, by tier
+FREE_SCANS_PER_MINUTE = float(os.environ.get("SCAN_RATE_FREE_PER_MINUTE", "6"))
+FREE_BURST = float(os.environ.get("SCAN_BURST_FREE", "3"))
+PREMIUM_SCANS_PER_MINUTE = float(os.environ.get("SCAN_RATE_PREMIUM_PER_MINUTE", "60"))
+PREMIUM_BURST = float(os.environ.get("SCAN_BURST_PREMIUM", "20"))
+# Batch jobs per client: how many may run at once, and URLs per day (sustained and burst), by tier
+BATCH_JOBS_FREE = int(os.environ.get("BATCH_JOBS_FREE", "1"))
+BATCH_JOBS_PREMIUM = int(os.environ.get("BATCH_JOBS_PREMIUM", "3"))
+BATCH_URLS_PER_DAY_FREE = float(os.environ.get("BATCH_URLS_PER_DAY_FREE", "50"))
+BATCH_URLS_PER_DAY_PREMIUM = float(os.environ.get("BATCH_URLS_PER_DAY_PREMIUM", "5000"))
+# Number of trusted proxies in front of the API (render.yaml sets 1 for Render's load balancer).
+# Behind a proxy the socket peer is the proxy, so without this every guest shares one IP bucket
+# and a single busy visitor gets the whole site 429s. It stays 0 by default because a client that
+# reaches uvicorn directly could otherwise pick its own bucket by sending X-Forwarded-For.
+TRUSTED_PROXIES = int(os.environ.get("ADMISSION_TRUST_FORWARDED", "0"))
+MAX_CLIENTS = 100000
+USER_CACHE_SECONDS = 60
+
+class AdmissionController:
+    """
+    Fail-fast admission for scans: 503 when SCAN_MAX_IN_FLIGHT scans are already running,
+    429 when the client has used up its bucket. Both carry Retry-After.
+
+    Batch jobs are admitted as a whole (acquire_batch): a cap on the client's running jobs
+    and a daily URL bucket. Their scans then count towards SCAN_MAX_IN_FLIGHT while they run.
+    """
+
+    def __init__(self, max_in_flight: int = SCAN_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict() # client -> (tokens, updated)
+        self._batch_buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict() # client -> (URLs, updated)
+        self._batch_jobs: Dict[str, int] = {} # client -> running batch jobs
+        self._users: "OrderedDict[str, Tuple[float, Tuple[int, bool]]]" = OrderedDict() # auth id -> (expires, user)
+
+    def _check_capacity(self):
+        if self.in_flight >= self.max_in_flight:
+            raise HTTPException(status_code=503, detail="Scanner is at capacity, try again shortly",
+                                headers={"Retry-After": "2"})
+
+    @staticmethod
+    def _take(buckets: "OrderedDict[str, Tuple[float, float]]", client: str, cost: float,
+              rate: float, burst: float, detail: str):
+        """Takes `cost` tokens from the client's bucket (refilled at `rate` per second), or raises 429."""
+        now = time.monotonic()
+        tokens, updated = buckets.get(client, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens < cost:
+            buckets[client] = (tokens, now)
+            retry_after = math.ceil((cost - tokens) / rate)
+            raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(retry_after)})
+        buckets[client] = (tokens - cost, now)
+        buckets.move_to_end(client)
+        while len(buckets) > MAX_CLIENTS:
+            buckets.popitem(last=False)
+
+    def acquire(self, client: str, premium: bool = False) -> Callable[[], None]:
+        """Admits one scan or raises HTTPException; call the returned function when the scan ends."""
+        self._check_capacity()
+        per_minute, burst = (PREMIUM_SCANS_PER_MINUTE, PREMIUM_BURST) if premium else (FREE_SCANS_PER_MINUTE, FREE_BURST)
+        self._take(self._buckets, client, 1, per_minute / 60, burst, "Too many scans, slow down")
+        return self.occupy()
+
+    def occupy(self) -> Callable[[], None]:
+        """Counts an already admitted scan (e.g. one of a batch job) as in flight until released."""
+        self.in_flight += 1
+        released = False
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+        return release
+
+    def acquire_batch(self, client: str, urls: int, premium: bool = False) -> Callable[[], None]:
+        """
+        Admits a batch job of `urls` URLs or raises HTTPException: 413 above the tier's daily
+        URL budget, 429 when the client already runs its maximum of jobs or has too few URLs
+        left today. Call the returned function when the job ends.
+        """
+        self._check_capacity()
+        max_jobs, per_day = (BATCH_JOBS_PREMIUM, BATCH_URLS_PER_DAY_PREMIUM) if premium else (BATCH_JOBS_FREE, BATCH_URLS_PER_DAY_FREE)
+        if urls > per_day:
+            raise HTTPException(status_code=413, detail=f"A batch can hold at most {int(per_day)} URLs on your plan")
+        if self._batch_jobs.get(client, 0) >= max_jobs:
+            raise HTTPException(status_code=429, detail=f"At most {max_jobs} batch jobs can run at once, wait for one to finish",
+                                headers={"Retry-After": "60"})
+        self._take(self._batch_buckets, client, urls, per_day / 86400, per_day, "Daily batch URL budget used up")
+
+        self._batch_jobs[client] = self._batch_jobs.get(client, 0) + 1
+        released = False
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._batch_jobs[client] -= 1
+                if not self._batch_jobs[client]:
+                    del self._batch_jobs[client]
+        return release
+
+    async def lookup_user(self, auth_id: str) -> Tuple[int, bool]:
+        """
+        (User.id, User.is_premium) for a verified Supabase user id (stored in users.clerk_id),
+        cached for a minute. The row is created on the user's first request.
+        """
+        now = time.monotonic()
+        cached = self._users.get(auth_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        User = models.db.User
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(select(User.id, User.is_premium).where(User.clerk_id == auth_id))).first()
+            if row is None:
+                insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+                await db.execute(insert(User).values(clerk_id=auth_id).on_conflict_do_nothing(index_elements=["clerk_id"]))
+                await db.commit()
+                row = (await db.execute(select(User.id, User.is_premium).where(User.clerk_id == auth_id))).first()
+        user = (row.id, bool(row.is_premium))
+        self._users[auth_id] = (now + USER_CACHE_SECONDS, user)
+        while len(self._users) > MAX_CLIENTS:
+            self._users.popitem(last=False)
+        return user
+
+def client_ip(request: Request) -> str:
+    if TRUSTED_PROXIES:
+        # Each proxy appends the address it saw, so the entry our outermost proxy added is the
+        # TRUSTED_PROXIES-th from the right; anything left of it is whatever the client sent
+        forwarded = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if forwarded:
+            return forwarded[-min(TRUSTED_PROXIES, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+admission = AdmissionController()
+
+Gauge("shieldscan_scans_in_flight", "Scans admitted and still running", lambda: admission.in_flight)
+Gauge("shieldscan_scans_in_flight_limit", "SCAN_MAX_IN_FLIGHT", lambda: admission.max_in_flight)
@@ -0,0 +1,134 @@
+"""
+Trend statistics maintained as scans are written, so reading them never touches scan_history.
+
+Every domain counts once, with its latest scan: domain_scores keeps that scan's score,
+grade and issue keys, and issue_prevalence / grade_counts count domains per issue key and
+per grade. Recording a scan moves the counters by its difference to the domain's previous
+latest scan, in the same transaction as the scan row.
+
+    python migrate.py --rebuild-aggregates   # recompute everything from the stored scans
+"""
+from collections import Counter
+from typing import Iterable, List
+from urllib.parse import urlparse
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models.db import DomainScore, GradeCount, IssuePrevalence, ScanHistory, ScanIssue
+
+def domain_of(url: str) -> str:
+    return (urlparse(url or "").hostname or url or "").lower()
+
+def scan_facts(scan: ScanHistory) -> dict:
+    """What the aggregates need from a scan row that has just been flushed."""
+    return {
+        "id": scan.id,
+        "domain": domain_of(scan.target_url),
+        "score": scan.score,
+        "grade": scan.grade,
+        "issue_keys": sorted({issue.issue_key for issue in scan.issues if issue.issue_key}),
+    }
+
+def _upsert(session: Session, model):
+    # INSERT ... ON CONFLICT is spelled the same way on both databases we run on
+    dialect = session.get_bind().dialect.name
+    return (postgresql.insert if dialect == "postgresql" else sqlite.insert)(model)
+
+def record_scans(session: Session, scans: Iterable[dict]):
+    """
+    Applies scan_facts() dicts to the aggregates. A scan older than the domain's recorded
+    one (two scans of a domain finishing out of order) changes nothing; the same scan
+    again (re-scored) replaces its own contribution.
+    """
+    issue_deltas, grade_deltas = Counter(), Counter()
+    for facts in sorted(scans, key=lambda facts: facts["id"]):
+        domain = facts["domain"]
+        values = {key: facts[key] for key in ("score", "grade", "issue_keys")}
+        current = session.execute(
+            select(DomainScore.scan_id, DomainScore.grade, DomainScore.issue_keys)
+            .where(DomainScore.domain == domain).with_for_update()
+        ).first()
+        if current is None:
+            inserted = session.execute(
+                _upsert(session, DomainScore).values(domain=domain, scan_id=facts["id"], **values)
+                .on_conflict_do_nothing(index_elements=["domain"])
+            )
+            if inserted.rowcount:
+                old_grade, old_keys = None, set()
+            else:
+                # Another transaction recorded this domain first; wait for it and take its row
+                current = session.execute(
+                    select(DomainScore.scan_id, DomainScore.grade, DomainScore.issue_keys)
+                    .where(DomainScore.domain == domain).with_for_update()
+                ).first()
+        if current is not None:
+            if current.scan_id > facts["id"]:
+                continue
+            session.execute(update(DomainScore).where(DomainScore.domain == domain)
+                            .values(scan_id=facts["id"], **values))
+            old_grade, old_keys = current.grade, set(current.issue_keys or [])
+
+        new_keys = set(facts["issue_keys"])
+        for key in new_keys - old_keys:
+            issue_deltas[key] += 1
+        for key in old_keys - new_keys:
+            issue_deltas[key] -= 1
+        if old_grade != facts["grade"]:
+            if old_grade is not None:
+                grade_deltas[old_grade] -= 1
+            grade_deltas[facts["grade"]] += 1
+
+    # Counter rows are touched in key order, so concurrent writers cannot deadlock on them
+    for model, column, deltas in ((IssuePrevalence, "issue_key", issue_deltas), (GradeCount, "grade", grade_deltas)):
+        for key in sorted(key for key, delta in deltas.items() if delta):
+            session.execute(
+                _upsert(session, model).values(**{column: key}, sites=deltas[key])
+                .on_conflict_do_update(index_elements=[column], set_={"sites": model.sites + deltas[key]})
+            )
+
+def rebuild(session: Session, batch_size: int = 5000) -> int:
+    """
+    Recomputes all aggregates from scan_history (the latest scan of each domain) and its
+    scan_issues rows, in keyset batches by id. Returns the number of domains.
+    """
+    latest = {} # domain -> (id, score, grade)
+    last_id = 0
+    while True:
+        rows = session.execute(
+            select(ScanHistory.id, ScanHistory.target_url, ScanHistory.score, ScanHistory.grade)
+            .where(ScanHistory.id > last_id).order_by(ScanHistory.id).limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        for row in rows:
+            latest[domain_of(row.target_url)] = (row.id, row.score, row.grade)
+        last_id = rows[-1].id
+
+    keys_by_scan = {}
+    scan_ids: List[int] = sorted(scan_id for scan_id, _, _ in latest.values())
+    for start in range(0, len(scan_ids), batch_size):
+        chunk = scan_ids[start:start + batch_size]
+        for scan_id, issue_key in session.execute(
+            select(ScanIssue.scan_id, ScanIssue.issue_key).where(ScanIssue.scan_id.in_(chunk))
+        ):
+            if issue_key:
+                keys_by_scan.setdefault(scan_id, set()).add(issue_key)
+
+    for model in (DomainScore, IssuePrevalence, GradeCount):
+        session.execute(delete(model))
+    issues, grades = Counter(), Counter()
+    domain_rows = []
+    for domain, (scan_id, score, grade) in latest.items():
+        keys = sorted(keys_by_scan.get(scan_id, ()))
+        domain_rows.append({"domain": domain, "scan_id": scan_id, "score": score, "grade": grade, "issue_keys": keys})
+        issues.update(keys)
+        grades[grade] += 1
+    for start in range(0, len(domain_rows), batch_size):
+        session.execute(insert(DomainScore), domain_rows[start:start + batch_size])
+    if issues:
+        session.execute(insert(IssuePrevalence), [{"issue_key": key, "sites": sites} for key, sites in issues.items()])
+    if grades:
+        session.execute(insert(GradeCount), [{"grade": grade, "sites": sites} for grade, sites in grades.items()])
+    return len(latest)
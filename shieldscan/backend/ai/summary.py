@@ -1,32 +1,47 @@
 # pyre-ignore-all-errors
+import asyncio
+import hashlib
+import json
 import os
-from typing import List, Dict, Any
-import groq
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import List, Dict, Any, Optional
+
+from telemetry import timed
+
+# The LLM summary is generated off the request path, with one reused client and a hard timeout
+SUMMARY_TIMEOUT = float(os.getenv("GROQ_TIMEOUT_SECONDS", "10"))
+SUMMARY_CACHE_SIZE = 1024
+
+_client = None
+# Many scans produce the same issue set, so summaries are shared by (score, grade, issue keys)
+_summary_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def _get_client():
+    global _client
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key or api_key == "your-api-key":
+        return None
+    if _client is None:
+        # Imported on first use: the SDK is slow to import and unused without a key
+        import groq
+        _client = groq.AsyncGroq(api_key=api_key, timeout=SUMMARY_TIMEOUT, max_retries=1)
+    return _client
+
+def ai_summary_enabled() -> bool:
+    return _get_client() is not None
+
+def summary_cache_key(score: int, grade: str, issues: List[Dict[str, Any]]) -> str:
+    keys = sorted(i.get('key') or i.get('title') or '' for i in issues)
+    return hashlib.sha256(json.dumps([score, grade, keys]).encode()).hexdigest()
 
 def generate_summary(score: int, grade: str, issues: List[Dict[str, Any]]) -> str:
     """
     Hybrid AI Template for the WOW Moment.
+    Deterministic and instant; `generate_ai_summary` replaces it once the LLM answers.
     """
     critical_count = len([i for i in issues if i.get('difficulty') == 'Medium' or i.get('difficulty') == 'Advanced'])
-    
-    api_key = os.getenv("GROQ_API_KEY")
-    if api_key and api_key != "your-api-key":
-        try:
-            client = groq.Groq(api_key=api_key)
-            issues_text = "\n".join([f"- {i.get('title')}: {i.get('impact')}" for i in issues])
-            prompt = f"You are a professional security analyst. The user's website has been scanned and received a score of {score}/100 and a grade of {grade}. The following issues were found:\n{issues_text}\nWrite a short, professional, and directly addressed 2-3 sentence executive summary of these security results. Make it sound helpful but urgent."
-            
-            message = client.chat.completions.create(
-                model="llama3-8b-8192",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return message.choices[0].message.content
-        except Exception as e:
-            print("Groq API Error:", e)
 
-    # Fallback if no API key or API call failed
     summary = f"Your website scored a {score}/100 ({grade}). "
     
     if score >= 80:
@@ -38,118 +53,174 @@ def generate_summary(score: int, grade: str, issues: List[Dict[str, Any]]) -> st
         
     return summary
 
-def format_issue_texts(issue_key: str) -> dict:
+async def generate_ai_summary(score: int, grade: str, issues: List[Dict[str, Any]]) -> Optional[str]:
     """
-    Plain English Business Impact + Fix Difficulty + Exact Fix Snippet
+    LLM executive summary, or None when no API key is configured or the call fails or times out.
     """
-    templates = {
-        "missing_csp": {
-            "title": "Missing Content Security Policy",
-            "impact": "This allows attackers to inject malicious scripts that steal your visitors' data.",
-            "difficulty": "Easy",
-            "score_impact": 15,
-            "category": "Security Headers",
-            "fix_title": "Add CSP Header",
-            "fix_snippet": "add_header Content-Security-Policy \"default-src 'self'; script-src 'self' 'unsafe-inline';\"; # Nginx config snippet"
-        },
-        "missing_hsts": {
-            "title": "Missing HTTP Strict Transport Security (HSTS)",
-            "impact": "Attackers can intercept traffic by forcing users to use unencrypted HTTP connections.",
-            "difficulty": "Easy",
-            "score_impact": 10,
-            "category": "Security Headers",
-            "fix_title": "Configure HSTS",
-            "fix_snippet": "add_header Strict-Transport-Security \"max-age=31536000; includeSubDomains\" always; # Nginx config snippet"
-        },
-        "ssl_expiring": {
-            "title": "SSL Certificate Expiring Soon",
-            "impact": "In 14 days your site will show a security warning and visitors will leave.",
-            "difficulty": "Medium",
-            "score_impact": 20,
-            "category": "SSL and Encryption",
-            "fix_title": "Renew SSL",
-            "fix_snippet": "# Run certbot for Let's Encrypt\nsudo certbot renew --force-renewal"
-        },
-        "ssl_invalid": {
-            "title": "Invalid SSL Certificate",
-            "impact": "Browsers currently block users from visiting your site, throwing an 'Insecure' warning.",
-            "difficulty": "Medium",
-            "score_impact": 40,
-            "category": "SSL and Encryption",
-            "fix_title": "Install Valid SSL",
-            "fix_snippet": "# Install certbot to issue certificates\nsudo apt install certbot python3-certbot-nginx\nsudo certbot --nginx -d yourdomain.com"
-        },
-        "admin_exposed": {
-            "title": "Admin Panel Exposed",
-            "impact": "Anyone can attempt to brute-force their way into your admin account.",
-            "difficulty": "Medium",
-            "score_impact": 30,
-            "category": "Information Exposure",
-            "fix_title": "Restrict Admin Access",
-            "fix_snippet": "# Nginx: Restrict /admin to specific IPs\nlocation /admin {\n    allow 192.168.1.0/24;\n    deny all;\n}"
-        },
-        "sensitive_files": {
-            "title": "Sensitive Files Exposed",
-            "impact": "Hackers can read your .env file or config, stealing database passwords or API keys.",
-            "difficulty": "Easy",
-            "score_impact": 50,
-            "category": "Information Exposure",
-            "fix_title": "Block Dotfile Access",
-            "fix_snippet": "# Nginx: Deny access to hidden files\nlocation ~ /\\. {\n    deny all;\n    access_log off;\n    log_not_found off;\n}"
-        },
-        "missing_dmarc": {
-            "title": "Missing DMARC Record",
-            "impact": "Attackers can send emails pretending to be you and scam your customers.",
-            "difficulty": "Medium",
-            "score_impact": 15,
-            "category": "Email Security",
-            "fix_title": "Add DMARC Record",
-            "fix_snippet": "Type: TXT\nName: _dmarc.yourdomain.com\nValue: v=DMARC1; p=quarantine; rua=mailto:postmaster@yourdomain.com;"
-        },
-        "over_permissive_cors": {
-            "title": "Over-permissive CORS",
-            "impact": "Other websites can make requests to your site pretending to be your users.",
-            "difficulty": "Easy",
-            "score_impact": 20,
-            "category": "Vibe Coding Audit",
-            "fix_title": "Restrict CORS Origin",
-            "fix_snippet": "// Express.js: Restrict CORS\napp.use(cors({\n  origin: ['https://yourfrontend.com']\n}));"
-        },
-        "mcp_exposed": {
-            "title": "MCP Server Exposed",
-            "impact": "Your AI agent connection is publicly visible and can be hijacked.",
-            "difficulty": "Medium",
-            "score_impact": 35,
-            "category": "AI Security 2026",
-            "fix_title": "Block Public MCP Access",
-            "fix_snippet": "# Nginx: Deny access to MCP routes from outside\nlocation /mcp {\n    allow 127.0.0.1;\n    deny all;\n}"
-        },
-        "missing_x_frame": {
-            "title": "Missing X-Frame-Options",
-            "impact": "Attackers can trick users by embedding your site into a hidden iframe (Clickjacking).",
-            "difficulty": "Easy",
-            "score_impact": 10,
-            "category": "Security Headers",
-            "fix_title": "Add X-Frame-Options",
-            "fix_snippet": "add_header X-Frame-Options \"SAMEORIGIN\" always; # Nginx config snippet"
-        },
-        "weak_tls": {
-            "title": "Weak TLS Version Detected",
-            "impact": "Older encryption standards allow attackers to decrypt traffic between users and your site.",
-            "difficulty": "Medium",
-            "score_impact": 15,
-            "category": "SSL and Encryption",
-            "fix_title": "Disable TLS 1.0/1.1",
-            "fix_snippet": "# Nginx: Only allow TLS 1.2 and 1.3\nssl_protocols TLSv1.2 TLSv1.3;"
-        }
-    }
-    
-    return templates.get(issue_key, {
-        "title": "Unknown Vulnerability",
-        "impact": "This poses an undefined risk to your website.",
+    cache_key = summary_cache_key(score, grade, issues)
+    cached = _summary_cache.get(cache_key)
+    if cached is not None:
+        _summary_cache.move_to_end(cache_key)
+        return cached
+
+    client = _get_client()
+    if client is None:
+        return None
+    try:
+        issues_text = "\n".join([f"- {i.get('title')}: {i.get('impact')}" for i in issues])
+        prompt = f"You are a professional security analyst. The user's website has been scanned and received a score of {score}/100 and a grade of {grade}. The following issues were found:\n{issues_text}\nWrite a short, professional, and directly addressed 2-3 sentence executive summary of these security results. Make it sound helpful but urgent."
+
+        with timed("ai_summary"):
+            message = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model="llama3-8b-8192",
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ]
+                ),
+                timeout=SUMMARY_TIMEOUT
+            )
+        summary = message.choices[0].message.content
+    except Exception as e:
+        print("Groq API Error:", str(e) or type(e).__name__)
+        return None
+
+    _summary_cache[cache_key] = summary
+    if len(_summary_cache) > SUMMARY_CACHE_SIZE:
+        _summary_cache.popitem(last=False)
+    return summary
+
+_ISSUE_TEMPLATES = {
+    "missing_csp": {
+        "title": "Missing Content Security Policy",
+        "impact": "This allows attackers to inject malicious scripts that steal your visitors' data.",
+        "difficulty": "Easy",
+        "score_impact": 15,
+        "category": "Security Headers",
+        "fix_title": "Add CSP Header",
+        "fix_snippet": "add_header Content-Security-Policy \"default-src 'self'; script-src 'self' 'unsafe-inline';\"; # Nginx config snippet"
+    },
+    "missing_hsts": {
+        "title": "Missing HTTP Strict Transport Security (HSTS)",
+        "impact": "Attackers can intercept traffic by forcing users to use unencrypted HTTP connections.",
+        "difficulty": "Easy",
+        "score_impact": 10,
+        "category": "Security Headers",
+        "fix_title": "Configure HSTS",
+        "fix_snippet": "add_header Strict-Transport-Security \"max-age=31536000; includeSubDomains\" always; # Nginx config snippet"
+    },
+    "ssl_expiring": {
+        "title": "SSL Certificate Expiring Soon",
+        "impact": "In 14 days your site will show a security warning and visitors will leave.",
+        "difficulty": "Medium",
+        "score_impact": 20,
+        "category": "SSL and Encryption",
+        "fix_title": "Renew SSL",
+        "fix_snippet": "# Run certbot for Let's Encrypt\nsudo certbot renew --force-renewal"
+    },
+    "ssl_invalid": {
+        "title": "Invalid SSL Certificate",
+        "impact": "Browsers currently block users from visiting your site, throwing an 'Insecure' warning.",
+        "difficulty": "Medium",
+        "score_impact": 40,
+        "category": "SSL and Encryption",
+        "fix_title": "Install Valid SSL",
+        "fix_snippet": "# Install certbot to issue certificates\nsudo apt install certbot python3-certbot-nginx\nsudo certbot --nginx -d yourdomain.com"
+    },
+    "admin_exposed": {
+        "title": "Admin Panel Exposed",
+        "impact": "Anyone can attempt to brute-force their way into your admin account.",
+        "difficulty": "Medium",
+        "score_impact": 30,
+        "category": "Information Exposure",
+        "fix_title": "Restrict Admin Access",
+        "fix_snippet": "# Nginx: Restrict /admin to specific IPs\nlocation /admin {\n    allow 192.168.1.0/24;\n    deny all;\n}"
+    },
+    "sensitive_files": {
+        "title": "Sensitive Files Exposed",
+        "impact": "Hackers can read your .env file or config, stealing database passwords or API keys.",
+        "difficulty": "Easy",
+        "score_impact": 50,
+        "category": "Information Exposure",
+        "fix_title": "Block Dotfile Access",
+        "fix_snippet": "# Nginx: Deny access to hidden files\nlocation ~ /\\. {\n    deny all;\n    access_log off;\n    log_not_found off;\n}"
+    },
+    "missing_dmarc": {
+        "title": "Missing DMARC Record",
+        "impact": "Attackers can send emails pretending to be you and scam your customers.",
         "difficulty": "Medium",
-        "score_impact": 5,
-        "category": "General",
-        "fix_title": "Review Access Logs",
-        "fix_snippet": "Run a comprehensive audit or contact a security professional."
-    })
+        "score_impact": 15,
+        "category": "Email Security",
+        "fix_title": "Add DMARC Record",
+        "fix_snippet": "Type: TXT\nName: _dmarc.yourdomain.com\nValue: v=DMARC1; p=quarantine; rua=mailto:postmaster@yourdomain.com;"
+    },
+    "over_permissive_cors": {
+        "title": "Over-permissive CORS",
+        "impact": "Other websites can make requests to your site pretending to be your users.",
+        "difficulty": "Easy",
+        "score_impact": 20,
+        "category": "Vibe Coding Audit",
+        "fix_title": "Restrict CORS Origin",
+        "fix_snippet": "// Express.js: Restrict CORS\napp.use(cors({\n  origin: ['https://yourfrontend.com']\n}));"
+    },
+    "mcp_exposed": {
+        "title": "MCP Server Exposed",
+        "impact": "Your AI agent connection is publicly visible and can be hijacked.",
+        "difficulty": "Medium",
+        "score_impact": 35,
+        "category": "AI Security 2026",
+        "fix_title": "Block Public MCP Access",
+        "fix_snippet": "# Nginx: Deny access to MCP routes from outside\nlocation /mcp {\n    allow 127.0.0.1;\n    deny all;\n}"
+    },
+    "missing_x_frame": {
+        "title": "Missing X-Frame-Options",
+        "impact": "Attackers can trick users by embedding your site into a hidden iframe (Clickjacking).",
+        "difficulty": "Easy",
+        "score_impact": 10,
+        "category": "Security Headers",
+        "fix_title": "Add X-Frame-Options",
+        "fix_snippet": "add_header X-Frame-Options \"SAMEORIGIN\" always; # Nginx config snippet"
+    },
+    "weak_tls": {
+        "title": "Weak TLS Version Detected",
+        "impact": "Older encryption standards allow attackers to decrypt traffic between users and your site.",
+        "difficulty": "Medium",
+        "score_impact": 15,
+        "category": "SSL and Encryption",
+        "fix_title": "Disable TLS 1.0/1.1",
+        "fix_snippet": "# Nginx: Only allow TLS 1.2 and 1.3\nssl_protocols TLSv1.2 TLSv1.3;"
+    },
+    "weak_ciphers": {
+        "title": "Weak Cipher Suites Enabled",
+        "impact": "Broken ciphers like RC4 and 3DES let attackers recover parts of encrypted traffic.",
+        "difficulty": "Easy",
+        "score_impact": 10,
+        "category": "SSL and Encryption",
+        "fix_title": "Use Modern Ciphers Only",
+        "fix_snippet": "# Nginx: Forward-secret AEAD ciphers only\nssl_ciphers ECDHE+AESGCM:ECDHE+CHACHA20;\nssl_prefer_server_ciphers on;"
+    },
+    "weak_key": {
+        "title": "Weak Certificate Key",
+        "impact": "A short certificate key can be cracked, letting attackers impersonate your site.",
+        "difficulty": "Medium",
+        "score_impact": 15,
+        "category": "SSL and Encryption",
+        "fix_title": "Reissue With a Stronger Key",
+        "fix_snippet": "# Request a new certificate with an ECDSA P-256 key\nsudo certbot certonly --key-type ecdsa --elliptic-curve secp256r1 -d yourdomain.com"
+    },
+    "blacklisted": {
+        "title": "Listed on a Blocklist",
+        "impact": "Browsers, mail servers and security tools may block or flag your site for every visitor.",
+        "difficulty": "Advanced",
+        "score_impact": 30,
+        "category": "Reputation",
+        "fix_title": "Clean Up and Request Delisting",
+        "fix_snippet": "# 1. Find and remove the cause (malware, compromised accounts, open relays)\n# 2. Request removal from each list named in the report via its delisting form"
+    }
+}
+
+# Frozen, like the compiled rule table that copies from it (scoring/rules.py): read-only views, built once
+ISSUE_TEMPLATES = MappingProxyType({key: MappingProxyType(template) for key, template in _ISSUE_TEMPLATES.items()})
+
+# Reverse lookup for stored reports whose issues predate the `key` field
+ISSUE_KEYS_BY_TITLE = MappingProxyType({template["title"]: key for key, template in ISSUE_TEMPLATES.items()})
@@ -0,0 +1,131 @@
+"""
+Who is calling: the Supabase access token, verified here, names the user.
+
+The frontend signs in with Supabase Auth and sends the session's access token (a short-lived
+JWT) as `Authorization: Bearer <token>`. EventSource cannot set headers, so for the scan stream
+the frontend first trades the token for a stream ticket (POST /api/scan/stream/ticket): a random,
+single-use id that expires in seconds, so a URL that ends up in an access log is worthless.
+
+Keys come from SUPABASE_JWT_SECRET (the project's legacy HS256 secret) or, for projects on
+asymmetric signing keys, from SUPABASE_URL's JWKS (<SUPABASE_URL>/auth/v1/.well-known/jwks.json).
+Without either nobody is signed in and every caller is a guest.
+"""
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+import jwt
+from fastapi import HTTPException, Request
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "").rstrip("/")
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+# Supabase gives signed-in users' tokens this audience (anon keys are "anon", not a user)
+AUDIENCE = "authenticated"
+JWKS_CACHE_SECONDS = 3600
+# A token signed with an unknown key id refetches the key set at most this often
+JWKS_MIN_REFRESH_SECONDS = 60
+CLOCK_SKEW_SECONDS = 5
+STREAM_TICKET_SECONDS = 30
+MAX_TICKETS = 100000
+
+def bearer_token(request: Request) -> Optional[str]:
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip() or None
+    return None
+
+class SessionVerifier:
+    def __init__(self, jwt_secret: Optional[str] = SUPABASE_JWT_SECRET, supabase_url: str = SUPABASE_URL):
+        self.jwt_secret = jwt_secret
+        self.issuer = f"{supabase_url}/auth/v1" if supabase_url else None
+        self.jwks_url = f"{self.issuer}/.well-known/jwks.json" if supabase_url else None
+        self._keys: Dict[str, object] = {} # key id -> public key
+        self._fetched_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jwt_secret or self.jwks_url)
+
+    async def verify(self, token: str) -> Optional[str]:
+        """The Supabase user id (sub) of a valid, unexpired access token, else None."""
+        try:
+            header = jwt.get_unverified_header(token)
+            if header.get("alg") == "HS256":
+                key, algorithms = self.jwt_secret, ["HS256"]
+            else:
+                key, algorithms = await self._key(header.get("kid")), ["ES256", "RS256"]
+            if key is None:
+                return None
+            claims = jwt.decode(token, key, algorithms=algorithms, audience=AUDIENCE, issuer=self.issuer,
+                                leeway=CLOCK_SKEW_SECONDS, options={"require": ["exp", "sub", "aud"]})
+        except jwt.InvalidTokenError:
+            return None
+        return claims["sub"]
+
+    async def _key(self, kid: Optional[str]):
+        if self.jwks_url is None:
+            return None
+        now = time.monotonic()
+        key = self._keys.get(kid)
+        if now - self._fetched_at > JWKS_CACHE_SECONDS or (key is None and now - self._fetched_at > JWKS_MIN_REFRESH_SECONDS):
+            await self._refresh()
+            key = self._keys.get(kid)
+        return key
+
+    async def _refresh(self):
+        self._fetched_at = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=5) as client:
+                response = await client.get(self.jwks_url)
+                response.raise_for_status()
+            self._keys = {jwk["kid"]: jwt.PyJWK(jwk).key for jwk in response.json().get("keys", []) if jwk.get("kid")}
+        except Exception as e:
+            # Keep the keys we have; a new key id is retried after JWKS_MIN_REFRESH_SECONDS
+            print("Fetching Supabase JWKS failed:", e)
+
+class StreamTickets:
+    """Single-use stand-ins for an access token in an EventSource URL, valid for STREAM_TICKET_SECONDS."""
+
+    def __init__(self, ttl: float = STREAM_TICKET_SECONDS):
+        self.ttl = ttl
+        self._tickets: "OrderedDict[str, Tuple[float, str]]" = OrderedDict() # ticket -> (expires, user id)
+
+    def issue(self, user_id: str) -> str:
+        now = time.monotonic()
+        # Oldest first, so expired tickets are all at the front
+        while self._tickets and (next(iter(self._tickets.values()))[0] < now or len(self._tickets) >= MAX_TICKETS):
+            self._tickets.popitem(last=False)
+        ticket = secrets.token_urlsafe(24)
+        self._tickets[ticket] = (now + self.ttl, user_id)
+        return ticket
+
+    def redeem(self, ticket: str) -> Optional[str]:
+        expires, user_id = self._tickets.pop(ticket, (0.0, None))
+        return user_id if expires >= time.monotonic() else None
+
+verifier = SessionVerifier()
+stream_tickets = StreamTickets()
+
+async def authenticate(request: Request, allow_ticket: bool = False) -> Optional[str]:
+    """
+    The verified Supabase user id of the caller, or None for a guest (no token). `allow_ticket`
+    also accepts a stream ticket in the `ticket` query parameter. A token or ticket that does not
+    verify is a 401, so an expired session is not mistaken for a guest.
+    """
+    ticket = request.query_params.get("ticket") if allow_ticket else None
+    if ticket is not None:
+        user_id = stream_tickets.redeem(ticket)
+        if user_id is None:
+            raise HTTPException(status_code=401, detail="Stream ticket is invalid, used or expired")
+        return user_id
+    token = bearer_token(request)
+    if token is None or not verifier.enabled:
+        return None
+    user_id = await verifier.verify(token)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Session token is invalid or expired",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user_id
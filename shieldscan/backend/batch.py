@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from admission import admission
+import aggregates
+from database import AsyncSessionLocal
+import models.db
+from telemetry import timed
+
+# Bounded pool shared by every batch job, plus a politeness cap per target host
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "20"))
+BATCH_PER_HOST = int(os.environ.get("BATCH_PER_HOST", "2"))
+BATCH_MAX_URLS = int(os.environ.get("BATCH_MAX_URLS", "10000"))
+# Finished scans are inserted in groups instead of one commit per scan
+WRITE_BATCH_SIZE = int(os.environ.get("BATCH_WRITE_SIZE", "100"))
+WRITE_INTERVAL_SECONDS = 1.0
+JOB_RETENTION_SECONDS = int(os.environ.get("BATCH_JOB_RETENTION_SECONDS", "3600"))
+
+def parse_url_list(text: str) -> List[str]:
+    """
+    URLs from an uploaded file: one per line, or the first column of a CSV.
+    Blank lines, '#' comments and a url/domain header row are skipped.
+    """
+    urls = []
+    for line in text.splitlines():
+        value = line.split(",")[0].strip().strip('"')
+        if not value or value.startswith("#") or value.lower() in ("url", "domain"): # comments and CSV headers
+            continue
+        urls.append(value)
+    return urls
+
+def normalize_batch_url(value: str) -> Optional[str]:
+    # Same convenience as the frontend: bare domains are scanned over https
+    value = value.strip()
+    if not value.startswith(("http://", "https://")):
+        value = "https://" + value
+    parsed = urlparse(value)
+    if not parsed.hostname or " " in value:
+        return None
+    return value
+
+class BatchJob:
+    def __init__(self, urls: List[str], user_id: Optional[int] = None):
+        self.id = uuid.uuid4().hex
+        self.urls = urls
+        self.user_id = user_id
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.results: List[dict] = [] # one summary line per finished URL, in completion order
+        self.failed = 0
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def progress(self) -> dict:
+        return {
+            "type": "progress",
+            "job_id": self.id,
+            "total": len(self.urls),
+            "completed": len(self.results),
+            "failed": self.failed,
+            "status": "done" if self.done else "running",
+        }
+
+    async def publish(self, lines: List[dict]):
+        async with self._changed:
+            for line in lines:
+                if line.get("error"):
+                    self.failed += 1
+                self.results.append(line)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.finished_at = time.time()
+            self._changed.notify_all()
+
+    async def stream(self):
+        """
+        NDJSON lines: a progress line, then every result so far followed by new ones as
+        they land, with a progress line after each group, ending with a final progress line.
+        """
+        yield json.dumps(self.progress()) + "\n"
+        sent = 0
+        while True:
+            async with self._changed:
+                while sent == len(self.results) and not self.done:
+                    await self._changed.wait()
+                pending = self.results[sent:]
+                finished = self.done and sent + len(pending) == len(self.results)
+            for line in pending:
+                yield json.dumps({"type": "result", **line}) + "\n"
+            sent += len(pending)
+            yield json.dumps(self.progress()) + "\n"
+            if finished:
+                return
+
+class BatchRunner:
+    """
+    Runs batch jobs on a bounded worker pool. `scan` builds one report (no DB access);
+    finished reports are buffered and written to ScanHistory in bulk.
+    """
+
+    def __init__(self, scan: Callable[[str], Awaitable[dict]]):
+        self.scan = scan
+        self.jobs: Dict[str, BatchJob] = {}
+        self._workers = asyncio.Semaphore(BATCH_WORKERS)
+        self._hosts: Dict[str, list] = {} # host -> [semaphore, scans holding or waiting for it]
+        self._pending_rows: List[tuple] = [] # (job, result line, ScanHistory)
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def submit(self, urls: List[str], user_id: Optional[int] = None,
+               release: Optional[Callable[[], None]] = None) -> BatchJob:
+        """
+        Starts a job for `urls` on behalf of `user_id` (None for a guest); its rows are saved
+        under that user. `release` (from admission.acquire_batch) is called when the job ends.
+        """
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done and job.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+        job = BatchJob(urls, user_id=user_id)
+        self.jobs[job.id] = job
+        asyncio.ensure_future(self._run(job, release))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.ensure_future(self._flush_periodically())
+        return job
+
+    async def _run(self, job: BatchJob, release: Optional[Callable[[], None]] = None):
+        queue: asyncio.Queue = asyncio.Queue()
+        for url in job.urls:
+            queue.put_nowait(url)
+
+        async def worker():
+            while not queue.empty():
+                await self._scan_one(job, queue.get_nowait())
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(BATCH_WORKERS, len(job.urls)) or 1)))
+            await self.flush()
+        finally:
+            await job.finish()
+            if release is not None:
+                release()
+
+    async def _scan_one(self, job: BatchJob, url: str):
+        host = urlparse(url).hostname or url
+        slot = self._hosts.setdefault(host, [asyncio.Semaphore(BATCH_PER_HOST), 0])
+        slot[1] += 1
+        try:
+            async with slot[0], self._workers:
+                # Counted with the interactive scans, so a busy batch makes /api/scan shed load
+                done = admission.occupy()
+                try:
+                    report = await self.scan(url)
+                finally:
+                    done()
+        except Exception as e:
+            await job.publish([{"url": url, "error": str(e) or type(e).__name__}])
+            return
+        finally:
+            slot[1] -= 1
+            if slot[1] == 0:
+                self._hosts.pop(host, None)
+        line = {"url": url, "score": report["score"], "grade": report["grade"], "issues_found": len(report["issues"])}
+        self._pending_rows.append((job, line, models.db.ScanHistory.from_result(report, user_id=job.user_id)))
+        if len(self._pending_rows) >= WRITE_BATCH_SIZE:
+            await self.flush()
+
+    async def flush(self):
+        async with self._flush_lock:
+            rows, self._pending_rows = self._pending_rows, []
+            if not rows:
+                return
+
+            try:
+                with timed("db_write"):
+                    async with AsyncSessionLocal() as db:
+                        db.add_all([row for _, _, row in rows])
+                        # One batched INSERT ... RETURNING id for the whole group
+                        await db.flush()
+                        ids = [row.id for _, _, row in rows]
+                        await db.run_sync(aggregates.record_scans, [aggregates.scan_facts(row) for _, _, row in rows])
+                        await db.commit()
+                error = None
+            except Exception as e:
+                ids, error = [None] * len(rows), f"Could not save scan: {e}"
+
+            by_job: Dict[str, tuple] = {}
+            for (job, line, _), scan_id in zip(rows, ids):
+                line["id"] = scan_id
+                if error:
+                    line["error"] = error
+                by_job.setdefault(job.id, (job, []))[1].append(line)
+            for job, lines in by_job.values():
+                await job.publish(lines)
+
+    async def _flush_periodically(self):
+        while any(not job.done for job in self.jobs.values()):
+            await asyncio.sleep(WRITE_INTERVAL_SECONDS)
+            await self.flush()
@@ -0,0 +1,283 @@
+"""
+Local fleet of stub scan targets plus a stub DNS server, so benchmarks never touch the internet.
+
+    python -m bench.farm --fleet hardened=2,exposed=1    # serve a fleet and print its targets
+
+Every target gets its own loopback address (127.0.x.y, Linux routes all of 127/8 to lo), so the
+per-IP politeness limits see separate sites the way they would in production.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import ssl
+import struct
+import subprocess
+import tempfile
+from typing import Dict, List, Optional, Tuple
+
+from scanners.dns_resolver import TYPE_TXT, RCODE_NXDOMAIN
+
+HTTPS_PORT = 8443
+HTTP_PORT = 8080
+
+SECURE_HEADERS = {
+    "Content-Security-Policy": "default-src 'self'",
+    "Strict-Transport-Security": "max-age=63072000; includeSubDomains",
+    "X-Frame-Options": "DENY",
+    "X-Content-Type-Options": "nosniff",
+}
+LOGIN_PAGE = {"status": 200, "body": "<form>Username <input name=username> Password <input name=password></form>"}
+
+# A profile is a dict spec; missing keys take the value from DEFAULT_PROFILE
+DEFAULT_PROFILE = {
+    "scheme": "https",
+    "headers": {}, # sent with every response
+    "paths": {}, # path -> {"status", "body", "content_type"}; other paths are 404
+    "body_bytes": 4096, # size of the root page
+    "dmarc": False, # publish a _dmarc TXT record
+    "latency_ms": 0, # delay before every response
+    "drip_bytes": 0, # when set, bodies are sent in chunks of this size...
+    "drip_ms": 0, # ...with this pause between chunks
+    "etag": False, # send ETags and answer If-None-Match with 304
+    "blackhole": False, # accept connections (and DNS queries) but never answer
+    "untrusted_cert": False, # serve a certificate outside the farm's CA file
+}
+
+PROFILES = {
+    "hardened": {"headers": SECURE_HEADERS, "dmarc": True, "etag": True},
+    "typical": {"headers": {"X-Frame-Options": "SAMEORIGIN"}, "dmarc": True},
+    "exposed": {
+        "headers": {"Access-Control-Allow-Origin": "*"},
+        "paths": {
+            "/.env": {"status": 200, "body": "DB_HOST=localhost\nDB_PASSWORD=hunter2\n"},
+            "/.git/config": {"status": 200, "body": "[core]\n\trepositoryformatversion = 0\n"},
+            "/.mcp/config.json": {"status": 200, "body": '{"mcpServers": {}}', "content_type": "application/json"},
+            "/admin": LOGIN_PAGE,
+            "/login": LOGIN_PAGE,
+        },
+    },
+    "slow": {"latency_ms": 300, "body_bytes": 256 * 1024, "drip_bytes": 16 * 1024, "drip_ms": 50},
+    "plain_http": {"scheme": "http"},
+    "self_signed": {"untrusted_cert": True, "headers": {"X-Content-Type-Options": "nosniff"}},
+    "blackhole": {"blackhole": True},
+}
+DEFAULT_FLEET = "hardened=10,typical=20,exposed=10,slow=5,plain_http=3,self_signed=2,blackhole=2"
+
+def parse_fleet(spec: str, profiles: Dict[str, dict] = PROFILES) -> List[Tuple[str, dict]]:
+    """'hardened=10,slow=2' -> one (name, full profile) entry per target."""
+    fleet = []
+    for part in spec.split(","):
+        name, _, count = part.strip().partition("=")
+        if name not in profiles:
+            raise ValueError(f"Unknown profile {name!r} (known: {', '.join(sorted(profiles))})")
+        fleet.extend([(name, {**DEFAULT_PROFILE, **profiles[name]})] * int(count or 1))
+    return fleet
+
+def load_profiles(path: Optional[str]) -> Dict[str, dict]:
+    """PROFILES plus (or overridden by) the profiles in a JSON file of {name: profile}."""
+    if not path:
+        return PROFILES
+    with open(path) as f:
+        return {**PROFILES, **json.load(f)}
+
+def target_address(index: int) -> str:
+    # 127.0.0.x is left to the API server and the DNS stub
+    return f"127.0.{1 + index // 250}.{2 + index % 250}"
+
+def make_certificate(directory: str, addresses: List[str], name: str = "farm") -> Tuple[str, str]:
+    """Self-signed certificate for every target address, made with the openssl CLI."""
+    cert, key = os.path.join(directory, f"{name}.crt"), os.path.join(directory, f"{name}.key")
+    san = ",".join(f"IP:{address}" for address in addresses)
+    subprocess.run([
+        "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "365",
+        "-subj", "/CN=bench.test", "-addext", f"subjectAltName={san}",
+        "-keyout", key, "-out", cert,
+    ], check=True, capture_output=True)
+    return cert, key
+
+class StubTarget:
+    """One HTTP/1.1 keep-alive server answering from its profile."""
+
+    def __init__(self, address: str, profile: dict):
+        self.address = address
+        self.profile = profile
+        head, tail = b"<html><head><title>bench</title></head><body>", b"</body></html>"
+        self.root_body = head + b"x" * max(0, profile["body_bytes"] - len(head) - len(tail)) + tail
+
+    def route(self, path: str) -> Tuple[int, bytes, str]:
+        if path == "/":
+            return 200, self.root_body, "text/html; charset=utf-8"
+        entry = self.profile["paths"].get(path)
+        if entry is None:
+            return 404, b"Not found", "text/plain"
+        return entry.get("status", 200), entry.get("body", "").encode(), entry.get("content_type", "text/plain")
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if self.profile["blackhole"]:
+                await asyncio.Event().wait() # hold the connection until the client gives up
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = request_line.split(" ", 2)
+                headers = {}
+                for line in header_lines:
+                    name, sep, value = line.partition(":")
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                if headers.get("content-length"):
+                    await reader.readexactly(int(headers["content-length"]))
+                await self.respond(writer, method, target.split("?", 1)[0], headers)
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except (ConnectionError, ssl.SSLError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer: asyncio.StreamWriter, method: str, path: str, request_headers: Dict[str, str]):
+        profile = self.profile
+        if profile["latency_ms"]:
+            await asyncio.sleep(profile["latency_ms"] / 1000)
+        status, body, content_type = self.route(path)
+        headers = {"Content-Type": content_type, **profile["headers"]}
+        if profile["etag"] and status == 200:
+            etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+            headers["ETag"] = etag
+            if request_headers.get("if-none-match") == etag:
+                status, body = 304, b""
+        if method in ("HEAD", "OPTIONS") or status == 304:
+            body_out = b""
+        else:
+            body_out = body
+        headers["Content-Length"] = str(len(body) if method == "HEAD" else len(body_out))
+        reason = {200: "OK", 304: "Not Modified", 404: "Not Found"}.get(status, "Status")
+        lines = [f"HTTP/1.1 {status} {reason}"] + [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        chunk = profile["drip_bytes"]
+        if chunk and len(body_out) > chunk:
+            for start in range(0, len(body_out), chunk):
+                writer.write(body_out[start:start + chunk])
+                await writer.drain()
+                await asyncio.sleep(profile["drip_ms"] / 1000)
+        else:
+            writer.write(body_out)
+        await writer.drain()
+
+class StubDNS(asyncio.DatagramProtocol):
+    """Answers TXT queries from a fixed record table; NXDOMAIN for anything else."""
+
+    def __init__(self, records: Dict[str, List[str]], blackholed: set, latency_ms: float = 0):
+        self.records = records
+        self.blackholed = blackholed
+        self.latency_ms = latency_ms
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.ensure_future(self.answer(data, addr))
+
+    async def answer(self, data: bytes, addr):
+        try:
+            qid = struct.unpack("!H", data[:2])[0]
+            labels, offset = [], 12
+            while data[offset]:
+                length = data[offset]
+                labels.append(data[offset + 1:offset + 1 + length].decode("ascii").lower())
+                offset += 1 + length
+            question = data[12:offset + 5]
+            qtype = struct.unpack("!H", data[offset + 1:offset + 3])[0]
+        except (struct.error, IndexError, UnicodeDecodeError):
+            return
+        name = ".".join(labels)
+        if name in self.blackholed:
+            return
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        answers = self.records.get(name, []) if qtype == TYPE_TXT else []
+        rcode = 0 if name in self.records else RCODE_NXDOMAIN
+        response = struct.pack("!HHHHHH", qid, 0x8180 | rcode, 1, len(answers), 0, 0) + question
+        for text in answers:
+            raw = text.encode()
+            rdata = bytes([len(raw)]) + raw
+            # Name as a pointer to the question, then type, class, TTL and the TXT string
+            response += struct.pack("!HHHIH", 0xC00C, TYPE_TXT, 1, 300, len(rdata)) + rdata
+        self.transport.sendto(response, addr)
+
+async def start_farm(fleet: List[Tuple[str, dict]], cert_dir: str, https_port: int = HTTPS_PORT,
+                     http_port: int = HTTP_PORT, dns_latency_ms: float = 0) -> Tuple[dict, list]:
+    """
+    Starts every target and the DNS stub. Returns ({"targets", "dns", "ca_file"}, servers to close).
+    Point the scanner's SSL_CERT_FILE at ca_file so targets validate, except untrusted_cert ones.
+    """
+    addresses = [target_address(index) for index in range(len(fleet))]
+    contexts = {}
+    for untrusted in (False, True):
+        cert, key = make_certificate(cert_dir, addresses, "untrusted" if untrusted else "farm")
+        contexts[untrusted] = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        contexts[untrusted].load_cert_chain(cert, key)
+
+    loop = asyncio.get_running_loop()
+    targets, servers, records, blackholed = [], [], {}, set()
+    for address, (name, profile) in zip(addresses, fleet):
+        stub = StubTarget(address, profile)
+        https = profile["scheme"] == "https"
+        port = https_port if https else http_port
+        # A blackholed target never completes the TLS handshake either
+        tls = contexts[profile["untrusted_cert"]] if https and not profile["blackhole"] else None
+        servers.append(await asyncio.start_server(stub.handle, address, port, ssl=tls))
+        dmarc_name = f"_dmarc.{address}" # IPs have no registrable domain, so the check asks for this
+        if profile["blackhole"]:
+            blackholed.add(dmarc_name)
+        elif profile["dmarc"]:
+            records[dmarc_name] = ["v=DMARC1; p=reject; rua=mailto:dmarc@bench.test"]
+        targets.append({"url": f"{profile['scheme']}://{address}:{port}/", "profile": name, "address": address})
+
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: StubDNS(records, blackholed, dns_latency_ms), local_addr=("127.0.0.1", 0)
+    )
+    servers.append(transport)
+    dns = list(transport.get_extra_info("sockname")[:2])
+    return {"targets": targets, "dns": dns, "ca_file": os.path.join(cert_dir, "farm.crt")}, servers
+
+def serve(fleet: List[Tuple[str, dict]], options: dict, conn):
+    """multiprocessing entry point: sends the farm info over `conn`, then serves until terminated."""
+    async def run():
+        with tempfile.TemporaryDirectory() as cert_dir:
+            info, _ = await start_farm(fleet, cert_dir, **options)
+            conn.send(info)
+            await asyncio.Event().wait()
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+async def main():
+    parser = argparse.ArgumentParser(description="Serve a local fleet of stub scan targets")
+    parser.add_argument("--fleet", default=DEFAULT_FLEET, help="profile=count,... (profiles: %s)" % ", ".join(PROFILES))
+    parser.add_argument("--profiles", help="JSON file of extra or overriding profiles")
+    parser.add_argument("--https-port", type=int, default=HTTPS_PORT)
+    parser.add_argument("--http-port", type=int, default=HTTP_PORT)
+    parser.add_argument("--dns-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cert_dir:
+        fleet = parse_fleet(args.fleet, load_profiles(args.profiles))
+        info, _ = await start_farm(fleet, cert_dir, args.https_port, args.http_port, args.dns_latency_ms)
+        print(json.dumps(info, indent=2))
+        dns = info["dns"]
+        print(f"Set DNS_NAMESERVER={dns[0]}:{dns[1]} SSL_CERT_FILE={info['ca_file']} for the API server", flush=True)
+        await asyncio.Event().wait()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
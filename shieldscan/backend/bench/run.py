@@ -0,0 +1,282 @@
+"""
+Hermetic scan benchmark: stub target farm + a real API server, driven at increasing concurrency.
+
+    python -m bench.run                                  # default fleet, levels 1,4,16,64
+    python -m bench.run --concurrency 8,32 --scans 200 --no-pdf --output bench.json
+
+The farm (bench/farm.py) and the API server (uvicorn main:app, with a throwaway SQLite
+database and PDF cache, DNS and trusted certificates pointed at the farm, admission limits
+lifted and the LLM summary off) each run in their own process. Each level runs `--scans` POST /api/scan
+requests spread over the fleet, then downloads the PDF of every stored scan. The result
+is one JSON document (stdout, or --output) with scans/sec, p50/p95/p99 latency and the
+server's peak RSS per level, for comparing runs across commits.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import httpx
+
+from bench.farm import DEFAULT_FLEET, HTTPS_PORT, HTTP_PORT, parse_fleet, load_profiles, serve
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_START_TIMEOUT = 60
+REQUEST_TIMEOUT = 120
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, q in 0..100."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), round(q / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+def latency_summary(latencies: List[float]) -> dict:
+    summary = {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+               "p99": percentile(latencies, 99), "max": max(latencies) if latencies else None}
+    return {name: round(value, 1) if value is not None else None for name, value in summary.items()}
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def reset_peak_rss(pid: int):
+    # Linux: writing 5 to clear_refs resets VmHWM, so each level reports its own peak
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def start_server(port: int, workdir: str, farm: dict, extra_env: dict, log) -> subprocess.Popen:
+    dns = farm["dns"]
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "PDF_CACHE_DIR": os.path.join(workdir, "pdf_cache"),
+        "DNS_NAMESERVER": f"{dns[0]}:{dns[1]}",
+        "SSL_CERT_FILE": farm["ca_file"], # farm targets validate, except the untrusted_cert ones
+        "GROQ_API_KEY": "", # template summaries only; an empty value also wins over .env
+        "MONITOR_IN_PROCESS": "0",
+        "SCAN_MAX_IN_FLIGHT": "1000000",
+        "SCAN_RATE_FREE_PER_MINUTE": "1000000000",
+        "SCAN_BURST_FREE": "1000000000",
+        **extra_env,
+    }
+    # The API does not create its schema on import (see migrate.py)
+    subprocess.run([sys.executable, "migrate.py"], cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+                   check=True)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+async def wait_ready(client: httpx.AsyncClient, server: subprocess.Popen, log_path: str):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            with open(log_path) as f:
+                tail = f.read()[-2000:]
+            raise RuntimeError(f"API server exited with code {server.returncode}:\n{tail}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API server did not start in time")
+
+async def run_pool(jobs: list, concurrency: int, work) -> float:
+    """Runs `work(job)` for every job with `concurrency` workers; returns the wall time."""
+    queue = asyncio.Queue()
+    for job in jobs:
+        queue.put_nowait(job)
+
+    async def worker():
+        while not queue.empty():
+            await work(queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+async def run_level(client: httpx.AsyncClient, server: subprocess.Popen, targets: List[dict],
+                    concurrency: int, scans: int, force_refresh: bool, pdf: bool) -> dict:
+    latencies, statuses, timed_out, scan_ids = [], {}, 0, []
+
+    async def scan(url: str):
+        nonlocal timed_out
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/scan", json={"url": url, "force_refresh": force_refresh})
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        statuses[status] = statuses.get(status, 0) + 1
+        if response is not None and response.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+            body = response.json()
+            timed_out += bool(body.get("timed_out"))
+            if body.get("id"):
+                scan_ids.append(body["id"])
+
+    reset_peak_rss(server.pid)
+    urls = [targets[i % len(targets)]["url"] for i in range(scans)]
+    elapsed = await run_pool(urls, concurrency, scan)
+    level = {
+        "concurrency": concurrency,
+        "scans": scans,
+        "ok": len(latencies),
+        "timed_out": timed_out,
+        "statuses": statuses,
+        "seconds": round(elapsed, 3),
+        "scans_per_sec": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+    if pdf:
+        pdf_latencies, pdf_statuses = [], {}
+
+        async def download(scan_id: int):
+            started = time.perf_counter()
+            try:
+                status = str((await client.get(f"/api/scans/{scan_id}/pdf")).status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            pdf_statuses[status] = pdf_statuses.get(status, 0) + 1
+            if status == "200":
+                pdf_latencies.append((time.perf_counter() - started) * 1000)
+
+        pdf_elapsed = await run_pool(sorted(set(scan_ids)), concurrency, download)
+        level["pdf"] = {
+            "downloads": len(set(scan_ids)),
+            "ok": len(pdf_latencies),
+            "statuses": pdf_statuses,
+            "per_sec": round(len(pdf_latencies) / pdf_elapsed, 2) if pdf_elapsed else None,
+            "latency_ms": latency_summary(pdf_latencies),
+        }
+
+    level["peak_rss_mb"] = peak_rss_mb(server.pid)
+    return level
+
+async def run(args) -> dict:
+    fleet = parse_fleet(args.fleet, load_profiles(args.profiles))
+    levels = [int(value) for value in args.concurrency.split(",")]
+
+    # spawn: the farm gets a clean interpreter rather than a fork of this one
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    options = {"https_port": args.https_port, "http_port": args.http_port, "dns_latency_ms": args.dns_latency_ms}
+    farm = context.Process(target=serve, args=(fleet, options, sender), daemon=True)
+    farm.start()
+    server = None
+    # The server is stopped before its work directory (database, PDFs) goes away
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            deadline = time.monotonic() + SERVER_START_TIMEOUT
+            while not receiver.poll(0.2):
+                if not farm.is_alive():
+                    raise RuntimeError(f"Target farm exited with code {farm.exitcode} "
+                                       f"(ports {args.https_port}/{args.http_port} in use?)")
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Target farm did not start in time")
+            info = receiver.recv()
+            port = free_port()
+            extra_env = dict(item.split("=", 1) for item in args.env)
+            # Server output (including expected PDF failures where Chromium is missing) goes to --server-log
+            log_path = args.server_log or os.path.join(workdir, "server.log")
+            log = open(log_path, "w")
+            server = start_server(port, workdir, info, extra_env, log)
+            limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=REQUEST_TIMEOUT,
+                                         limits=limits) as client:
+                await wait_ready(client, server, log_path)
+                results = []
+                for concurrency in levels:
+                    level = await run_level(client, server, info["targets"], concurrency, args.scans,
+                                            not args.cached, not args.no_pdf)
+                    print(f"concurrency {concurrency}: {level['scans_per_sec']} scans/s, "
+                          f"p50 {level['latency_ms']['p50']:.0f} ms, p99 {level['latency_ms']['p99']:.0f} ms, "
+                          f"peak RSS {level['peak_rss_mb']} MB" if level["ok"] else
+                          f"concurrency {concurrency}: no successful scans {level['statuses']}",
+                          file=sys.stderr)
+                    results.append(level)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+                log.close()
+            farm.terminate()
+            farm.join()
+
+    profiles = {}
+    for name, _ in fleet:
+        profiles[name] = profiles.get(name, 0) + 1
+    return {
+        "benchmark": "scan",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "fleet": profiles,
+        "force_refresh": not args.cached,
+        "env": dict(item.split("=", 1) for item in args.env),
+        "levels": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark scans against a local stub target farm")
+    parser.add_argument("--fleet", default=DEFAULT_FLEET, help="profile=count,... (see bench/farm.py)")
+    parser.add_argument("--profiles", help="JSON file of extra or overriding farm profiles")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma-separated concurrency levels")
+    parser.add_argument("--scans", type=int, default=100, help="scans per concurrency level")
+    parser.add_argument("--cached", action="store_true", help="allow cached reports (default: force_refresh)")
+    parser.add_argument("--no-pdf", action="store_true", help="skip the PDF downloads")
+    parser.add_argument("--dns-latency-ms", type=float, default=0)
+    parser.add_argument("--https-port", type=int, default=HTTPS_PORT)
+    parser.add_argument("--http-port", type=int, default=HTTP_PORT)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the API server, e.g. SCAN_DEADLINE_SECONDS=4")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--server-log", help="keep the API server's output in this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
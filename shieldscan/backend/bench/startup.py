@@ -0,0 +1,127 @@
+"""
+Startup benchmark: how long `import main` takes, and how long until /health answers.
+
+    python -m bench.startup                      # JSON result; exit code 1 when over budget
+    python -m bench.startup --budget-ms 800 --runs 10
+
+Every run is a fresh interpreter, so the numbers are cold-import times as seen by a new
+autoscaled instance or a --reload cycle. The run also fails when one of LAZY_MODULES
+is imported at startup, which catches an eager import regardless of machine speed.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from bench.run import BACKEND_DIR, free_port
+
+# Default budget for the median `import main`, in milliseconds
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", "1500"))
+# Loaded on first use (LLM summary, PDF renderer), never by importing the app
+LAZY_MODULES = ("groq", "playwright", "jinja2")
+
+MEASURE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+print(json.dumps({"ms": elapsed * 1000, "modules": sorted(m for m in %r if m in sys.modules)}))
+""" % (LAZY_MODULES,)
+
+def _env(workdir: str) -> dict:
+    # A database that does not exist yet: importing the app must not need one
+    return {**os.environ, "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'startup.db')}"}
+
+def measure_import(workdir: str) -> dict:
+    output = subprocess.run([sys.executable, "-c", MEASURE], cwd=BACKEND_DIR, env=_env(workdir),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def slowest_imports(workdir: str, count: int = 10) -> List[dict]:
+    """Top modules by cumulative import time, from -X importtime."""
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND_DIR,
+                            env=_env(workdir), capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append({"module": name.strip(), "ms": int(cumulative) / 1000})
+    return sorted(rows, key=lambda row: row["ms"], reverse=True)[:count]
+
+def measure_ready(workdir: str, timeout: float = 60) -> Optional[float]:
+    """Milliseconds from spawning uvicorn until /health returns 200."""
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**_env(workdir), "PDF_PRESTART": "1"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout and server.poll() is None:
+            # A bare connection per poll: cheap enough not to slow the server down on a small box
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            try:
+                connection.request("GET", "/health")
+                if connection.getresponse().status == 200:
+                    return (time.perf_counter() - started) * 1000
+            except OSError:
+                pass
+            finally:
+                connection.close()
+            time.sleep(0.01)
+        return None
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API import and startup time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS, help="limit for the median import time")
+    parser.add_argument("--no-ready", action="store_true", help="skip the time-to-/health measurement")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        samples = [measure_import(workdir) for _ in range(args.runs)]
+        times = [sample["ms"] for sample in samples]
+        eager = sorted({module for sample in samples for module in sample["modules"]})
+        median = statistics.median(times)
+        ready = [measure_ready(workdir) for _ in range(args.runs)] if not args.no_ready else []
+        ready = [value for value in ready if value is not None]
+        ok = median <= args.budget_ms and not eager
+        result = {
+            "benchmark": "startup",
+            "python": sys.version.split()[0],
+            "import_ms": {"median": round(median, 1), "min": round(min(times), 1), "max": round(max(times), 1),
+                          "runs": len(times)},
+            "ready_ms": {"median": round(statistics.median(ready), 1), "runs": len(ready)} if ready else None,
+            "budget_ms": args.budget_ms,
+            "eager_lazy_modules": eager,
+            "ok": ok,
+        }
+        if not ok:
+            result["slowest_imports"] = slowest_imports(workdir)
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if not ok:
+        reason = f"eagerly imported: {', '.join(eager)}" if eager else f"median import {median:.0f} ms > {args.budget_ms:g} ms"
+        print(f"Startup over budget ({reason})", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,90 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from telemetry import Gauge
+
 load_dotenv()
 
 # Use PostgreSQL if a DATABASE_URL is provided (e.g., Supabase Postgres DB URL)
 # Otherwise, fallback to SQLite for local MVP testing
 SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./shieldscan.db")
 
+# Pool settings, shared by both engines (each has its own pool)
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Recycle before the server (or Supabase's pooler) drops an idle connection on us
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE_SECONDS", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+
+def async_database_url(url: str) -> str:
+    """The same database through an asyncio driver: asyncpg for Postgres, aiosqlite for SQLite."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        query = dict(parsed.query)
+        # asyncpg spells libpq's sslmode as ssl
+        if "sslmode" in query:
+            query["ssl"] = query.pop("sslmode")
+        parsed = parsed.set(drivername="postgresql+asyncpg", query=query)
+    elif backend == "sqlite":
+        parsed = parsed.set(drivername="sqlite+aiosqlite")
+    return parsed.render_as_string(hide_password=False)
+
+ASYNC_DATABASE_URL = os.environ.get("ASYNC_DATABASE_URL") or async_database_url(SQLALCHEMY_DATABASE_URL)
+
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
 # If using Postgres, we don't need checkout_same_thread=False
 # This specific check differentiates between SQLite and Postgres strings
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+connect_args = {"check_same_thread": False} if IS_SQLITE else {}
+
+def _pool_args(url: str) -> dict:
+    # An in-memory SQLite database lives in a single connection, so it gets no pool to size
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
 
+# Sync engine: migrations, the monitor and other scripts
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
+    SQLALCHEMY_DATABASE_URL, connect_args=connect_args, **_pool_args(SQLALCHEMY_DATABASE_URL)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine: the API. Objects stay loaded after commit, so writes need no refresh round-trip.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_args(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: readers (PDF loads, summaries) no longer wait for a scan's write, and writers
+    # only wait for each other. NORMAL is durable across crashes of the process in WAL mode.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _sqlite_pragmas)
+
+# Pool saturation for /metrics; pools without these counters (e.g. SQLite in-memory) are skipped
+Gauge("shieldscan_db_connections_in_use", "Database connections checked out of the pool",
+      lambda: {"sync": engine.pool.checkedout(), "async": async_engine.pool.checkedout()}, label="engine")
+Gauge("shieldscan_db_pool_size", "Database connection pool size",
+      lambda: {"sync": engine.pool.size(), "async": async_engine.pool.size()}, label="engine")
+
 Base = declarative_base()
 
 # Dependency
@@ -28,3 +94,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,26 +1,74 @@
 # pyre-ignore-all-errors
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+import base64
+import copy
+import os
+import time
+from contextlib import asynccontextmanager, aclosing
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Depends, Request, BackgroundTasks, Response
 import json
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import HttpUrl
+from pydantic import HttpUrl, ValidationError
 
-from models.scan import ScanRequest, ScanResult, Issue
-from scanners.ssl_checker import check_ssl
-from scanners.checkers import check_headers, check_cors, check_mcp_exposure, check_blacklist, check_exposure, check_dmarc
-from ai.summary import format_issue_texts, generate_summary
+from models.scan import ScanRequest, ScanResult, Issue, BatchScanRequest, BatchJobCreated, MonitorRequest, MonitorInfo, ScanPage
+from scanners.cache import result_cache, normalize_target
+from scanners.http import close_client
+from scanners.psl import get_psl
+from scanners.signatures import get_signatures
+from ai.summary import generate_ai_summary, ai_summary_enabled, ISSUE_TEMPLATES
+from pdf_generator import browser_pool, RendererBusy, RendererUnavailable, PDF_PRESTART
+from pdf_cache import get_pdf_store
+from report import build_report, assemble_report
+from scanners.engine import CHECKERS, iter_checkers
+from scoring.rules import evaluate
+from admission import admission, client_ip
+from auth import authenticate, stream_tickets, STREAM_TICKET_SECONDS
+from batch import BatchRunner, parse_url_list, normalize_batch_url, BATCH_MAX_URLS
+from monitor import MonitorScheduler, MONITOR_MIN_INTERVAL, MONITORS_PER_USER_FREE, MONITORS_PER_USER_PREMIUM
+import aggregates
+import telemetry
+from telemetry import scan_trace, timed
 
 # Database imports
-from database import engine, get_db, Base, SQLALCHEMY_DATABASE_URL
+from database import get_async_db, AsyncSessionLocal, async_engine
 import models.db
-from sqlalchemy.orm import Session
+from sqlalchemy import String, func, literal, select, tuple_, type_coerce, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Callable, Dict, Optional, Tuple
 
-print("USING DB URL:", SQLALCHEMY_DATABASE_URL)
+# The schema is not touched here: run `python migrate.py` before starting the API (see migrate.py)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the Public Suffix List trie and the signature automaton once, before the first scan needs them
+    get_psl()
+    get_signatures()
+    # Chromium launches after the server starts accepting traffic; an earlier PDF request waits for it
+    renderer_start = asyncio.ensure_future(start_renderer()) if PDF_PRESTART else None
+    if MONITOR_IN_PROCESS:
+        monitor_scheduler.start()
+    yield
+    if renderer_start is not None:
+        renderer_start.cancel()
+    await monitor_scheduler.stop()
+    # Drain the shared scanner connection pool on shutdown
+    await close_client()
+    await browser_pool.stop()
+    await async_engine.dispose()
 
-app = FastAPI(title="ShieldScan API", version="1.0.0")
+async def start_renderer():
+    try:
+        await browser_pool.start()
+    except RendererUnavailable:
+        # Scans work without it and the pool has logged why; downloads retry once its backoff runs out
+        pass
+    except Exception as e:
+        print("PDF renderer failed to start:", e)
+
+app = FastAPI(title="ShieldScan API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -34,188 +82,563 @@ app.add_middleware(
 def read_root():
     return RedirectResponse(url="/docs")
 
-def build_issue_from_template(key: str) -> dict:
-    return format_issue_texts(key)
+
+async def current_user(request: Request, allow_ticket: bool = False) -> Optional[Tuple[int, bool]]:
+    """(User.id, is_premium) of the caller's verified Supabase session (see auth.py), None for guests."""
+    auth_id = await authenticate(request, allow_ticket=allow_ticket)
+    return await admission.lookup_user(auth_id) if auth_id else None
+
+async def require_user(request: Request, detail: str) -> Tuple[int, bool]:
+    """current_user for endpoints that need a signed-in caller; 401 with `detail` for guests."""
+    user = await current_user(request)
+    if user is None:
+        raise HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+async def admit_scan(request: Request, allow_ticket: bool = False) -> Tuple[Callable[[], None], Optional[int]]:
+    """
+    Admits one scan for the caller, identified by their verified session when signed in
+    (is_premium picks the tier), else by IP.
+    Returns the release function and the user's id (None for guests).
+    """
+    user = await current_user(request, allow_ticket=allow_ticket)
+    if user is None:
+        return admission.acquire(f"ip:{client_ip(request)}", premium=False), None
+    return admission.acquire(f"user:{user[0]}", premium=user[1]), user[0]
 
 @app.post("/api/scan", response_model=ScanResult)
-def scan_website(request: ScanRequest, db: Session = Depends(get_db)):
+async def scan_website(request: ScanRequest, raw_request: Request, background_tasks: BackgroundTasks):
     url_str = str(request.url)
-    
-    # Run Scanners
-    ssl_result = check_ssl(url_str)
-    headers_result = check_headers(url_str)
-    cors_result = check_cors(url_str)
-    mcp_result = check_mcp_exposure(url_str)
-    blacklist_result = check_blacklist(url_str)
-    exposure_result = check_exposure(url_str)
-    dmarc_result = check_dmarc(url_str)
-    
-    issues = []
-    current_score = 100
-    
-    # Evaluate SSL
-    if not ssl_result.get("valid"):
-        iss = build_issue_from_template("ssl_invalid")
-        if "error" in ssl_result: iss['details'] = {"error": ssl_result["error"]}
-        issues.append(iss)
-        current_score -= iss['score_impact']
-    elif ssl_result.get("expiring_soon"):
-        iss = build_issue_from_template("ssl_expiring")
-        iss['details'] = {"days_remaining": ssl_result.get("days_remaining")}
-        issues.append(iss)
-        current_score -= iss['score_impact']
-        
-    # Evaluate Headers
-    headers_data = headers_result.get("headers", {})
-    if headers_data:
-        if not headers_data.get("csp", {}).get("present"):
-            iss = build_issue_from_template("missing_csp")
-            issues.append(iss)
-            current_score -= iss['score_impact']
-            
-        if not headers_data.get("hsts", {}).get("present"):
-            iss = build_issue_from_template("missing_hsts")
-            issues.append(iss)
-            current_score -= iss['score_impact']
-            
-        if not headers_data.get("x_frame_options", {}).get("present"):
-            iss = build_issue_from_template("missing_x_frame")
-            issues.append(iss)
-            current_score -= iss['score_impact']
-            
-    # Evaluate CORS
-    if cors_result.get("vulnerable"):
-        iss = build_issue_from_template("over_permissive_cors")
-        iss['details'] = {"allowed_origin": cors_result.get("allowed", "*")}
-        issues.append(iss)
-        current_score -= iss['score_impact']
-        
-    # Evaluate MCP Exposure
-    if mcp_result.get("exposed"):
-        iss = build_issue_from_template("mcp_exposed")
-        iss['details'] = {"exposed_paths": mcp_result.get("paths", [])}
-        issues.append(iss)
-        current_score -= iss['score_impact']
-
-    # Evaluate Exposure
-    if exposure_result.get("admin_exposed"):
-        iss = build_issue_from_template("admin_exposed")
-        iss['details'] = {"exposed_paths": exposure_result.get("admin_paths", [])}
-        issues.append(iss)
-        current_score -= iss['score_impact']
-
-    if exposure_result.get("sensitive_files"):
-        iss = build_issue_from_template("sensitive_files")
-        iss['details'] = {"exposed_paths": exposure_result.get("sensitive_files", [])}
-        issues.append(iss)
-        current_score -= iss['score_impact']
-
-    # Evaluate DMARC
-    if not dmarc_result.get("has_dmarc"):
-        iss = build_issue_from_template("missing_dmarc")
-        issues.append(iss)
-        current_score -= iss['score_impact']
-
-    # Mock weak TLS to satisfy Week 2 missing issue (assuming it fails some check)
-    # Just a placeholder heuristic for now since deep TLS inspection needs OpenSSL bindings
-    if "http://" in url_str:
-        iss = build_issue_from_template("weak_tls")
-        issues.append(iss)
-        current_score -= iss['score_impact']
-        
-    # Formatting the score
-    current_score = max(0, current_score)
-    grade = 'A'
-    if current_score < 40:
-        grade = 'F'
-    elif current_score < 60:
-        grade = 'D'
-    elif current_score < 75:
-        grade = 'C'
-    elif current_score < 90:
-        grade = 'B'
-        
-    ordered_issues = sorted(issues, key=lambda x: x['score_impact'], reverse=True)
-    
-    final_result = {
-        "url": url_str,
-        "score": current_score,
-        "grade": grade,
-        "issues": ordered_issues,
-        "ai_summary": generate_summary(current_score, grade, ordered_issues),
-        "ssl_status": ssl_result,
-        "headers_status": headers_result,
-        "blacklist_status": blacklist_result,
-        "mcp_exposed": mcp_result.get("exposed", False),
-        "cors_vulnerable": cors_result.get("vulnerable", False),
-        "exposure_status": exposure_result,
-        "dmarc_status": dmarc_result
-    }
-    
-    # Save to Database
-    db_scan = models.db.ScanHistory(
-        target_url=url_str,
-        score=current_score,
-        grade=grade,
-        issues_found=len(ordered_issues),
-        raw_result=json.dumps(final_result, default=str)
-    )
-    db.add(db_scan)
-    db.commit()
-    db.refresh(db_scan)
+    release, user_id = await admit_scan(raw_request)
+    try:
+        # Repeat scans of the same target within the report TTL reuse the scored report, and
+        # concurrent scans of the same target share one run; every request still saves its own row
+        ran = False
+        def run():
+            nonlocal ran
+            ran = True
+            return build_report(url_str, force_refresh=request.force_refresh)
+        report = await result_cache.get_or_run(normalize_target(url_str), "report", run,
+                                               force_refresh=request.force_refresh)
+        final_result = await save_report(own_report(report, url_str, cache_hit=not ran), user_id=user_id)
+    finally:
+        release()
+    background_tasks.add_task(finish_scan, final_result["id"])
+    return final_result
+
+def own_report(report: dict, url_str: str, cache_hit: bool = False) -> dict:
+    """
+    A caller's copy of a (possibly cached, shared) unsaved report, for save_report to fill in.
+    A `cache_hit` report was built by another request, so its timings are not this scan's.
+    """
+    report = copy.deepcopy(report)
+    report["url"] = url_str
+    if cache_hit:
+        report["timings"] = {"cache_hit": True}
+    return report
+
+async def save_report(final_result: dict, user_id: Optional[int] = None) -> dict:
+    # Save to Database: the flush INSERTs ... RETURNING id, so no refresh is needed after the commit
+    db_scan = models.db.ScanHistory.from_result(final_result, user_id=user_id)
+    with timed("db_write") as write:
+        async with AsyncSessionLocal() as db:
+            db.add(db_scan)
+            await db.flush()
+            # Trend aggregates move in the same transaction as the row (see aggregates.py)
+            await db.run_sync(aggregates.record_scans, [aggregates.scan_facts(db_scan)])
+            await db.commit()
     
     # Inject the database ID so the frontend can retrieve the PDF later
     final_result["id"] = db_scan.id
+    # The row has the scan's timings; finish_scan adds this write, the AI summary and the PDF
+    timings = final_result.get("timings")
+    if timings is not None:
+        timings["db_write_ms"] = write.ms
+        pending_timings[db_scan.id] = timings
+
+    # The template summary is already in the response; the LLM one follows in the background
+    if ai_summary_enabled():
+        final_result["ai_summary_pending"] = True
+        pending_summaries[db_scan.id] = asyncio.ensure_future(refine_summary(db_scan.id, final_result))
 
     return final_result
 
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+class AdmittedStream(StreamingResponse):
+    """
+    Streams a scan and releases its admission slot however the response ends. The stream's
+    own cleanup never runs when the client leaves before the first chunk is pulled.
+    """
+
+    def __init__(self, content, release: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.release()
+
+@app.post("/api/scan/stream/ticket")
+async def create_stream_ticket(request: Request):
+    """A single-use ticket that signs the caller into one GET /api/scan/stream (see auth.py)."""
+    auth_id = await authenticate(request)
+    if auth_id is None:
+        raise HTTPException(status_code=401, detail="Sign in to get a stream ticket", headers={"WWW-Authenticate": "Bearer"})
+    return {"ticket": stream_tickets.issue(auth_id), "expires_in": STREAM_TICKET_SECONDS}
+
+@app.get("/api/scan/stream")
+async def stream_scan(url: str, raw_request: Request, background_tasks: BackgroundTasks, force_refresh: bool = False):
+    """
+    Server-Sent Events version of POST /api/scan. Emits one `checker` event per checker as it
+    finishes, with the score and grade so far, then a `result` event with the saved ScanResult
+    (including its id), or a `failed` event with a detail message. A fresh cached report is
+    saved and sent as the `result` event straight away. EventSource cannot send an Authorization
+    header, so signed-in callers pass a ticket from POST /api/scan/stream/ticket as `ticket`.
+    """
+    try:
+        url_str = str(ScanRequest(url=url).url)
+    except ValidationError:
+        raise HTTPException(status_code=422, detail="Invalid URL")
+    release, user_id = await admit_scan(raw_request, allow_ticket=True)
+    target = normalize_target(url_str)
+    total = len(CHECKERS)
+
+    async def events():
+        try:
+            cached = None if force_refresh else result_cache.get(target, "report")
+            if cached is not None:
+                final_result = await save_report(own_report(cached, url_str, cache_hit=True), user_id=user_id)
+                background_tasks.add_task(finish_scan, final_result["id"])
+                yield sse("result", final_result)
+                return
+            results = {}
+            with scan_trace() as trace:
+                async with aclosing(iter_checkers(url_str, force_refresh=force_refresh)) as finished:
+                    async for name, result in finished:
+                        results[name] = result
+                        running = evaluate(results)
+                        yield sse("checker", {
+                            "checker": name,
+                            "result": result,
+                            "score": running["score"],
+                            "grade": running["grade"],
+                            "issues": running["issues"],
+                            "completed": len(results),
+                            "total": total,
+                        })
+                final_result = assemble_report(url_str, results)
+            final_result["timings"] = trace
+            if not final_result["timed_out"]:
+                result_cache.set(target, "report", final_result)
+            final_result = await save_report(own_report(final_result, url_str), user_id=user_id)
+            background_tasks.add_task(finish_scan, final_result["id"])
+            yield sse("result", final_result)
+        except Exception as e:
+            yield sse("failed", {"detail": str(e) or type(e).__name__})
+        finally:
+            # Before the background work (PDF) that runs once the stream is done
+            release()
+
+    return AdmittedStream(events(), release, media_type="text/event-stream",
+                          headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+batch_runner = BatchRunner(build_report)
+
+@app.post("/api/scans/batch", response_model=BatchJobCreated, status_code=202)
+async def create_batch_scan(request: Request):
+    """
+    Accepts a JSON body {"urls": [...]} or a multipart upload with a `file` field
+    (one URL per line, or CSV with the URL in the first column) and queues a batch job.
+    Admission is per caller (signed-in user, else IP): a cap on running jobs and a daily URL budget.
+    """
+    user = await current_user(request)
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Upload the URL list as a file field named 'file'")
+        raw_urls = parse_url_list((await upload.read()).decode("utf-8", errors="replace"))
+    else:
+        try:
+            raw_urls = BatchScanRequest.model_validate(await request.json()).urls
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    # Checked on the raw list, before any per-URL work, so an oversized upload is refused cheaply
+    if len(raw_urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"A batch can hold at most {BATCH_MAX_URLS} URLs")
+    urls, rejected, seen = [], [], set()
+    for raw in raw_urls:
+        url = normalize_batch_url(raw)
+        if url is None:
+            rejected.append(raw)
+            continue
+        # https://a.com and https://A.com/ are the same scan
+        target = normalize_target(url)
+        if target not in seen:
+            seen.add(target)
+            urls.append(url)
+    if not urls:
+        raise HTTPException(status_code=400, detail="No valid URLs to scan")
+
+    if user is None:
+        release = admission.acquire_batch(f"ip:{client_ip(request)}", len(urls), premium=False)
+    else:
+        release = admission.acquire_batch(f"user:{user[0]}", len(urls), premium=user[1])
+    job = batch_runner.submit(urls, user_id=user[0] if user else None, release=release)
+    return {"job_id": job.id, "total": len(urls), "rejected": rejected}
+
+@app.get("/api/scans/batch/{job_id}")
+async def stream_batch_scan(job_id: str, request: Request):
+    """Streams the job's progress and per-URL results as NDJSON until the job is done."""
+    job = batch_runner.jobs.get(job_id)
+    # A signed-in user's job is only visible to them
+    if job and job.user_id is not None:
+        user = await current_user(request)
+        if user is None or user[0] != job.user_id:
+            job = None
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return StreamingResponse(job.stream(), media_type="application/x-ndjson")
+
+# Scheduled rescans normally run in their own process (python monitor.py)
+MONITOR_IN_PROCESS = os.environ.get("MONITOR_IN_PROCESS") == "1"
+monitor_scheduler = MonitorScheduler(build_report)
+
+def monitor_info(row: models.db.Monitor) -> dict:
+    return {
+        "id": row.id,
+        "url": row.target_url,
+        "interval_seconds": row.interval_seconds,
+        "quick_interval_seconds": row.quick_interval_seconds,
+        "active": row.active,
+        "last_scan_id": row.last_scan_id,
+    }
+
+async def owned_monitor(db: AsyncSession, monitor_id: int, user_id: int) -> models.db.Monitor:
+    # Someone else's monitor is a 404 too, so ids cannot be probed
+    row = await db.get(models.db.Monitor, monitor_id)
+    if row is None or row.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Monitor not found")
+    return row
+
+@app.post("/api/monitors", response_model=MonitorInfo, status_code=201)
+async def create_monitor(request: MonitorRequest, raw_request: Request, db: AsyncSession = Depends(get_async_db)):
+    """Watches a site for the signed-in caller, up to MONITORS_PER_USER_FREE / _PREMIUM active monitors."""
+    user_id, premium = await require_user(raw_request, "Sign in to monitor a site")
+    if min(request.interval_seconds, request.quick_interval_seconds) < MONITOR_MIN_INTERVAL:
+        raise HTTPException(status_code=422, detail=f"Intervals must be at least {MONITOR_MIN_INTERVAL} seconds")
+    limit = MONITORS_PER_USER_PREMIUM if premium else MONITORS_PER_USER_FREE
+    active = await db.scalar(
+        select(func.count()).select_from(models.db.Monitor)
+        .where(models.db.Monitor.user_id == user_id, models.db.Monitor.active.is_(True))
+    )
+    if active >= limit:
+        raise HTTPException(status_code=403, detail=f"Your plan can monitor at most {limit} sites")
+    row = models.db.Monitor(
+        user_id=user_id,
+        target_url=str(request.url),
+        interval_seconds=request.interval_seconds,
+        quick_interval_seconds=request.quick_interval_seconds,
+    )
+    db.add(row)
+    await db.commit()
+    if MONITOR_IN_PROCESS:
+        monitor_scheduler.add(row)
+    return monitor_info(row)
+
+@app.delete("/api/monitors/{monitor_id}", response_model=MonitorInfo)
+async def delete_monitor(monitor_id: int, raw_request: Request, db: AsyncSession = Depends(get_async_db)):
+    user_id, _ = await require_user(raw_request, "Sign in to manage your monitors")
+    row = await owned_monitor(db, monitor_id, user_id)
+    row.active = False
+    await db.commit()
+    monitor_scheduler.remove(monitor_id)
+    return monitor_info(row)
+
+@app.get("/api/monitors/{monitor_id}/alerts")
+async def list_monitor_alerts(monitor_id: int, raw_request: Request, limit: int = 50,
+                              db: AsyncSession = Depends(get_async_db)):
+    """Most recent changes first."""
+    user_id, _ = await require_user(raw_request, "Sign in to see your monitors' alerts")
+    await owned_monitor(db, monitor_id, user_id)
+    alerts = await db.scalars(
+        select(models.db.MonitorAlert)
+        .where(models.db.MonitorAlert.monitor_id == monitor_id)
+        .order_by(models.db.MonitorAlert.id.desc())
+        .limit(min(limit, 500))
+    )
+    return [
+        {"id": alert.id, "scan_id": alert.scan_id, "changes": alert.changes, "created_at": alert.created_at}
+        for alert in alerts
+    ]
+
 @app.get("/api/checkout")
 async def create_checkout_session(site: str = ""):
     return RedirectResponse(url=f"http://localhost:3000/?paid=true")
 
-from fastapi import Response
 
-from pdf_generator import generate_scan_pdf
-
-@app.get("/api/scans/{scan_id}/pdf")
-async def download_scan_pdf(scan_id: int, db: Session = Depends(get_db)):
-    db_scan = db.query(models.db.ScanHistory).filter(models.db.ScanHistory.id == scan_id).first()
-    if not db_scan:
-        raise HTTPException(status_code=404, detail="Scan not found")
-        
-    raw_data = json.loads(db_scan.raw_result)
+def pdf_template_data(db_scan: models.db.ScanHistory) -> dict:
+    # Normalized rows first; scans not yet backfilled by `migrate.py --backfill` fall back to the blob
+    if db_scan.checker_results:
+        summary = db_scan.ai_summary
+        issues = [
+            {"title": issue.title, "difficulty": issue.difficulty, "impact": issue.impact, "fix_snippet": issue.fix_snippet}
+            for issue in db_scan.issues
+        ]
+    else:
+        raw_data = json.loads(db_scan.raw_result)
+        summary = raw_data.get("ai_summary")
+        issues = raw_data.get("issues", [])
     
     # Structure data for our template
-    template_data = {
+    return {
         "target_url": db_scan.target_url,
         "score": db_scan.score,
         "grade": db_scan.grade,
-        "summary": raw_data.get("ai_summary", "No summary available."),
+        # The scan date, not the render date, so a cached PDF stays identical
+        "date": db_scan.created_at.strftime("%B %d, %Y") if db_scan.created_at else None,
+        "summary": summary or "No summary available.",
         "issues": [
             {
                 "title": issue.get("title"),
                 "severity": issue.get("difficulty"),
-                "impact": issue.get("risk_impact"),
-                "fix": issue.get("fix_guide")
+                "impact": issue.get("impact"),
+                "fix": issue.get("fix_snippet")
             }
-            for issue in raw_data.get("issues", [])
+            for issue in issues
         ]
     }
-    
-    pdf_bytes = await generate_scan_pdf(template_data)
-    
-    return Response(
-        content=pdf_bytes,
+
+async def load_pdf_data(scan_id: int) -> Optional[dict]:
+    async with AsyncSessionLocal() as db:
+        # Relationships cannot lazy-load on an async session: fetch them with the row
+        db_scan = await db.get(models.db.ScanHistory, scan_id, options=[
+            selectinload(models.db.ScanHistory.checker_results), selectinload(models.db.ScanHistory.issues)
+        ])
+        return pdf_template_data(db_scan) if db_scan else None
+
+# scan id -> background LLM summary, so clients can wait for it
+pending_summaries: Dict[int, asyncio.Task] = {}
+# scan id -> timings still to be completed and written by finish_scan
+pending_timings: Dict[int, dict] = {}
+
+async def refine_summary(scan_id: int, final_result: dict) -> str:
+    """Replaces the template summary with the LLM one on the row and the cached report."""
+    try:
+        started = time.perf_counter()
+        summary = await generate_ai_summary(final_result["score"], final_result["grade"], final_result["issues"])
+        if final_result.get("timings") is not None:
+            final_result["timings"]["ai_summary_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if summary:
+            await update_scan(scan_id, ai_summary=summary)
+            final_result["ai_summary"] = summary
+            get_pdf_store().invalidate(scan_id)
+        return final_result["ai_summary"]
+    finally:
+        final_result["ai_summary_pending"] = False
+        pending_summaries.pop(scan_id, None)
+
+async def finish_scan(scan_id: int):
+    # Render the PDF after the LLM summary has landed, so it is rendered once with the final text
+    refining = pending_summaries.get(scan_id)
+    if refining is not None:
+        try:
+            await asyncio.shield(refining)
+        except Exception as e:
+            print(f"AI summary for scan {scan_id} failed:", e)
+    started = time.perf_counter()
+    await prerender_pdf(scan_id)
+    timings = pending_timings.pop(scan_id, None)
+    if timings is not None:
+        timings["pdf_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        await save_timings(scan_id, timings)
+
+async def update_scan(scan_id: int, **values):
+    with timed("db_write"):
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(models.db.ScanHistory).where(models.db.ScanHistory.id == scan_id).values(**values))
+            await db.commit()
+
+async def save_timings(scan_id: int, timings: dict):
+    try:
+        await update_scan(scan_id, timings=timings)
+    except Exception as e:
+        print(f"Saving timings for scan {scan_id} failed:", e)
+
+SCAN_PAGE_MAX = 100
+
+def encode_cursor(created_at, scan_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), scan_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, scan_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(scan_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_before(db: AsyncSession, created_at: datetime, scan_id: int):
+    """Rows strictly after (created_at, id) in newest-first order."""
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite keeps CURRENT_TIMESTAMP as text without fractional seconds: compare in that format
+        text_value = created_at.strftime("%Y-%m-%d %H:%M:%S") + (".%06d" % created_at.microsecond if created_at.microsecond else "")
+        return tuple_(type_coerce(models.db.ScanHistory.created_at, String), models.db.ScanHistory.id) < \
+            tuple_(literal(text_value, String), scan_id)
+    return tuple_(models.db.ScanHistory.created_at, models.db.ScanHistory.id) < tuple_(created_at, scan_id)
+
+@app.get("/api/scans", response_model=ScanPage)
+async def list_scans(raw_request: Request, limit: int = 20, cursor: Optional[str] = None,
+                     db: AsyncSession = Depends(get_async_db)):
+    """
+    The caller's scans (signed in, see auth.py), newest first, as summary columns only. Keyset-paginated
+    on (user_id, created_at, id), so every page costs the same however deep it is.
+    """
+    user = await require_user(raw_request, "Sign in to see your scan history")
+    ScanHistory = models.db.ScanHistory
+    query = (
+        select(ScanHistory.id, ScanHistory.target_url, ScanHistory.score, ScanHistory.grade,
+               ScanHistory.issues_found, ScanHistory.created_at)
+        .where(ScanHistory.user_id == user[0])
+        .order_by(ScanHistory.created_at.desc(), ScanHistory.id.desc())
+    )
+    if cursor:
+        query = query.where(keyset_before(db, *decode_cursor(cursor)))
+    limit = max(1, min(limit, SCAN_PAGE_MAX))
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    page = rows[:limit]
+    return {
+        "items": [
+            {"id": row.id, "url": row.target_url, "score": row.score, "grade": row.grade,
+             "issues_found": row.issues_found or 0, "created_at": row.created_at}
+            for row in page
+        ],
+        "next_cursor": encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None,
+    }
+
+async def scanned_sites(db: AsyncSession) -> Dict[str, int]:
+    rows = await db.execute(select(models.db.GradeCount.grade, models.db.GradeCount.sites))
+    return {grade: sites for grade, sites in rows if sites > 0}
+
+def percent(part: int, total: int) -> float:
+    return round(100 * part / total, 1) if total else 0.0
+
+@app.get("/api/trends/issues")
+async def issue_trends(db: AsyncSession = Depends(get_async_db)):
+    """Share of scanned domains (by their latest scan) that have each issue, most common first."""
+    total = sum((await scanned_sites(db)).values())
+    rows = await db.execute(
+        select(models.db.IssuePrevalence.issue_key, models.db.IssuePrevalence.sites)
+        .where(models.db.IssuePrevalence.sites > 0)
+        .order_by(models.db.IssuePrevalence.sites.desc(), models.db.IssuePrevalence.issue_key)
+    )
+    return {
+        "sites": total,
+        "issues": [
+            {"key": key, "title": ISSUE_TEMPLATES.get(key, {}).get("title"), "sites": sites, "percent": percent(sites, total)}
+            for key, sites in rows
+        ],
+    }
+
+@app.get("/api/trends/grades")
+async def grade_trends(db: AsyncSession = Depends(get_async_db)):
+    """Scanned domains by the grade of their latest scan."""
+    grades = await scanned_sites(db)
+    total = sum(grades.values())
+    return {
+        "sites": total,
+        "grades": {grade: {"sites": sites, "percent": percent(sites, total)} for grade, sites in sorted(grades.items())},
+    }
+
+@app.get("/api/trends/domains/{domain}")
+async def domain_trend(domain: str, db: AsyncSession = Depends(get_async_db)):
+    """The latest score of a domain."""
+    row = await db.get(models.db.DomainScore, aggregates.domain_of(f"//{domain}"))
+    if row is None:
+        raise HTTPException(status_code=404, detail="Domain has not been scanned")
+    return {"domain": row.domain, "scan_id": row.scan_id, "score": row.score, "grade": row.grade,
+            "issues": row.issue_keys or [], "updated_at": row.updated_at}
+
+@app.get("/api/scans/{scan_id}/summary")
+async def stream_summary(scan_id: int):
+    """
+    Server-Sent Events: a single `summary` event with the final AI summary of the scan,
+    sent as soon as it is ready (immediately if it already is).
+    """
+    refining = pending_summaries.get(scan_id)
+    summary = None
+    if refining is None:
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(models.db.ScanHistory.ai_summary, models.db.ScanHistory.raw_result).where(models.db.ScanHistory.id == scan_id)
+            )).first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Scan not found")
+        summary = row.ai_summary or json.loads(row.raw_result or "{}").get("ai_summary")
+
+    async def events():
+        text = summary
+        if refining is not None:
+            text = await asyncio.shield(refining)
+        yield f"event: summary\ndata: {json.dumps({'id': scan_id, 'ai_summary': text})}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def prerender_pdf(scan_id: int):
+    # Runs after /api/scan has responded, so the first download is already a disk read.
+    # Without a working browser (backing off after a failed launch) there is nothing to do.
+    if not browser_pool.available:
+        return
+    try:
+        data = await load_pdf_data(scan_id)
+        if data is not None:
+            await get_pdf_store().render(scan_id, data)
+    except Exception as e:
+        print(f"PDF prerender for scan {scan_id} failed:", e)
+
+@app.get("/api/scans/{scan_id}/pdf")
+async def download_scan_pdf(scan_id: int, request: Request):
+    data = await load_pdf_data(scan_id)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    # The ETag follows the report's content, so a rescore or a new summary is never answered with a 304;
+    # no-cache makes clients ask every time instead of keeping a stale copy for a day
+    pdf_store = get_pdf_store()
+    etag = pdf_store.etag(scan_id, pdf_store.digest(data))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if pdf_store.matches(etag, request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        path = await pdf_store.render(scan_id, data)
+    except RendererBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+    return FileResponse(
+        path,
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=shieldscan_report_{scan_id}.pdf"}
+        filename=f"shieldscan_report_{scan_id}.pdf",
+        headers=headers
     )
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: timing histograms, error/timeout counters, pool gauges."""
+    return PlainTextResponse(telemetry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
+    from migrate import upgrade_schema
+    # Local development: bring the schema up to date before serving
+    upgrade_schema()
     print("\n" + "="*50)
     print("==> BACKEND SERVER IS RUNNING!")
     print("==> CLICK HERE TO OPEN: http://localhost:8000/")
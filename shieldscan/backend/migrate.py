@@ -0,0 +1,94 @@
+"""
+Schema upgrades and data backfills.
+
+    python migrate.py                 # create missing tables, columns and indexes
+    python migrate.py --backfill      # ...then normalize rows that only have raw_result
+    python migrate.py --rebuild-aggregates   # ...then recompute the trend tables (see aggregates.py)
+
+Run it before starting the API or the monitor: neither creates the schema when it starts
+(`python main.py` does, for local development).
+"""
+import argparse
+import json
+
+from sqlalchemy import exists, inspect, text
+
+from database import engine, SessionLocal, Base
+from models.db import ScanHistory, CheckerResult
+
+def upgrade_schema(bind=engine):
+    """
+    Idempotent: creates missing tables, then adds the columns and indexes that
+    create_all cannot add to tables which already exist.
+    """
+    Base.metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn, checkfirst=True)
+
+def backfill_normalized(batch_size: int = 500) -> int:
+    """
+    Fills scan_issues / checker_results (and ai_summary) for rows that were stored
+    as a raw_result blob only. Walks the table by id in batches so memory stays bounded.
+    """
+    done = 0
+    last_id = 0
+    while True:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ScanHistory)
+                .filter(ScanHistory.id > last_id)
+                .filter(~exists().where(CheckerResult.scan_id == ScanHistory.id))
+                .order_by(ScanHistory.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return done
+            for row in rows:
+                try:
+                    data = json.loads(row.raw_result or "{}")
+                except ValueError:
+                    data = {}
+                data.setdefault("url", row.target_url)
+                row.normalize(data)
+                if row.ai_summary is None:
+                    row.ai_summary = data.get("ai_summary")
+            last_id = rows[-1].id
+            db.commit()
+            done += len(rows)
+            print(f"Normalized {done} scans (up to id {last_id})")
+        finally:
+            db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade the ShieldScan database schema")
+    parser.add_argument("--backfill", action="store_true", help="normalize existing raw_result rows")
+    parser.add_argument("--rebuild-aggregates", action="store_true",
+                        help="recompute domain_scores, issue_prevalence and grade_counts from scan_history")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    upgrade_schema()
+    print("Schema is up to date")
+    if args.backfill:
+        print(f"Backfilled {backfill_normalized(args.batch_size)} scans")
+    if args.rebuild_aggregates:
+        import aggregates
+        db = SessionLocal()
+        try:
+            domains = aggregates.rebuild(db)
+            db.commit()
+        finally:
+            db.close()
+        print(f"Rebuilt trend aggregates for {domains} domains")
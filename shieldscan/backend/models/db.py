@@ -1,18 +1,27 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+import json
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, ForeignKey, Index
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
+from scoring.rules import checker_results_from
 
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    clerk_id = Column(String, unique=True, index=True, nullable=True) # Will map to our frontend clerk user
+    clerk_id = Column(String, unique=True, index=True, nullable=True) # the auth provider's user id (Supabase `sub`, see auth.py)
     email = Column(String, unique=True, index=True)
     is_premium = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class ScanHistory(Base):
     __tablename__ = "scan_history"
+    __table_args__ = (
+        Index("ix_scan_history_target_url_created_at", "target_url", "created_at"),
+        Index("ix_scan_history_grade", "grade"),
+        # Keyset pagination of a user's history, newest first (GET /api/scans)
+        Index("ix_scan_history_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True, nullable=True) # Optional for guest scans
@@ -20,5 +29,150 @@ class ScanHistory(Base):
     score = Column(Integer)
     grade = Column(String)
     issues_found = Column(Integer)
+    ai_summary = Column(Text, nullable=True)
     raw_result = Column(Text) # JSON serialized blob of the full report
+    # Where the scan spent its time: checkers, outbound requests, DB write, summary, PDF (see telemetry.py)
+    timings = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    issues = relationship("ScanIssue", back_populates="scan", cascade="all, delete-orphan", order_by="ScanIssue.id")
+    checker_results = relationship("CheckerResult", back_populates="scan", cascade="all, delete-orphan")
+
+    @classmethod
+    def from_result(cls, final_result: dict, user_id=None) -> "ScanHistory":
+        scan = cls(
+            user_id=user_id,
+            target_url=final_result["url"],
+            score=final_result["score"],
+            grade=final_result["grade"],
+            issues_found=len(final_result["issues"]),
+            ai_summary=final_result.get("ai_summary"),
+            raw_result=json.dumps({k: v for k, v in final_result.items() if k != "timings"}, default=str),
+            timings=final_result.get("timings"),
+        )
+        scan.normalize(final_result)
+        return scan
+
+    def normalize(self, final_result: dict):
+        """Fills the issue and per-checker rows from a report dict (new or stored)."""
+        timed_out = set(final_result.get("timed_out") or [])
+        self.issues = [ScanIssue.from_issue(issue, self.target_url) for issue in final_result.get("issues", [])]
+        self.checker_results = [
+            CheckerResult(checker=name, result=result, timed_out=name in timed_out or bool(result.get("timed_out")),
+                          error=result.get("error"))
+            for name, result in checker_results_from(final_result).items()
+        ]
+
+class ScanIssue(Base):
+    __tablename__ = "scan_issues"
+    __table_args__ = (
+        # "all sites with mcp_exposed last week"
+        Index("ix_scan_issues_issue_key_created_at", "issue_key", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    scan_id = Column(Integer, ForeignKey("scan_history.id", ondelete="CASCADE"), index=True, nullable=False)
+    issue_key = Column(String, index=True)
+    target_url = Column(String) # denormalized so issue queries need no join
+    title = Column(String)
+    impact = Column(Text)
+    category = Column(String)
+    difficulty = Column(String)
+    score_impact = Column(Integer)
+    fix_snippet = Column(Text, nullable=True)
+    details = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    scan = relationship("ScanHistory", back_populates="issues")
+
+    @classmethod
+    def from_issue(cls, issue: dict, target_url: str) -> "ScanIssue":
+        return cls(
+            issue_key=issue.get("key") or issue_key_for_title(issue.get("title")),
+            target_url=target_url,
+            title=issue.get("title"),
+            impact=issue.get("impact"),
+            category=issue.get("category"),
+            difficulty=issue.get("difficulty"),
+            score_impact=issue.get("score_impact"),
+            fix_snippet=issue.get("fix_snippet"),
+            details=issue.get("details"),
+        )
+
+class CheckerResult(Base):
+    __tablename__ = "checker_results"
+
+    id = Column(Integer, primary_key=True)
+    scan_id = Column(Integer, ForeignKey("scan_history.id", ondelete="CASCADE"), index=True, nullable=False)
+    checker = Column(String, index=True)
+    result = Column(JSON)
+    timed_out = Column(Boolean, default=False)
+    error = Column(Text, nullable=True)
+
+    scan = relationship("ScanHistory", back_populates="checker_results")
+
+class Monitor(Base):
+    """A site that is rescanned on a schedule; see monitor.py."""
+    __tablename__ = "monitors"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, index=True, nullable=True)
+    target_url = Column(String, index=True)
+    interval_seconds = Column(Integer, default=86400) # full scan, including path probing
+    quick_interval_seconds = Column(Integer, default=3600) # cheap checks only (certificate, DNS)
+    active = Column(Boolean, default=True, index=True)
+    last_scan_id = Column(Integer, ForeignKey("scan_history.id", ondelete="SET NULL"), nullable=True)
+    last_checked_at = Column(DateTime(timezone=True), nullable=True)
+    next_full_at = Column(DateTime(timezone=True), nullable=True)
+    next_quick_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class MonitorAlert(Base):
+    __tablename__ = "monitor_alerts"
+
+    id = Column(Integer, primary_key=True)
+    monitor_id = Column(Integer, ForeignKey("monitors.id", ondelete="CASCADE"), index=True, nullable=False)
+    scan_id = Column(Integer, ForeignKey("scan_history.id", ondelete="CASCADE"), nullable=False)
+    changes = Column(JSON) # {"score": [old, new], "new_issues": [...], "resolved_issues": [...]}
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DomainScore(Base):
+    """The latest scan of each domain; see aggregates.py."""
+    __tablename__ = "domain_scores"
+
+    domain = Column(String, primary_key=True)
+    scan_id = Column(Integer, nullable=False)
+    score = Column(Integer)
+    grade = Column(String)
+    issue_keys = Column(JSON) # sorted issue keys of that scan
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class IssuePrevalence(Base):
+    """Domains whose latest scan has the issue."""
+    __tablename__ = "issue_prevalence"
+
+    issue_key = Column(String, primary_key=True)
+    sites = Column(Integer, nullable=False, default=0)
+
+class GradeCount(Base):
+    """Domains whose latest scan got the grade; the sum is the number of scanned domains."""
+    __tablename__ = "grade_counts"
+
+    grade = Column(String, primary_key=True)
+    sites = Column(Integer, nullable=False, default=0)
+
+class ResponseValidator(Base):
+    """The last response to one request of a target's scans, for revalidation; see scanners/validators.py."""
+    __tablename__ = "response_validators"
+
+    target = Column(String, primary_key=True) # normalized scan target (scanners.cache.normalize_target)
+    request_key = Column(String, primary_key=True) # hash of the request: method or probe, URL, options
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    response = Column(JSON) # the PageFetch / ProbeResult analyzers saw
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
+def issue_key_for_title(title):
+    # Rows stored before issues carried their key: map the title back through the templates
+    from ai.summary import ISSUE_KEYS_BY_TITLE
+    return ISSUE_KEYS_BY_TITLE.get(title)
@@ -1,10 +1,13 @@
 from pydantic import BaseModel, HttpUrl
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 
 class ScanRequest(BaseModel):
     url: HttpUrl
+    force_refresh: bool = False # bypass cached results and rescan everything
 
 class Issue(BaseModel):
+    key: Optional[str] = None # template key, e.g. "missing_csp"
     title: str
     impact: str
     difficulty: str  # "Easy", "Medium", "Advanced"
@@ -21,10 +24,47 @@ class ScanResult(BaseModel):
     grade: str # A, B, C, D, F
     issues: List[Issue]
     ai_summary: str
+    ai_summary_pending: bool = False # an AI summary will follow on /api/scans/{id}/summary
     ssl_status: Dict[str, Any]
     headers_status: Dict[str, Any]
     blacklist_status: Dict[str, Any]
     mcp_exposed: bool
     cors_vulnerable: bool
+    mcp_status: Optional[Dict[str, Any]] = None
+    cors_status: Optional[Dict[str, Any]] = None
     exposure_status: Optional[Dict[str, Any]] = None
     dmarc_status: Optional[Dict[str, Any]] = None
+    timed_out: List[str] = [] # checkers that missed the scan deadline
+
+class BatchScanRequest(BaseModel):
+    urls: List[str]
+
+class BatchJobCreated(BaseModel):
+    job_id: str
+    total: int
+    rejected: List[str] = [] # entries that were not valid URLs
+
+class MonitorRequest(BaseModel):
+    url: HttpUrl
+    interval_seconds: int = 86400 # full scan
+    quick_interval_seconds: int = 3600 # certificate and DNS checks only
+
+class MonitorInfo(BaseModel):
+    id: int
+    url: str
+    interval_seconds: int
+    quick_interval_seconds: int
+    active: bool
+    last_scan_id: Optional[int] = None
+
+class ScanSummary(BaseModel):
+    id: int
+    url: str
+    score: int
+    grade: str
+    issues_found: int
+    created_at: Optional[datetime] = None
+
+class ScanPage(BaseModel):
+    items: List[ScanSummary]
+    next_cursor: Optional[str] = None # pass as ?cursor= for the next (older) page
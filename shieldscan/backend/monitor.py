@@ -0,0 +1,283 @@
+"""
+Scheduled rescans of watched sites.
+
+    python monitor.py        # run the scheduler as its own worker process
+
+Set MONITOR_IN_PROCESS=1 to run it inside the API process instead (one API worker only,
+or every worker schedules the same sites).
+
+Each monitor has two schedules: a full scan every `interval_seconds`, and a quick pass
+of the cheap checkers (certificate, DNS) every `quick_interval_seconds` that reuses the
+last full results for the rest. A new result is compared with the monitor's last stored
+scan; only a changed result is stored as a ScanHistory row and raised as an alert.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import aggregates
+from database import SessionLocal
+import models.db
+from scoring.rules import checker_results_from
+from telemetry import timed
+
+MONITOR_CONCURRENCY = int(os.environ.get("MONITOR_CONCURRENCY", "10"))
+# Scans are rescheduled at interval * (1 +/- jitter) so sites added together drift apart
+MONITOR_JITTER = float(os.environ.get("MONITOR_JITTER", "0.1"))
+# Overdue monitors (e.g. after a restart) are spread over this window instead of all at once
+MONITOR_CATCHUP_WINDOW = int(os.environ.get("MONITOR_CATCHUP_WINDOW_SECONDS", "600"))
+# How often the scheduler picks up monitors added or removed by another process
+MONITOR_RELOAD_SECONDS = int(os.environ.get("MONITOR_RELOAD_SECONDS", "60"))
+MONITOR_MIN_INTERVAL = int(os.environ.get("MONITOR_MIN_INTERVAL_SECONDS", "300"))
+# Active monitors a user may have, by tier
+MONITORS_PER_USER_FREE = int(os.environ.get("MONITORS_PER_USER_FREE", "3"))
+MONITORS_PER_USER_PREMIUM = int(os.environ.get("MONITORS_PER_USER_PREMIUM", "50"))
+MONITOR_WEBHOOK_URL = os.environ.get("MONITOR_WEBHOOK_URL")
+
+# Checkers cheap enough for the quick schedule: one handshake or a few DNS queries
+QUICK_CHECKERS = ("ssl", "dmarc", "blacklist")
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None: # SQLite drops the zone; values are stored in UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def _datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+def diff_reports(previous: dict, current: dict) -> dict:
+    """What changed between two reports; empty when nothing a user would care about did."""
+    changes = {}
+    for field in ("score", "grade"):
+        if previous.get(field) != current.get(field):
+            changes[field] = [previous.get(field), current.get(field)]
+    old_issues = {issue.get("key") for issue in previous.get("issues", [])}
+    new_issues = {issue.get("key") for issue in current.get("issues", [])}
+    if new_issues - old_issues:
+        changes["new_issues"] = sorted(new_issues - old_issues)
+    if old_issues - new_issues:
+        changes["resolved_issues"] = sorted(old_issues - new_issues)
+    return changes
+
+class MonitorScheduler:
+    """
+    Priority queue of (due time, monitor, kind) with at most MONITOR_CONCURRENCY checks
+    running at once. Removed or rescheduled monitors leave stale heap entries behind,
+    which are skipped when they come up.
+    """
+
+    def __init__(self, scan: Callable[..., Awaitable[dict]]):
+        self.scan = scan
+        self._heap: list = []
+        self._order = itertools.count() # tie-breaker so equal due times never compare dicts
+        self._monitors: Dict[int, dict] = {}
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(MONITOR_CONCURRENCY)
+        self._running: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        tasks = list(self._running) + ([self._task] if self._task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def add(self, row: "models.db.Monitor"):
+        """Starts watching a monitor row (new or loaded) on its stored schedule."""
+        now = time.time()
+        monitor = self._monitors.get(row.id)
+        if monitor is None:
+            monitor = {"id": row.id, "due": {}}
+            self._monitors[row.id] = monitor
+            if row.last_checked_at is None:
+                # Never scanned: full scan now, quick checks somewhere within their interval
+                self._schedule(monitor, "full", now)
+                self._schedule(monitor, "quick", now + random.uniform(0, row.quick_interval_seconds))
+            else:
+                for kind, stored in (("full", row.next_full_at), ("quick", row.next_quick_at)):
+                    due = _timestamp(stored)
+                    if due is None or due < now:
+                        due = now + random.uniform(0, MONITOR_CATCHUP_WINDOW)
+                    self._schedule(monitor, kind, due)
+        monitor.update(
+            url=row.target_url,
+            user_id=row.user_id,
+            interval={"full": row.interval_seconds, "quick": row.quick_interval_seconds},
+            last_scan_id=row.last_scan_id,
+        )
+
+    def remove(self, monitor_id: int):
+        self._monitors.pop(monitor_id, None)
+
+    def _schedule(self, monitor: dict, kind: str, due: float):
+        monitor["due"][kind] = due
+        heapq.heappush(self._heap, (due, next(self._order), monitor["id"], kind))
+        self._wake.set()
+
+    async def reload(self):
+        def load():
+            db = SessionLocal()
+            try:
+                return db.query(models.db.Monitor).filter(models.db.Monitor.active.is_(True)).all()
+            finally:
+                db.close()
+        rows = await run_in_threadpool(load)
+        active = {row.id for row in rows}
+        for monitor_id in list(self._monitors):
+            if monitor_id not in active:
+                self.remove(monitor_id)
+        for row in rows:
+            self.add(row)
+
+    async def _run(self):
+        next_reload = 0.0
+        while True:
+            now = time.time()
+            if now >= next_reload:
+                try:
+                    await self.reload()
+                except Exception as e:
+                    print("Monitor reload failed:", e)
+                next_reload = now + MONITOR_RELOAD_SECONDS
+            wait = next_reload - now
+            if self._heap:
+                wait = min(wait, self._heap[0][0] - now)
+            if wait > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, _, monitor_id, kind = heapq.heappop(self._heap)
+            monitor = self._monitors.get(monitor_id)
+            if monitor is None or monitor["due"].get(kind) != due:
+                continue
+            # Waiting here (rather than in the task) keeps a backlog in the heap, not in memory
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._check(monitor, kind))
+            self._running.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        self._running.discard(task)
+        self._slots.release()
+
+    async def _check(self, monitor: dict, kind: str):
+        next_due = time.time() + monitor["interval"][kind] * (1 + random.uniform(-MONITOR_JITTER, MONITOR_JITTER))
+        try:
+            previous = await run_in_threadpool(self._load_previous, monitor)
+            if kind == "quick" and previous is None:
+                return # a quick pass needs a full result to fill in the checkers it skips
+            base_results = checker_results_from(previous) if previous else None
+            checkers = QUICK_CHECKERS if kind == "quick" else None
+            report = await self.scan(monitor["url"], force_refresh=True, checkers=checkers, base_results=base_results)
+            changes = diff_reports(previous, report) if previous else None
+            with timed("db_write"):
+                scan_id = await run_in_threadpool(self._record, monitor, kind, next_due, report, previous is None, changes)
+            if scan_id is not None:
+                monitor["last_scan_id"] = scan_id
+            if changes:
+                await notify(monitor, scan_id, changes)
+        except Exception as e:
+            print(f"Monitor check failed for {monitor['url']}: {e}")
+        finally:
+            if monitor["id"] in self._monitors:
+                self._schedule(monitor, kind, next_due)
+
+    @staticmethod
+    def _load_previous(monitor: dict) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            query = db.query(models.db.ScanHistory.raw_result)
+            if monitor["last_scan_id"]:
+                row = query.filter(models.db.ScanHistory.id == monitor["last_scan_id"]).first()
+            elif monitor["user_id"] is None:
+                return None # no owner to take a baseline from: the first full scan is the baseline
+            else:
+                # Only the owner's own scans; anyone else's would leak into this owner's alerts
+                row = (
+                    query.filter(models.db.ScanHistory.target_url == monitor["url"],
+                                 models.db.ScanHistory.user_id == monitor["user_id"])
+                    .order_by(models.db.ScanHistory.created_at.desc())
+                    .first()
+                )
+            return json.loads(row.raw_result) if row and row.raw_result else None
+        finally:
+            db.close()
+
+    @staticmethod
+    def _record(monitor: dict, kind: str, next_due: float, report: dict, first: bool, changes: Optional[dict]) -> Optional[int]:
+        """Stores the scan and alert when something changed, and the next due time either way."""
+        db = SessionLocal()
+        try:
+            row = db.get(models.db.Monitor, monitor["id"])
+            if row is None:
+                return None
+            scan_id = None
+            if first or changes:
+                scan = models.db.ScanHistory.from_result(report, user_id=monitor["user_id"])
+                db.add(scan)
+                db.flush()
+                aggregates.record_scans(db, [aggregates.scan_facts(scan)])
+                scan_id = row.last_scan_id = scan.id
+                if changes:
+                    db.add(models.db.MonitorAlert(monitor_id=row.id, scan_id=scan_id, changes=changes))
+            row.last_checked_at = _datetime(time.time())
+            setattr(row, "next_full_at" if kind == "full" else "next_quick_at", _datetime(next_due))
+            db.commit()
+            return scan_id
+        finally:
+            db.close()
+
+async def notify(monitor: dict, scan_id: int, changes: dict):
+    print(f"Monitor {monitor['id']} ({monitor['url']}) changed: {changes}")
+    if not MONITOR_WEBHOOK_URL:
+        return
+    from scanners.http import get_client
+    try:
+        await get_client().post(MONITOR_WEBHOOK_URL, json={
+            "monitor_id": monitor["id"],
+            "url": monitor["url"],
+            "scan_id": scan_id,
+            "changes": changes,
+        })
+    except Exception as e:
+        print("Monitor webhook failed:", e)
+
+async def main():
+    from report import build_report
+    from scanners.http import close_client
+    from scanners.psl import get_psl
+
+    get_psl()
+    scheduler = MonitorScheduler(build_report)
+    scheduler.start()
+    print(f"Monitoring with up to {MONITOR_CONCURRENCY} concurrent checks")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await scheduler.stop()
+        await close_client()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,147 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, Optional, Tuple
+
+from pdf_generator import TEMPLATES_DIR, generate_scan_pdf
+
+# A rendered report is named after what went into it (the template data and the template
+# version), so a rescore or a new AI summary gets a new file and a new ETag
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(os.path.dirname(__file__), "pdf_cache"))
+# Bump when the PDF output changes without a template change (page options, data mapping)
+RENDER_VERSION = "1"
+# Renders not downloaded for this long are deleted, then the least recently used ones until the cache fits
+PDF_CACHE_MAX_AGE_DAYS = float(os.environ.get("PDF_CACHE_MAX_AGE_DAYS", "30"))
+PDF_CACHE_MAX_MB = float(os.environ.get("PDF_CACHE_MAX_MB", "1024"))
+SWEEP_INTERVAL_SECONDS = 300
+
+def _template_hash() -> str:
+    digest = hashlib.sha256(RENDER_VERSION.encode())
+    for name in sorted(os.listdir(TEMPLATES_DIR)):
+        with open(os.path.join(TEMPLATES_DIR, name), "rb") as f:
+            digest.update(name.encode() + b"\0" + f.read())
+    return digest.hexdigest()[:16]
+
+class PDFStore:
+    """
+    Rendered reports on local disk, keyed by scan id plus a digest of the template data and
+    version. Concurrent requests for the same missing report share one render.
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_age_days: float = PDF_CACHE_MAX_AGE_DAYS,
+                 max_mb: float = PDF_CACHE_MAX_MB):
+        self.directory = directory
+        self.version = _template_hash()
+        self.max_age = max_age_days * 86400
+        self.max_bytes = max_mb * 1024 * 1024
+        self._renders: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._swept_at = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+    def digest(self, data: dict) -> str:
+        """Identifies one rendering: the same data and template give the same PDF."""
+        payload = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.version}\0{payload}".encode()).hexdigest()[:16]
+
+    def path(self, scan_id: int, digest: str) -> str:
+        return os.path.join(self.directory, f"{scan_id}-{digest}.pdf")
+
+    def etag(self, scan_id: int, digest: str) -> str:
+        return f'"{scan_id}-{digest}"'
+
+    def matches(self, etag: str, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+    def get(self, scan_id: int, digest: str) -> Optional[str]:
+        path = self.path(scan_id, digest)
+        try:
+            os.utime(path) # last use, for the LRU sweep
+        except FileNotFoundError:
+            return None
+        return path
+
+    def invalidate(self, scan_id: int):
+        """Drops every rendering of a scan (its data changed; the next download renders anew)."""
+        for path in glob.glob(os.path.join(self.directory, f"{scan_id}-*.pdf")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    async def render(self, scan_id: int, data: dict) -> str:
+        """Returns the cached file for this scan's template `data`, rendering it first if needed."""
+        digest = self.digest(data)
+        path = self.get(scan_id, digest)
+        if path:
+            return path
+        key = (scan_id, digest)
+        task = self._renders.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._render(scan_id, digest, data))
+            self._renders[key] = task
+            task.add_done_callback(lambda _: self._renders.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _render(self, scan_id: int, digest: str, data: dict) -> str:
+        pdf_bytes = await generate_scan_pdf(data)
+        # Write to a temp file and rename, so readers never see a half-written PDF
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(tmp_path, self.path(scan_id, digest))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if time.monotonic() - self._swept_at > SWEEP_INTERVAL_SECONDS:
+            self._swept_at = time.monotonic()
+            asyncio.get_running_loop().run_in_executor(None, self.sweep)
+        return self.path(scan_id, digest)
+
+    def sweep(self) -> int:
+        """
+        Deletes renders unused for max_age_days, then the least recently used ones until the
+        directory fits in max_mb. Returns the number of files deleted.
+        """
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith((".pdf", ".tmp")):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            # A .tmp file is a render in progress, unless a crash left it behind
+            if entry.name.endswith(".tmp") and stat.st_mtime > now - 3600:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        deleted = 0
+        for mtime, size, path in files:
+            if mtime > now - self.max_age and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return deleted
+
+_store: Optional[PDFStore] = None
+
+def get_pdf_store() -> PDFStore:
+    # Built on first use rather than at import: it creates the cache directory and hashes the templates
+    global _store
+    if _store is None:
+        _store = PDFStore()
+    return _store
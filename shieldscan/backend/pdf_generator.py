@@ -1,47 +1,235 @@
+import asyncio
+import math
 import os
-import json
+import time
 from datetime import datetime
-from jinja2 import Environment, FileSystemLoader
-from playwright.async_api import async_playwright
+from typing import Optional
+
+from telemetry import Gauge, timed
 
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
 
-async def generate_scan_pdf(scan_data: dict) -> bytes:
+# Pages kept open for rendering, and how many renders may wait for one before we refuse
+PDF_POOL_SIZE = int(os.environ.get("PDF_POOL_SIZE", "2"))
+PDF_MAX_QUEUE = int(os.environ.get("PDF_MAX_QUEUE", "20"))
+PDF_RENDER_TIMEOUT = float(os.environ.get("PDF_RENDER_TIMEOUT_SECONDS", "30"))
+# Launch Chromium in the background at startup (0: only when the first PDF is requested)
+PDF_PRESTART = os.environ.get("PDF_PRESTART", "1") == "1"
+HEALTH_CHECK_INTERVAL = 30
+# After a failed launch (e.g. no Chromium installed) nothing retries it for this long, doubling up to the max
+PDF_LAUNCH_BACKOFF = float(os.environ.get("PDF_LAUNCH_BACKOFF_SECONDS", "60"))
+PDF_LAUNCH_BACKOFF_MAX = float(os.environ.get("PDF_LAUNCH_BACKOFF_MAX_SECONDS", "3600"))
+
+_env = None
+
+def _get_env():
+    # Templates are compiled once and cached by the environment; they only change on deploy.
+    # jinja2 (like playwright) is imported on the first render, not when the API starts.
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemLoader
+        _env = Environment(loader=FileSystemLoader(TEMPLATES_DIR), auto_reload=False, cache_size=50)
+    return _env
+
+class RendererBusy(Exception):
+    """Raised when the render queue is full; callers should retry later."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RendererUnavailable(RendererBusy):
+    """Raised while the browser cannot be launched, until its backoff runs out."""
+
+class _Slot:
+    def __init__(self, context, page, generation: int):
+        self.context = context
+        self.page = page
+        self.generation = generation
+
+class BrowserPool:
     """
-    Takes scan data, renders it into an HTML template using Jinja2,
-    and then uses Playwright to convert the HTML to a PDF byte string.
+    One long-lived headless Chromium with a fixed set of reusable pages.
+    Renders wait for a free page (at most `max_queue` of them at a time), and a
+    crashed or disconnected browser is relaunched by the health check.
+
+    A launch that fails marks the pool unavailable for PDF_LAUNCH_BACKOFF seconds
+    (doubling on each further failure) and logs one warning, instead of every render
+    relaunching Playwright and printing its install banner again.
     """
-    # Initialize Jinja environment
-    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
-    
-    # Load the template (we'll create this next)
-    template = env.get_template("report.html")
-    
+
+    def __init__(self, size: int = PDF_POOL_SIZE, max_queue: int = PDF_MAX_QUEUE):
+        self.size = size
+        self.max_queue = max_queue
+        self._playwright = None
+        self._browser = None
+        self._generation = 0
+        self._slots: asyncio.Queue = asyncio.Queue()
+        self._waiting = 0
+        self._lock = asyncio.Lock()
+        self._watchdog: Optional[asyncio.Task] = None
+        self._failures = 0 # launches failed in a row
+        self._unavailable_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return self._browser is not None and self._browser.is_connected()
+
+    @property
+    def available(self) -> bool:
+        """False while a failed launch is backing off; renders would only fail."""
+        return time.monotonic() >= self._unavailable_until
+
+    async def start(self):
+        async with self._lock:
+            if self.healthy:
+                return
+            await self._launch_or_back_off()
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.ensure_future(self._watch())
+
+    async def stop(self):
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+        async with self._lock:
+            await self._close_browser()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    async def _launch_or_back_off(self):
+        if not self.available:
+            retry_after = math.ceil(self._unavailable_until - time.monotonic())
+            raise RendererUnavailable("PDF renderer is unavailable, try again later", retry_after=retry_after)
+        try:
+            await self._launch()
+        except Exception as e:
+            await self._close_browser()
+            self._failures += 1
+            backoff = min(PDF_LAUNCH_BACKOFF_MAX, PDF_LAUNCH_BACKOFF * 2 ** (self._failures - 1))
+            self._unavailable_until = time.monotonic() + backoff
+            if self._failures == 1:
+                # Playwright's message for a missing browser is a multi-line banner; its first line says enough
+                reason = (str(e).strip().splitlines() or [type(e).__name__])[0]
+                print(f"PDF renderer unavailable, PDFs are disabled and retried with backoff: {reason}")
+            raise RendererUnavailable("PDF renderer is unavailable, try again later", retry_after=math.ceil(backoff))
+        if self._failures:
+            print("PDF renderer is available again")
+        self._failures = 0
+
+    async def _launch(self):
+        await self._close_browser()
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._generation += 1
+        # Idle pages of the previous browser are discarded here, busy ones as they come back (see _release).
+        # The queue itself is kept so renders already waiting on it get the new pages.
+        while not self._slots.empty():
+            self._slots.get_nowait()
+        for _ in range(self.size):
+            context = await self._browser.new_context()
+            self._slots.put_nowait(_Slot(context, await context.new_page(), self._generation))
+
+    async def _close_browser(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+            self._browser = None
+
+    async def health_check(self):
+        if not self.healthy and self.available:
+            print("PDF renderer: browser is down, relaunching")
+            async with self._lock:
+                if not self.healthy:
+                    await self._launch_or_back_off()
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            try:
+                await self.health_check()
+            except RendererUnavailable:
+                pass # logged when the launch failed
+            except Exception as e:
+                print("PDF renderer health check failed:", e)
+
+    async def render(self, html: str) -> bytes:
+        if not self.healthy:
+            await self.start()
+        if self._waiting >= self.max_queue:
+            raise RendererBusy("PDF renderer is busy, try again shortly")
+
+        self._waiting += 1
+        try:
+            slot = await asyncio.wait_for(self._slots.get(), timeout=PDF_RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RendererBusy("Timed out waiting for a free PDF renderer")
+        finally:
+            self._waiting -= 1
+
+        broken = False
+        try:
+            # The report is self-contained HTML, so there is no network activity to wait for
+            await slot.page.set_content(html, wait_until="domcontentloaded")
+            return await slot.page.pdf(
+                format="A4",
+                print_background=True,
+                margin={"top": "2cm", "right": "2cm", "bottom": "2cm", "left": "2cm"}
+            )
+        except Exception:
+            broken = True
+            raise
+        finally:
+            await self._release(slot, broken)
+
+    async def _release(self, slot: _Slot, broken: bool):
+        if slot.generation != self._generation:
+            return
+        if broken:
+            try:
+                await slot.context.close()
+            except Exception:
+                pass
+            try:
+                # Usually only this page misbehaved: swap it for a fresh one in the same browser
+                context = await self._browser.new_context()
+                slot = _Slot(context, await context.new_page(), self._generation)
+            except Exception:
+                # The browser itself is gone; relaunching refills the pool
+                await self.health_check()
+                return
+        self._slots.put_nowait(slot)
+
+browser_pool = BrowserPool()
+
+Gauge("shieldscan_pdf_pages_busy", "Renderer pages in use", lambda: browser_pool.size - browser_pool._slots.qsize()
+      if browser_pool.healthy else 0)
+Gauge("shieldscan_pdf_pages", "Renderer pages in the pool", lambda: browser_pool.size if browser_pool.healthy else 0)
+Gauge("shieldscan_pdf_renders_waiting", "Renders waiting for a free page", lambda: browser_pool._waiting)
+
+def render_report_html(scan_data: dict) -> str:
+    template = _get_env().get_template("report.html")
+
     # Structure data for the template
     # `scan_data` should contain things like score, grade, target_url, issues, etc.
-    rendered_html = template.render(
+    return template.render(
         target_url=scan_data.get("target_url", "Unknown Domain"),
-        date=datetime.now().strftime("%B %d, %Y"),
+        date=scan_data.get("date") or datetime.now().strftime("%B %d, %Y"),
         score=scan_data.get("score", 0),
         grade=scan_data.get("grade", "F"),
         issues=scan_data.get("issues", []),
         summary=scan_data.get("summary", "No AI summary available.")
     )
 
-    # Use Playwright to launch Chromium, render HTML, and save as PDF
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-        
-        # We use set_content to load the raw HTML string
-        await page.set_content(rendered_html, wait_until="networkidle")
-        
-        # Generate PDF as bytes
-        pdf_bytes = await page.pdf(
-            format="A4",
-            print_background=True,
-            margin={"top": "2cm", "right": "2cm", "bottom": "2cm", "left": "2cm"}
-        )
-        await browser.close()
-        
-    return pdf_bytes
+async def generate_scan_pdf(scan_data: dict) -> bytes:
+    """
+    Takes scan data, renders it into an HTML template using Jinja2,
+    and then prints it to PDF on a page from the shared browser pool.
+    """
+    with timed("pdf_render"):
+        return await browser_pool.render(render_report_html(scan_data))
@@ -0,0 +1,59 @@
+from typing import Iterable, Optional
+
+from ai.summary import generate_summary
+from scanners.engine import run_checkers
+from scoring.rules import evaluate
+from telemetry import scan_trace, timed
+
+async def build_report(url_str: str, force_refresh: bool = False, checkers: Optional[Iterable[str]] = None,
+                       base_results: Optional[dict] = None) -> dict:
+    """
+    Runs the checkers and scores the result. Does not touch the database.
+    The report's "timings" entry is the scan's breakdown (see telemetry.scan_trace).
+    `checkers` limits the run to those names; `base_results` (per-checker results of an
+    earlier scan) fill in the checkers that were not run or that timed out this time.
+    """
+    with scan_trace() as trace:
+        # Run Scanners concurrently under one deadline
+        results = await run_checkers(url_str, force_refresh=force_refresh, names=checkers)
+        if base_results:
+            fresh = {name: result for name, result in results.items()
+                     if not (result.get("timed_out") and name in base_results)}
+            results = {**base_results, **fresh}
+        final_result = assemble_report(url_str, results)
+    final_result["timings"] = trace
+    return final_result
+
+def assemble_report(url_str: str, results: dict) -> dict:
+    """Scores per-checker results and lays them out as a ScanResult dict (without the id)."""
+    timed_out = [name for name, result in results.items() if result.get("timed_out")]
+    mcp_result = results.get("mcp", {})
+    cors_result = results.get("cors", {})
+
+    # One pass over the compiled rule table (see scoring/rules.py)
+    evaluation = evaluate(results)
+    current_score, grade, ordered_issues = evaluation["score"], evaluation["grade"], evaluation["issues"]
+
+    # Instant deterministic summary; the LLM version replaces it after the scan is saved
+    with timed("summary"):
+        ai_summary = generate_summary(current_score, grade, ordered_issues)
+    
+    final_result = {
+        "url": url_str,
+        "score": current_score,
+        "grade": grade,
+        "issues": ordered_issues,
+        "ai_summary": ai_summary,
+        "ssl_status": results.get("ssl", {}),
+        "headers_status": results.get("headers", {}),
+        "blacklist_status": results.get("blacklist", {}),
+        "mcp_exposed": mcp_result.get("exposed", False),
+        "cors_vulnerable": cors_result.get("vulnerable", False),
+        "mcp_status": mcp_result,
+        "cors_status": cors_result,
+        "exposure_status": results.get("exposure", {}),
+        "dmarc_status": results.get("dmarc", {}),
+        "timed_out": timed_out
+    }
+
+    return final_result
@@ -0,0 +1,154 @@
+"""
+Re-scores stored scans with the current rules, weights and grade thresholds.
+
+    python rescore.py                          # re-score every scan, write back what changed
+    python rescore.py --dry-run                # only count what would change
+    python rescore.py --weights weights.json   # score with {issue key: impact} overrides
+
+Rows are read in keyset batches by id (each batch is one short query, so writes in
+between never invalidate an open cursor). JSON decoding and rule evaluation run in a
+process pool; only changed rows go back, as one bulk UPDATE per batch, and their
+scan_issues rows are replaced. No checker is re-run and nothing touches the network, so a
+changed row's summary is replaced by the deterministic one for its new score: the stored
+text (often the LLM's) quotes the old score and issues.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+from sqlalchemy import delete, insert, select, update
+
+import aggregates
+from ai.summary import generate_summary
+from database import SessionLocal
+from models.db import ScanHistory, ScanIssue
+from scoring.rules import compile_rules, evaluate_report, load_weights
+
+_rules = None
+
+def _init_worker(weights: dict):
+    global _rules
+    _rules = compile_rules(weights=weights)
+
+def rescore_row(row: tuple):
+    """
+    Runs in a worker: (id, target_url, created_at, raw_result) -> changed values, or None
+    when the stored score, grade and issues already match the rules.
+    """
+    scan_id, target_url, created_at, raw_result = row
+    try:
+        report = json.loads(raw_result or "{}")
+    except ValueError:
+        return None
+    report.setdefault("url", target_url)
+    evaluation = evaluate_report(report, rules=_rules)
+
+    old_issues = [(issue.get("key"), issue.get("score_impact")) for issue in report.get("issues", [])]
+    new_issues = [(issue["key"], issue["score_impact"]) for issue in evaluation["issues"]]
+    if (report.get("score"), report.get("grade"), old_issues) == (evaluation["score"], evaluation["grade"], new_issues):
+        return None
+
+    report.update(evaluation)
+    report["ai_summary"] = generate_summary(evaluation["score"], evaluation["grade"], evaluation["issues"])
+    return {
+        "id": scan_id,
+        "target_url": target_url,
+        "score": evaluation["score"],
+        "grade": evaluation["grade"],
+        "issues_found": len(evaluation["issues"]),
+        "ai_summary": report["ai_summary"],
+        "raw_result": json.dumps(report, default=str),
+        "issue_rows": [
+            {
+                "scan_id": scan_id,
+                "issue_key": issue["key"],
+                "target_url": target_url,
+                "title": issue.get("title"),
+                "impact": issue.get("impact"),
+                "category": issue.get("category"),
+                "difficulty": issue.get("difficulty"),
+                "score_impact": issue["score_impact"],
+                "fix_snippet": issue.get("fix_snippet"),
+                "details": issue.get("details"),
+                "created_at": created_at,
+            }
+            for issue in evaluation["issues"]
+        ],
+    }
+
+def _write_batch(db, changed: list):
+    ids = [row["id"] for row in changed]
+    db.execute(
+        update(ScanHistory),
+        [{key: row[key] for key in ("id", "score", "grade", "issues_found", "ai_summary", "raw_result")} for row in changed],
+    )
+    db.execute(delete(ScanIssue).where(ScanIssue.scan_id.in_(ids)))
+    issue_rows = [issue for row in changed for issue in row["issue_rows"]]
+    if issue_rows:
+        db.execute(insert(ScanIssue), issue_rows)
+    # Only the domains whose latest scan changed move the trend counters
+    aggregates.record_scans(db, [
+        {"id": row["id"], "domain": aggregates.domain_of(row["target_url"]), "score": row["score"], "grade": row["grade"],
+         "issue_keys": sorted({issue["issue_key"] for issue in row["issue_rows"] if issue["issue_key"]})}
+        for row in changed
+    ])
+
+def rescore_all(batch_size: int = 2000, workers: int = None, weights: dict = None, dry_run: bool = False) -> tuple:
+    """Returns (scans read, scans changed)."""
+    weights = load_weights() if weights is None else weights
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, batch_size // (workers * 4))
+    read = changed_total = 0
+    last_id = 0
+    started = time.monotonic()
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(weights,)) as pool:
+        while True:
+            db = SessionLocal()
+            try:
+                rows = db.execute(
+                    select(ScanHistory.id, ScanHistory.target_url, ScanHistory.created_at, ScanHistory.raw_result)
+                    .where(ScanHistory.id > last_id)
+                    .order_by(ScanHistory.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                changed = [result for result in pool.imap(rescore_row, map(tuple, rows), chunk_size) if result]
+                if changed and not dry_run:
+                    _write_batch(db, changed)
+                    db.commit()
+                    _invalidate_pdfs(row["id"] for row in changed)
+            finally:
+                db.close()
+
+            read += len(rows)
+            changed_total += len(changed)
+            rate = read / max(time.monotonic() - started, 1e-6)
+            print(f"Re-scored {read} scans, {changed_total} changed (up to id {last_id}, {rate:.0f}/s)")
+    return read, changed_total
+
+def _invalidate_pdfs(scan_ids):
+    # Cached reports show the old score; they are re-rendered on the next download
+    from pdf_cache import get_pdf_store
+    pdf_store = get_pdf_store()
+    for scan_id in scan_ids:
+        pdf_store.invalidate(scan_id)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored ShieldScan scans with the current rules")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--weights", help="JSON file of {issue key: score impact} (default: $SCORING_WEIGHTS)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+
+    weights = None
+    if args.weights:
+        with open(args.weights) as f:
+            weights = {key: int(value) for key, value in json.load(f).items()}
+    read, changed = rescore_all(args.batch_size, args.workers, weights, args.dry_run)
+    print(f"{'Would change' if args.dry_run else 'Changed'} {changed} of {read} scans")
@@ -0,0 +1,344 @@
+"""
+Local blocklists for the blacklist checker: feeds are plain files, compiled into one
+memory-mapped index so every uvicorn worker shares the same pages and no lookup leaves the box.
+
+    python -m scanners.blocklist compile                  # data/blocklists/*.txt -> data/blocklist.idx
+    python -m scanners.blocklist compile --feeds DIR --output PATH
+    python -m scanners.blocklist check example.com 203.0.113.7
+
+A feed is one file per list (the list name is the file stem). Each line is a domain, an IP
+address, an IPv4 CIDR range, or a hosts-file entry ("0.0.0.0 bad.example"); '#' and ';'
+start comments. A listed domain also covers its subdomains.
+
+Index layout (native byte order, sections 8-byte aligned):
+    header      magic, byte order, counts, length of the JSON metadata (feed names, sizes)
+    names       sorted 64-bit hashes, then per hash: offset of the name in the string blob
+                and the bitmask of feeds listing it; the name is compared on a hash hit
+    ranges      disjoint IPv4 intervals sorted by start: starts, ends, feed bitmasks
+    strings     the names, newline-terminated
+
+Compiling writes a temporary file next to the index and renames it over the old one.
+Running servers notice the new file within BLOCKLIST_RELOAD_SECONDS and switch to it.
+"""
+import argparse
+import bisect
+import hashlib
+import ipaddress
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+BLOCKLIST_FEEDS = os.environ.get("BLOCKLIST_FEEDS", os.path.join(DATA_DIR, "blocklists"))
+BLOCKLIST_INDEX = os.environ.get("BLOCKLIST_INDEX", os.path.join(DATA_DIR, "blocklist.idx"))
+# How often a running server checks whether the index file was replaced
+BLOCKLIST_RELOAD_SECONDS = float(os.environ.get("BLOCKLIST_RELOAD_SECONDS", "30"))
+
+MAGIC = b"SSBLIDX1"
+HEADER = struct.Struct("<8sBxxxIII") # magic, little-endian flag, names, ranges, metadata length
+MAX_FEEDS = 32 # feed bitmasks are 32-bit
+HOSTS_FILE_ADDRESSES = {"0.0.0.0", "127.0.0.1", "::", "::1"}
+
+class BlocklistError(Exception):
+    pass
+
+def _hash(name: str) -> int:
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "little")
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+# A bare label ("localhost" in hosts files) is never a scan target, so a dot is required
+_NAME = re.compile(r"[a-z0-9_-]+(\.[a-z0-9_-]+)+")
+
+def normalize_name(name: str) -> Optional[str]:
+    name = name.strip().lower().rstrip(".")
+    if name.startswith("*."):
+        name = name[2:]
+    name = name.lstrip(".")
+    if not name.isascii():
+        try:
+            name = name.encode("idna").decode("ascii")
+        except UnicodeError:
+            return None
+    return name if _NAME.fullmatch(name) else None
+
+def parse_feed_line(line: str):
+    """("name", str) or ("range", (first, last)) for one feed line, or None to skip it."""
+    line = line.split("#", 1)[0].split(";", 1)[0].strip()
+    if not line:
+        return None
+    parts = line.split()
+    entry = parts[1] if len(parts) >= 2 and parts[0] in HOSTS_FILE_ADDRESSES else parts[0]
+    # Only entries that can be an address go through ipaddress, which is slow for big feeds
+    network = None
+    if ":" in entry or entry[0].isdigit():
+        try:
+            network = ipaddress.ip_network(entry, strict=False)
+        except ValueError:
+            pass
+    if network is None:
+        name = normalize_name(entry)
+        return ("name", name) if name else None
+    if network.version == 4:
+        return ("range", (int(network.network_address), int(network.broadcast_address)))
+    if network.num_addresses == 1:
+        return ("name", str(network.network_address))
+    return None # IPv6 ranges are not indexed
+
+def _disjoint_ranges(ranges: Iterable[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """(first, last, feed bit) ranges, possibly overlapping -> disjoint (first, last, mask), sorted."""
+    events = []
+    for first, last, bit in ranges:
+        events.append((first, bit, 1))
+        events.append((last + 1, bit, -1))
+    events.sort()
+    active = Counter()
+    result = []
+    i = 0
+    while i < len(events):
+        position = events[i][0]
+        while i < len(events) and events[i][0] == position:
+            _, bit, change = events[i]
+            active[bit] += change
+            i += 1
+        mask = 0
+        for bit, count in active.items():
+            if count:
+                mask |= bit
+        if i == len(events) or not mask:
+            continue
+        last = events[i][0] - 1
+        if result and result[-1][2] == mask and result[-1][1] + 1 == position:
+            result[-1] = (result[-1][0], last, mask)
+        else:
+            result.append((position, last, mask))
+    return result
+
+def compile_feeds(feeds_dir: str = BLOCKLIST_FEEDS, output: str = BLOCKLIST_INDEX) -> dict:
+    """Builds the index from every *.txt file in `feeds_dir` and swaps it in atomically."""
+    paths = sorted(os.path.join(feeds_dir, f) for f in os.listdir(feeds_dir) if f.endswith(".txt")) \
+        if os.path.isdir(feeds_dir) else []
+    if len(paths) > MAX_FEEDS:
+        raise BlocklistError(f"At most {MAX_FEEDS} feeds are supported, found {len(paths)}")
+
+    names: Dict[str, int] = {}
+    ranges = []
+    feeds = []
+    for number, path in enumerate(paths):
+        bit = 1 << number
+        entries = 0
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                parsed = parse_feed_line(line)
+                if parsed is None:
+                    continue
+                kind, value = parsed
+                if kind == "name":
+                    names[value] = names.get(value, 0) | bit
+                else:
+                    ranges.append((value[0], value[1], bit))
+                entries += 1
+        feeds.append({"name": os.path.splitext(os.path.basename(path))[0], "entries": entries})
+
+    strings = bytearray()
+    records = []
+    for name, mask in names.items():
+        records.append((_hash(name), len(strings), mask))
+        strings += name.encode() + b"\n"
+    records.sort()
+    disjoint = _disjoint_ranges(ranges)
+    metadata = json.dumps({"feeds": feeds, "built_at": int(time.time())}).encode()
+
+    sections = [
+        array("Q", (record[0] for record in records)).tobytes(),
+        array("I", (record[1] for record in records)).tobytes(),
+        array("I", (record[2] for record in records)).tobytes(),
+        array("I", (r[0] for r in disjoint)).tobytes(),
+        array("I", (r[1] for r in disjoint)).tobytes(),
+        array("I", (r[2] for r in disjoint)).tobytes(),
+        bytes(strings),
+    ]
+    header = HEADER.pack(MAGIC, sys.byteorder == "little", len(records), len(disjoint), len(metadata)) + metadata
+
+    directory = os.path.dirname(os.path.abspath(output))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".blocklist-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for section in sections:
+                f.write(b"\0" * (_align(f.tell()) - f.tell()))
+                f.write(section)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return {"feeds": feeds, "names": len(records), "ipv4_ranges": len(disjoint), "bytes": os.path.getsize(output)}
+
+class BlocklistIndex:
+    """A compiled index file, memory-mapped read-only. Lookups do no I/O beyond page faults."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, little, names, ranges, metadata_length = HEADER.unpack_from(self._map, 0)
+        except struct.error:
+            raise BlocklistError(f"{path} is not a blocklist index")
+        if magic != MAGIC:
+            raise BlocklistError(f"{path} is not a blocklist index")
+        if bool(little) != (sys.byteorder == "little"):
+            raise BlocklistError(f"{path} was compiled on a machine with another byte order")
+        offset = HEADER.size
+        self.metadata = json.loads(self._map[offset:offset + metadata_length])
+        self.feeds = [feed["name"] for feed in self.metadata["feeds"]]
+        offset += metadata_length
+
+        view = memoryview(self._map)
+        def section(fmt: str, count: int):
+            nonlocal offset
+            offset = _align(offset)
+            size = count * (8 if fmt == "Q" else 4)
+            data = view[offset:offset + size].cast(fmt)
+            offset += size
+            return data
+        self._hashes = section("Q", names)
+        self._offsets = section("I", names)
+        self._name_masks = section("I", names)
+        self._starts = section("I", ranges)
+        self._ends = section("I", ranges)
+        self._range_masks = section("I", ranges)
+        self._strings = _align(offset)
+
+    @property
+    def empty(self) -> bool:
+        """No feed has any entries, e.g. an index compiled before any feed was installed."""
+        return not any(feed["entries"] for feed in self.metadata["feeds"])
+
+    @property
+    def has_ranges(self) -> bool:
+        return len(self._starts) > 0
+
+    def lookup_name(self, name: str) -> int:
+        """Feed bitmask for an exact domain (or IPv6 address) entry, 0 if unlisted."""
+        key = _hash(name)
+        encoded = name.encode()
+        i = bisect.bisect_left(self._hashes, key)
+        while i < len(self._hashes) and self._hashes[i] == key:
+            start = self._strings + self._offsets[i]
+            if self._map[start:start + len(encoded) + 1] == encoded + b"\n":
+                return self._name_masks[i]
+            i += 1
+        return 0
+
+    def lookup_ipv4(self, address: int) -> int:
+        i = bisect.bisect_right(self._starts, address) - 1
+        if i >= 0 and address <= self._ends[i]:
+            return self._range_masks[i]
+        return 0
+
+    def feed_names(self, mask: int) -> List[str]:
+        return [name for bit, name in enumerate(self.feeds) if mask & (1 << bit)]
+
+_index: Optional[BlocklistIndex] = None
+_index_stat: Optional[Tuple] = None
+_next_check = 0.0
+
+def get_index() -> Optional[BlocklistIndex]:
+    """The current index, reopened when the file was replaced (checked at most every BLOCKLIST_RELOAD_SECONDS)."""
+    global _index, _index_stat, _next_check
+    now = time.monotonic()
+    if now < _next_check:
+        return _index
+    _next_check = now + BLOCKLIST_RELOAD_SECONDS
+    try:
+        stat = os.stat(BLOCKLIST_INDEX)
+    except FileNotFoundError:
+        _index = _index_stat = None
+        return None
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if signature != _index_stat:
+        try:
+            # The old map is released once no lookup refers to it any more
+            _index, _index_stat = BlocklistIndex(BLOCKLIST_INDEX), signature
+        except (OSError, ValueError, BlocklistError) as e:
+            print("Blocklist index could not be loaded, keeping the previous one:", e)
+    return _index
+
+def candidate_names(hostname: str, registrable: Optional[str]) -> List[str]:
+    """The hostname and its parent domains, down to the registrable domain."""
+    labels = hostname.lower().rstrip(".").split(".")
+    names = []
+    for i in range(len(labels)):
+        name = ".".join(labels[i:])
+        names.append(name)
+        if registrable is None or name == registrable:
+            break
+    return names
+
+def check_target(hostname: str, addresses: Iterable[str], registrable: Optional[str] = None) -> dict:
+    """Blacklist checker result for a hostname and the IP addresses it resolved to."""
+    index = get_index()
+    # Nothing to look in is not the same as not listed: report it unchecked rather than clean
+    if index is None:
+        return {"listed": False, "checked": False, "lists": [], "matches": [],
+                "details": "No local blocklist index is installed; nothing was checked."}
+    if index.empty:
+        return {"listed": False, "checked": False, "lists": [], "matches": [],
+                "details": "No blocklist feeds are installed; nothing was checked."}
+    matches = []
+    for name in candidate_names(hostname, registrable):
+        mask = index.lookup_name(name)
+        if mask:
+            matches.append({"entry": name, "lists": index.feed_names(mask)})
+    for address in addresses:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            continue
+        mask = index.lookup_ipv4(int(ip)) if ip.version == 4 else index.lookup_name(str(ip))
+        if mask:
+            matches.append({"entry": str(ip), "lists": index.feed_names(mask)})
+    lists = sorted({name for match in matches for name in match["lists"]})
+    return {
+        "listed": bool(matches),
+        "checked": True,
+        "lists": lists,
+        "matches": matches,
+        "details": f"Listed on {', '.join(lists)}." if lists else f"Not found on {len(index.feeds)} local blocklists.",
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile or query the local blocklist index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_parser = commands.add_parser("compile", help="build the index from the feed files")
+    compile_parser.add_argument("--feeds", default=BLOCKLIST_FEEDS)
+    compile_parser.add_argument("--output", default=BLOCKLIST_INDEX)
+    check_parser = commands.add_parser("check", help="look up a hostname and optional IP addresses")
+    check_parser.add_argument("hostname")
+    check_parser.add_argument("addresses", nargs="*")
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        summary = compile_feeds(args.feeds, args.output)
+        if not summary["feeds"]:
+            print(f"No feeds in {args.feeds}: the index is empty", file=sys.stderr)
+        print(json.dumps(summary, indent=2))
+    else:
+        from scanners.psl import get_psl
+        started = time.perf_counter()
+        result = check_target(args.hostname, args.addresses, get_psl().registrable_domain(args.hostname))
+        result["lookup_us"] = round((time.perf_counter() - started) * 1e6, 1)
+        print(json.dumps(result, indent=2))
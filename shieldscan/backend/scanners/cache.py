@@ -0,0 +1,116 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+
+# How long each checker's result stays valid. Certificates and DNS change rarely,
+# headers and exposed paths can change with any deploy.
+DEFAULT_TTLS = {
+    "ssl": 6 * 3600,
+    "dmarc": 3600,
+    "blacklist": 3600,
+    "headers": 600,
+    "cors": 600,
+    "mcp": 600,
+    "exposure": 600,
+    # A whole scored report is only as fresh as its shortest-lived checker
+    "report": 600,
+}
+DEFAULT_TTL = 600
+MAX_ENTRIES = int(os.environ.get("SCAN_CACHE_MAX_ENTRIES", "10000"))
+
+def _load_ttls() -> Dict[str, float]:
+    # e.g. SCAN_CACHE_TTL_SSL=43200 overrides the ssl entry
+    return {name: float(os.environ.get(f"SCAN_CACHE_TTL_{name.upper()}", ttl)) for name, ttl in DEFAULT_TTLS.items()}
+
+def normalize_target(url: str) -> str:
+    """
+    Cache key for a scan target: lowercased scheme and host, default ports and
+    fragments dropped, and an empty path treated as '/'.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or "").lower()
+    if parsed.port and parsed.port != {"http": 80, "https": 443}.get(scheme):
+        host = f"{host}:{parsed.port}"
+    return urlunparse((scheme, host, parsed.path or "/", "", parsed.query, ""))
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class ResultCache:
+    """
+    LRU cache of checker results keyed by (normalized target, checker name), with a TTL per checker.
+    Concurrent lookups of the same missing key share one execution (single-flight).
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttls: Optional[Dict[str, float]] = None, default_ttl: float = DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttls = ttls if ttls is not None else _load_ttls()
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], _Flight] = {}
+
+    def get(self, target: str, name: str) -> Optional[Any]:
+        key = (target, name)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, target: str, name: str, value: Any, ttl: Optional[float] = None):
+        key = (target, name)
+        ttl = ttl if ttl is not None else self.ttls.get(name, self.default_ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, target: str):
+        for key in [key for key in self._entries if key[0] == target]:
+            del self._entries[key]
+
+    async def get_or_run(self, target: str, name: str, factory: Callable[[], Awaitable[Any]],
+                         force_refresh: bool = False) -> Any:
+        """
+        Returns the cached result for (target, name), or runs `factory` to produce it.
+        A `force_refresh` skips the cached value but still joins an execution already in flight,
+        since that one is fresh anyway. The execution is cancelled once nobody waits for it.
+        """
+        key = (target, name)
+        if not force_refresh:
+            cached = self.get(target, name)
+            if cached is not None:
+                return cached
+
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(self._fill(key, factory)))
+            self._inflight[key] = flight
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    async def _fill(self, key: Tuple[str, str], factory: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await factory()
+            if not (isinstance(value, dict) and value.get("timed_out")):
+                self.set(key[0], key[1], value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+result_cache = ResultCache()
@@ -1,151 +1,130 @@
-import requests
-from urllib.parse import urlparse, urljoin
-import socket
+import asyncio
+import ipaddress
 
-def check_headers(url: str) -> dict:
-    try:
-        response = requests.get(url, timeout=5, allow_redirects=True)
-        headers = {k.lower(): v for k, v in response.headers.items()}
-        
-        status = {
-            "csp": {
-                "present": 'content-security-policy' in headers,
-                "value": headers.get('content-security-policy', None)
-            },
-            "hsts": {
-                "present": 'strict-transport-security' in headers,
-                "value": headers.get('strict-transport-security', None)
-            },
-            "x_frame_options": {
-                "present": 'x-frame-options' in headers,
-                "value": headers.get('x-frame-options', None)
-            },
-            "x_content_type_options": {
-                "present": 'x-content-type-options' in headers,
-                "value": headers.get('x-content-type-options', None)
-            }
+from scanners import blocklist
+from scanners.dns_resolver import resolve_a, resolve_txt
+from scanners.psl import get_psl
+from scanners.signatures import get_signatures, SCAN_PROBES
+from scanners.snapshot import TargetSnapshot, CORS_TEST_ORIGIN
+
+async def _probe_finding(snapshot: TargetSnapshot, finding: str) -> list:
+    """
+    Probes every path of the signatures for `finding` concurrently and returns
+    (path, signature id) for the ones that matched, in signature table order.
+    """
+    probes = get_signatures().probes(finding, extended=SCAN_PROBES == "extended")
+    results = await asyncio.gather(*(
+        snapshot.probe(path, signatures, follow_redirects=follow) for path, follow, signatures in probes
+    ))
+    return [(path, result.matched) for (path, _, _), result in zip(probes, results) if result.found]
+
+async def check_headers(snapshot: TargetSnapshot) -> dict:
+    page = await snapshot.root()
+    if not page.ok:
+        return {"success": False, "error": page.error}
+    headers = page.headers
+
+    status = {
+        "csp": {
+            "present": 'content-security-policy' in headers,
+            "value": headers.get('content-security-policy', None)
+        },
+        "hsts": {
+            "present": 'strict-transport-security' in headers,
+            "value": headers.get('strict-transport-security', None)
+        },
+        "x_frame_options": {
+            "present": 'x-frame-options' in headers,
+            "value": headers.get('x-frame-options', None)
+        },
+        "x_content_type_options": {
+            "present": 'x-content-type-options' in headers,
+            "value": headers.get('x-content-type-options', None)
         }
-        
-        return {"success": True, "headers": status}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+    }
 
-def check_cors(url: str) -> dict:
+    return {"success": True, "headers": status}
+
+async def check_cors(snapshot: TargetSnapshot) -> dict:
     # Vibe Coding Test - Over Permissive CORS check
-    try:
-        test_origin = "https://evil-untrusted-site.com"
-        headers = {'Origin': test_origin}
-        response = requests.options(url, headers=headers, timeout=5)
-        
-        allowed_origin = response.headers.get('Access-Control-Allow-Origin')
-        
-        if allowed_origin == '*' or allowed_origin == test_origin:
-            return {"vulnerable": True, "detail": "CORS policy is overly permissive, allowing any origin."}
-        elif allowed_origin:
-            return {"vulnerable": False, "detail": "CORS policy restricts origin correctly.", "allowed": allowed_origin}
-        else:
-            return {"vulnerable": False, "detail": "No CORS policy detected."}
-    except Exception as e:
-        return {"vulnerable": False, "error": str(e)}
+    test_origin = CORS_TEST_ORIGIN
+    # The root GET already carried our Origin; only servers that answer CORS on preflight need the OPTIONS
+    page = await snapshot.root()
+    if page.ok and 'access-control-allow-origin' not in page.headers:
+        page = await snapshot.fetch(method="OPTIONS", headers={'Origin': test_origin})
+    if not page.ok:
+        return {"vulnerable": False, "error": page.error}
+    allowed_origin = page.headers.get('access-control-allow-origin')
+
+    if allowed_origin == '*' or allowed_origin == test_origin:
+        return {"vulnerable": True, "detail": "CORS policy is overly permissive, allowing any origin."}
+    elif allowed_origin:
+        return {"vulnerable": False, "detail": "CORS policy restricts origin correctly.", "allowed": allowed_origin}
+    else:
+        return {"vulnerable": False, "detail": "No CORS policy detected."}
+
+async def check_mcp_exposure(snapshot: TargetSnapshot) -> dict:
+    # MCP endpoints, SSE transports and agent manifests (see scanners/signatures.py)
+    found = await _probe_finding(snapshot, "mcp")
 
-def check_mcp_exposure(url: str) -> dict:
-    test_paths = [
-        "/.mcp/config.json",
-        "/mcp",
-        "/api/mcp",
-        "/agent",
-    ]
-    
-    found = []
-    
-    for path in test_paths:
-        target = urljoin(url, path)
-        try:
-            resp = requests.get(target, timeout=3, allow_redirects=False)
-            if resp.status_code == 200:
-                if 'application/json' in resp.headers.get('content-type', '').lower():
-                    found.append(path)
-                elif 'mcp' in resp.text.lower():
-                    found.append(path)
-        except:
-            pass
-            
     return {
         "exposed": len(found) > 0,
-        "paths": found
+        "paths": [path for path, _ in found],
+        "signatures": dict(found)
     }
 
-def check_exposure(url: str) -> dict:
+async def check_exposure(snapshot: TargetSnapshot) -> dict:
     """
-    Check for sensitive files (.env) and exposed admin panels (/wp-admin, /admin)
+    Check for sensitive files and pages (.env, .git, backups, phpinfo, debug consoles)
+    and exposed admin panels (/wp-admin, /admin), from the signature database
     """
-    sensitive_paths = ["/.env", "/.git/config"]
-    admin_paths = ["/wp-admin", "/admin", "/administrator", "/login"]
-    
-    found_sensitive = []
-    found_admin = []
-    
-    for path in sensitive_paths:
-        target = urljoin(url, path)
-        try:
-            resp = requests.get(target, timeout=3, allow_redirects=False)
-            if resp.status_code == 200 and ('DB_' in resp.text or 'repositoryformatversion' in resp.text):
-                found_sensitive.append(path)
-        except:
-            pass
-            
-    # For MVP we just do a quick heuristic check
-    for path in admin_paths:
-        target = urljoin(url, path)
-        try:
-            resp = requests.get(target, timeout=3, allow_redirects=True)
-            if resp.status_code == 200 and any(keyword in resp.text.lower() for keyword in ['login', 'password', 'username', 'sign in']):
-                found_admin.append(path)
-                break # Just finding one is enough for scoring
-        except:
-            pass
-            
+    # Both path lists are probed at the same time; wall clock is the slowest single probe
+    found_sensitive, found_admin = await asyncio.gather(
+        _probe_finding(snapshot, "sensitive"),
+        _probe_finding(snapshot, "admin"),
+    )
+    found_admin = found_admin[:1] # Just finding one is enough for scoring
+
     return {
-        "sensitive_files": found_sensitive,
+        "sensitive_files": [path for path, _ in found_sensitive],
         "admin_exposed": len(found_admin) > 0,
-        "admin_paths": found_admin
+        "admin_paths": [path for path, _ in found_admin],
+        "signatures": dict(found_sensitive + found_admin)
     }
 
-def check_dmarc(url: str) -> dict:
+async def check_dmarc(snapshot: TargetSnapshot) -> dict:
     """
-    Check DMARC DNS record using basic socket getaddrinfo or simulated check.
-    For MVP, we'll try to resolve TXT for _dmarc.hostname using dnspython if installed,
-    or just use subprocess (not ideal for cross-platform).
-    Let's simulate or use a public REST API for DNS lookup to avoid system dependencies for now,
-    or just mock it if we can't reliably resolve TXT records using socket.
-    Since we don't have dnspython installed, we mock a request to Google DNS over HTTPS.
+    Check the DMARC TXT record of the organizational domain (_dmarc.example.co.uk
+    for shop.example.co.uk), resolved with our own cached DNS resolver.
     """
-    parsed_url = urlparse(url)
-    hostname = parsed_url.hostname
+    hostname = snapshot.hostname
     if not hostname:
         return {"has_dmarc": False, "error": "Invalid hostname"}
-        
-    # Strip subdomains for DMARC (simplified, assumes domain.com)
-    parts = str(hostname).split('.')
-    if len(parts) > 2:
-        root_domain = f"{parts[-2]}.{parts[-1]}"
-    else:
-        root_domain = str(hostname)
-        
+
+    # The Public Suffix List tells us where the registrable domain starts
+    root_domain = get_psl().registrable_domain(str(hostname)) or str(hostname)
+
     try:
-        # Use Google DNS over HTTPS for TXT lookup
         dmarc_target = f"_dmarc.{root_domain}"
-        dns_url = f"https://dns.google/resolve?name={dmarc_target}&type=TXT"
-        resp = requests.get(dns_url, timeout=5)
-        if resp.status_code == 200:
-            data = resp.json()
-            answers = data.get("Answer", [])
-            for answer in answers:
-                if "v=DMARC1" in answer.get("data", ""):
-                    return {"has_dmarc": True, "record": answer.get("data")}
+        for record in await resolve_txt(dmarc_target):
+            if record.startswith("v=DMARC1"):
+                return {"has_dmarc": True, "record": record}
         return {"has_dmarc": False, "error": "No DMARC record found"}
     except Exception as e:
         return {"has_dmarc": False, "error": str(e)}
 
-def check_blacklist(url: str) -> dict:
-    return {"listed": False, "details": "Domain not found on major blacklists."}
+async def check_blacklist(snapshot: TargetSnapshot) -> dict:
+    # Local feeds only (see scanners/blocklist.py): the lookups themselves take microseconds
+    hostname = snapshot.hostname or ""
+    try:
+        ipaddress.ip_address(hostname)
+        addresses = [hostname]
+    except ValueError:
+        addresses = []
+        index = blocklist.get_index()
+        if index is not None and index.has_ranges:
+            try:
+                addresses = await resolve_a(hostname)
+            except Exception:
+                pass # the domain entries are still checked
+    return blocklist.check_target(hostname, addresses, get_psl().registrable_domain(hostname))
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import random
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Minimal async stub resolver: plain DNS over UDP (TCP when truncated) to one
+# configurable nameserver, so DNS checks need no third-party HTTPS API.
+TYPE_A = 1
+TYPE_MX = 15
+TYPE_TXT = 16
+TYPES = {"A": TYPE_A, "MX": TYPE_MX, "TXT": TYPE_TXT}
+
+RCODE_NXDOMAIN = 3
+NEGATIVE_TTL = 60 # used when an empty answer carries no SOA to take a TTL from
+MAX_CACHE_ENTRIES = 10000
+
+class DNSError(Exception):
+    pass
+
+def _default_nameserver() -> Tuple[str, int]:
+    """DNS_NAMESERVER ("host" or "host:port"), else the first entry of /etc/resolv.conf."""
+    configured = os.environ.get("DNS_NAMESERVER")
+    if configured:
+        host, sep, port = configured.rpartition(":")
+        if sep and configured.count(":") == 1:
+            return (host, int(port))
+        return (configured, 53)
+    try:
+        with open("/etc/resolv.conf") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == "nameserver":
+                    return (parts[1], 53)
+    except OSError:
+        pass
+    return ("1.1.1.1", 53)
+
+def build_query(qid: int, name: str, qtype: int) -> bytes:
+    header = struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0) # RD set, one question
+    qname = b"".join(bytes([len(label)]) + label.encode("idna") for label in name.rstrip(".").split(".") if label)
+    return header + qname + b"\x00" + struct.pack("!HH", qtype, 1)
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    labels = []
+    end = None
+    for _ in range(128): # bounds pointer loops in hostile packets
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            continue
+        offset += 1
+        if length == 0:
+            return ".".join(labels), end if end is not None else offset
+        labels.append(data[offset:offset + length].decode("ascii", errors="replace"))
+        offset += length
+    raise DNSError("Malformed name in DNS response")
+
+def parse_response(data: bytes, qid: int, qtype: int) -> Tuple[int, list, int]:
+    """Returns (rcode, answers of `qtype`, ttl). TXT answers are strings, MX answers (preference, host)."""
+    rid, flags, qdcount, ancount, nscount, _ = struct.unpack("!HHHHHH", data[:12])
+    if rid != qid:
+        raise DNSError("DNS response id mismatch")
+    rcode = flags & 0x000F
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+
+    answers = []
+    ttl = None
+    for index in range(ancount + nscount):
+        _, offset = _read_name(data, offset)
+        rtype, _, rttl, rdlength = struct.unpack("!HHIH", data[offset:offset + 10])
+        offset += 10
+        rdata = data[offset:offset + rdlength]
+        if index >= ancount:
+            # Authority section: an SOA here gives the negative-caching TTL
+            if rtype == 6 and not answers:
+                ttl = rttl if ttl is None else min(ttl, rttl)
+        elif rtype == qtype:
+            ttl = rttl if ttl is None else min(ttl, rttl)
+            if rtype == TYPE_A and rdlength == 4:
+                answers.append(".".join(str(b) for b in rdata))
+            elif rtype == TYPE_TXT:
+                chunks, pos = [], 0
+                while pos < len(rdata):
+                    size = rdata[pos]
+                    chunks.append(rdata[pos + 1:pos + 1 + size].decode("utf-8", errors="replace"))
+                    pos += 1 + size
+                answers.append("".join(chunks))
+            elif rtype == TYPE_MX:
+                preference = struct.unpack("!H", rdata[:2])[0]
+                host, _ = _read_name(data, offset + 2)
+                answers.append((preference, host))
+        offset += rdlength
+    return rcode, answers, ttl if ttl is not None else NEGATIVE_TTL
+
+class _UDPQuery(asyncio.DatagramProtocol):
+    def __init__(self, packet: bytes):
+        self.packet = packet
+        self.response = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        transport.sendto(self.packet)
+
+    def datagram_received(self, data, addr):
+        if not self.response.done():
+            self.response.set_result(data)
+
+    def error_received(self, exc):
+        if not self.response.done():
+            self.response.set_exception(exc)
+
+class Resolver:
+    """
+    Async DNS resolver with a shared TTL-honoring cache (positive and negative answers)
+    and in-flight deduplication of identical queries.
+    """
+
+    def __init__(self, nameserver: Optional[Tuple[str, int]] = None, timeout: float = 2, attempts: int = 2):
+        self.nameserver = nameserver or _default_nameserver()
+        self.timeout = timeout
+        self.attempts = attempts
+        self._cache: Dict[Tuple[str, int], Tuple[float, list]] = {}
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+
+    async def query(self, name: str, rtype: str) -> list:
+        qtype = TYPES[rtype.upper()]
+        key = (name.lower().rstrip("."), qtype)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(*key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, name: str, qtype: int) -> list:
+        last_error = None
+        for _ in range(self.attempts):
+            qid = random.randrange(0x10000)
+            packet = build_query(qid, name, qtype)
+            try:
+                data = await self._udp(packet)
+                if struct.unpack("!H", data[2:4])[0] & 0x0200: # TC: answer did not fit in UDP
+                    data = await self._tcp(packet)
+                rcode, answers, ttl = parse_response(data, qid, qtype)
+            except (OSError, asyncio.TimeoutError, DNSError, struct.error, IndexError) as e:
+                last_error = e
+                continue
+            if rcode not in (0, RCODE_NXDOMAIN):
+                raise DNSError(f"DNS server returned rcode {rcode} for {name}")
+            self._store((name, qtype), answers, ttl)
+            return answers
+        raise DNSError(f"DNS query for {name} failed: {last_error or 'timeout'}")
+
+    def _store(self, key: Tuple[str, int], answers: list, ttl: int):
+        if len(self._cache) >= MAX_CACHE_ENTRIES:
+            now = time.monotonic()
+            self._cache = {k: v for k, v in self._cache.items() if v[0] > now}
+            if len(self._cache) >= MAX_CACHE_ENTRIES:
+                self._cache.clear()
+        self._cache[key] = (time.monotonic() + ttl, answers)
+
+    async def _udp(self, packet: bytes) -> bytes:
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: _UDPQuery(packet), remote_addr=self.nameserver
+        )
+        try:
+            return await asyncio.wait_for(protocol.response, timeout=self.timeout)
+        finally:
+            transport.close()
+
+    async def _tcp(self, packet: bytes) -> bytes:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*self.nameserver), timeout=self.timeout)
+        try:
+            writer.write(struct.pack("!H", len(packet)) + packet)
+            await writer.drain()
+            size = struct.unpack("!H", await asyncio.wait_for(reader.readexactly(2), timeout=self.timeout))[0]
+            return await asyncio.wait_for(reader.readexactly(size), timeout=self.timeout)
+        finally:
+            writer.close()
+
+resolver = Resolver()
+
+async def resolve_txt(name: str) -> List[str]:
+    return await resolver.query(name, "TXT")
+
+async def resolve_a(name: str) -> List[str]:
+    return await resolver.query(name, "A")
+
+async def resolve_mx(name: str) -> List[Tuple[int, str]]:
+    return await resolver.query(name, "MX")
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+from scanners.cache import result_cache, normalize_target
+from scanners.snapshot import TargetSnapshot
+from scanners.ssl_checker import check_ssl
+from scanners.checkers import check_headers, check_cors, check_mcp_exposure, check_blacklist, check_exposure, check_dmarc
+from telemetry import CHECKER_SECONDS, CHECKER_ERRORS, CHECKER_TIMEOUTS, current_trace
+
+# One overall budget for the whole scan, instead of the sum of every checker's timeout
+SCAN_DEADLINE_SECONDS = float(os.environ.get("SCAN_DEADLINE_SECONDS", "8"))
+
+# Analyzers registered here all receive the same per-scan TargetSnapshot
+CHECKERS = {
+    "ssl": check_ssl,
+    "headers": check_headers,
+    "cors": check_cors,
+    "mcp": check_mcp_exposure,
+    "blacklist": check_blacklist,
+    "exposure": check_exposure,
+    "dmarc": check_dmarc,
+}
+
+def timed_out_result(name: str, deadline: float) -> dict:
+    return {"timed_out": True, "error": f"{name} check did not finish within {deadline:g}s"}
+
+async def run_checkers(url: str, deadline: float = SCAN_DEADLINE_SECONDS, force_refresh: bool = False,
+                       names: Optional[Iterable[str]] = None) -> dict:
+    """
+    Runs every checker concurrently and waits at most `deadline` seconds overall.
+    Checkers that are still running when the deadline hits are cancelled and reported
+    as timed out so the caller can score the partial result.
+
+    Results come from the shared result cache when still fresh, and concurrent scans of
+    the same target share one run of each checker. `force_refresh` skips cached results.
+    `names` runs only those checkers (default: all of them).
+    """
+    return {name: result async for name, result in iter_checkers(url, deadline, force_refresh, names)}
+
+async def iter_checkers(url: str, deadline: float = SCAN_DEADLINE_SECONDS, force_refresh: bool = False,
+                        names: Optional[Iterable[str]] = None) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Same as run_checkers, but yields (name, result) as each checker finishes; checkers
+    that miss the deadline come last. Closing the iterator early cancels the rest.
+    """
+    target = normalize_target(url)
+    snapshot = TargetSnapshot(url)
+
+    def runner(name, checker):
+        async def run():
+            snapshot.acquire()
+            started = time.perf_counter()
+            try:
+                result = await checker(snapshot)
+            except Exception:
+                CHECKER_ERRORS.inc(checker=name)
+                raise
+            finally:
+                snapshot.release()
+            # Only completed runs are timed; cancelled ones show up as timeouts
+            CHECKER_SECONDS.observe(time.perf_counter() - started, checker=name)
+            if isinstance(result, dict) and result.get("error"):
+                CHECKER_ERRORS.inc(checker=name)
+            return result
+        return run
+
+    # The scan holds the snapshot until all its checkers are done, so one that finishes early
+    # cannot close it under one that has not started; runs shared with other scans hold it too
+    snapshot.acquire()
+    tasks = {
+        asyncio.create_task(result_cache.get_or_run(target, name, runner(name, checker), force_refresh=force_refresh)): name
+        for name, checker in CHECKERS.items()
+        if names is None or name in names
+    }
+    # Per-scan wall time of each checker, as this scan saw it (cached results are near zero)
+    trace = current_trace()
+    timings = trace["checkers"] if trace is not None else {}
+    started = time.monotonic()
+    ends_at = started + deadline
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, ends_at - time.monotonic()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    result = {"error": str(e)}
+                timings[tasks[task]] = round((time.monotonic() - started) * 1000, 1)
+                yield tasks[task], result
+        for task in pending:
+            task.cancel()
+            CHECKER_TIMEOUTS.inc(checker=tasks[task])
+            timings[tasks[task]] = round((time.monotonic() - started) * 1000, 1)
+            yield tasks[task], timed_out_result(tasks[task], deadline)
+    finally:
+        for task in pending:
+            task.cancel()
+        snapshot.release()
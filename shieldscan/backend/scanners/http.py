@@ -0,0 +1,33 @@
+import os
+from typing import Optional
+
+import httpx
+
+# One pooled client for every probe in the process, so requests to the same origin
+# reuse keep-alive (and HTTP/2 where the target offers it) instead of a fresh TCP+TLS handshake
+MAX_CONNECTIONS = int(os.environ.get("SCAN_HTTP_MAX_CONNECTIONS", "200"))
+MAX_KEEPALIVE = int(os.environ.get("SCAN_HTTP_MAX_KEEPALIVE", "50"))
+USER_AGENT = "ShieldScan/1.0 (+https://shieldscan.app)"
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            timeout=5,
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=30,
+            ),
+            headers={"User-Agent": USER_AGENT},
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,257 @@
+import asyncio
+import ipaddress
+import os
+import socket
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from scanners.http import MAX_CONNECTIONS
+from telemetry import Gauge, OUTBOUND_THROTTLED, record_outbound
+
+# Every outbound connection to a target (HTTP requests and TLS handshakes) takes a slot here.
+# Limits apply per hostname and per resolved IP, so many sites behind one CDN edge share a budget.
+# One scan sends about 20 requests to its target (8 TLS handshakes and probes, the root page and
+# its preflight, 10 path probes): the host limits hold all of them at once, so a scan never queues
+# behind itself and the limits only space out repeat and concurrent scans of the same host.
+HOST_CONCURRENCY = int(os.environ.get("SCAN_HOST_CONCURRENCY", "24"))
+HOST_RATE = float(os.environ.get("SCAN_HOST_RATE", "10")) # requests per second, sustained
+HOST_BURST = float(os.environ.get("SCAN_HOST_BURST", "24")) # one full scan at once
+IP_CONCURRENCY = int(os.environ.get("SCAN_IP_CONCURRENCY", "32"))
+IP_RATE = float(os.environ.get("SCAN_IP_RATE", "25"))
+IP_BURST = float(os.environ.get("SCAN_IP_BURST", "50"))
+# Used when a 429/503 carries no usable Retry-After; longer hints are capped
+DEFAULT_BACKOFF_SECONDS = 5.0
+MAX_BACKOFF_SECONDS = 60.0
+ADDRESS_TTL = 300
+MAX_TRACKED = 10000
+
+class _Bucket:
+    """Token bucket plus a concurrency limit; the rate halves on 429 and creeps back on success."""
+
+    def __init__(self, limit: int, rate: float, burst: float):
+        self.limit = limit
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.active = 0
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> Optional[float]:
+        """Seconds until a request may start, or None while every concurrent slot is taken."""
+        if self.active >= self.limit:
+            return None
+        if self.blocked_until > now:
+            return self.blocked_until - now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+        self.active += 1
+
+    def idle(self, now: float) -> bool:
+        return (self.active == 0 and self.blocked_until <= now and self.rate >= self.base_rate
+                and self.tokens + (now - self.updated) * self.rate >= self.burst)
+
+class _Request:
+    failed = False
+    waited = 0.0 # seconds spent queued for the slot
+
+def retry_after_seconds(value: Optional[str]) -> float:
+    if value:
+        try:
+            return min(MAX_BACKOFF_SECONDS, max(0.0, float(value)))
+        except ValueError:
+            pass
+        try:
+            return min(MAX_BACKOFF_SECONDS, max(0.0, parsedate_to_datetime(value).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            pass
+    return DEFAULT_BACKOFF_SECONDS
+
+class OutboundScheduler:
+    """
+    Grants outbound slots across all scans and checkers. Waiting requests queue per host, and
+    hosts are served round-robin, so a batch of 500 URLs on one CDN cannot starve other targets.
+    """
+
+    def __init__(self, concurrency: int = MAX_CONNECTIONS):
+        self.concurrency = concurrency
+        self._active = 0
+        self._hosts: Dict[str, _Bucket] = {}
+        self._ips: Dict[str, _Bucket] = {}
+        self._waiters: Dict[str, deque] = {}
+        self._ready: "OrderedDict[str, None]" = OrderedDict() # hosts with waiters, in service order
+        self._addresses: Dict[str, Tuple[float, Optional[str]]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_at = 0.0
+        self._timer_loop = None
+
+    @asynccontextmanager
+    async def slot(self, target: str, kind: str = "http", timeout: Optional[float] = None, urgent: bool = False):
+        """
+        Holds one slot for `target` (a URL or hostname) for the duration of the block.
+        The wait and the request itself are timed under `kind` ("http", "tls"); set `failed`
+        on the yielded object for a failure that does not raise.
+
+        Raises asyncio.TimeoutError when no slot is granted within `timeout` seconds; the
+        yielded object's `waited` lets the request spend only what is left of its own timeout.
+        `urgent` requests (the ones every checker of a scan waits on) queue ahead of the others.
+        """
+        started = time.perf_counter()
+        host = (urlparse(target).hostname if "://" in target else target) or target
+        ip = await self._address(host)
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(host, deque())
+        if urgent:
+            # Behind earlier urgent requests, ahead of everything else
+            position = 0
+            while position < len(waiters) and waiters[position][2]:
+                position += 1
+            waiters.insert(position, (future, ip, True))
+        else:
+            waiters.append((future, ip, False))
+        self._ready[host] = None
+        self._dispatch()
+        try:
+            if timeout is None:
+                await future
+            else:
+                remaining = timeout - (time.perf_counter() - started)
+                if remaining > 0:
+                    await asyncio.wait((future,), timeout=remaining)
+                if not future.done():
+                    future.cancel() # dropped from the queue by the next dispatch
+                    record_outbound(kind, time.perf_counter() - started, 0.0, True)
+                    raise asyncio.TimeoutError(f"No outbound slot for {host} within {timeout:g}s")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(host, ip) # granted just as we were cancelled
+            raise
+        granted = time.perf_counter()
+        request = _Request()
+        request.waited = granted - started
+        try:
+            yield request
+        except Exception:
+            request.failed = True
+            raise
+        finally:
+            self._release(host, ip)
+            record_outbound(kind, granted - started, time.perf_counter() - granted, request.failed)
+
+    def observe(self, target: str, status_code: int, retry_after: Optional[str] = None):
+        """
+        Feeds a response back: a 429 (or a 503 with Retry-After) pauses the host and halves
+        its rate; any other response moves the rate back towards normal.
+        """
+        host = (urlparse(target).hostname if "://" in target else target) or target
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            return
+        if status_code == 429 or (status_code == 503 and retry_after):
+            OUTBOUND_THROTTLED.inc()
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + retry_after_seconds(retry_after))
+            bucket.rate = max(bucket.base_rate / 16, bucket.rate / 2)
+        elif bucket.rate < bucket.base_rate:
+            bucket.rate = min(bucket.base_rate, bucket.rate + bucket.base_rate / 10)
+
+    async def _address(self, host: str) -> Optional[str]:
+        try:
+            ipaddress.ip_address(host)
+            return host
+        except ValueError:
+            pass
+        cached = self._addresses.get(host)
+        now = time.monotonic()
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+            address = infos[0][4][0]
+        except OSError:
+            address = None # the request itself will report the failure
+        if len(self._addresses) >= MAX_TRACKED:
+            self._addresses.clear()
+        self._addresses[host] = (now + ADDRESS_TTL, address)
+        return address
+
+    def _bucket(self, buckets: Dict[str, _Bucket], key: str, limit: int, rate: float, burst: float) -> _Bucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = _Bucket(limit, rate, burst)
+        return bucket
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        next_at = None
+        progressed = True
+        while progressed and self._ready and self._active < self.concurrency:
+            progressed = False
+            for host in list(self._ready):
+                if self._active >= self.concurrency:
+                    break
+                waiters = self._waiters.get(host)
+                while waiters and waiters[0][0].done(): # cancelled while queued
+                    waiters.popleft()
+                if not waiters:
+                    self._ready.pop(host, None)
+                    self._waiters.pop(host, None)
+                    continue
+                future, ip, _ = waiters[0]
+                host_bucket = self._bucket(self._hosts, host, HOST_CONCURRENCY, HOST_RATE, HOST_BURST)
+                ip_bucket = self._bucket(self._ips, ip, IP_CONCURRENCY, IP_RATE, IP_BURST) if ip else None
+                delays = [host_bucket.delay(now), ip_bucket.delay(now) if ip_bucket else 0.0]
+                if None in delays:
+                    continue # retried when one of its slots is released
+                delay = max(delays)
+                if delay > 0:
+                    next_at = now + delay if next_at is None else min(next_at, now + delay)
+                    continue
+                waiters.popleft()
+                host_bucket.take()
+                if ip_bucket:
+                    ip_bucket.take()
+                self._active += 1
+                future.set_result(None)
+                progressed = True
+                # Round-robin: a host that was just served goes to the back of the line
+                self._ready.move_to_end(host)
+        if next_at is not None and (self._timer is None or next_at < self._timer_at or self._timer_loop is not loop):
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer_at = next_at
+            self._timer_loop = loop
+            self._timer = loop.call_later(next_at - now, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _release(self, host: str, ip: Optional[str]):
+        self._active -= 1
+        now = time.monotonic()
+        for buckets, key in ((self._hosts, host), (self._ips, ip)):
+            bucket = buckets.get(key) if key else None
+            if bucket is None:
+                continue
+            bucket.active -= 1
+            # Forget targets we are done with, once forgetting them changes nothing
+            if len(buckets) > MAX_TRACKED and bucket.idle(now) and key not in self._waiters:
+                del buckets[key]
+        self._dispatch()
+
+outbound = OutboundScheduler()
+
+Gauge("shieldscan_outbound_slots_in_use", "Outbound requests holding a slot", lambda: outbound._active)
+Gauge("shieldscan_outbound_slots_limit", "Outbound slot limit across all targets", lambda: outbound.concurrency)
+Gauge("shieldscan_outbound_waiting", "Outbound requests queued for a slot",
+      lambda: sum(len(waiters) for waiters in outbound._waiters.values()))
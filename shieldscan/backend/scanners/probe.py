@@ -0,0 +1,70 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence
+
+import httpx
+
+from scanners.signatures import get_signatures
+
+# Most signatures sit in the first few KB of a page; huge or drip-fed bodies are cut off here
+PROBE_MAX_BYTES = int(os.environ.get("SCAN_PROBE_MAX_BYTES", str(16 * 1024)))
+
+@dataclass
+class ProbeResult:
+    url: str
+    status_code: int = 0
+    headers: Dict[str, str] = field(default_factory=dict) # lowercased names
+    matched: Optional[str] = None # id of the signature that hit, if any (see scanners.signatures)
+    bytes_read: int = 0
+    error: Optional[str] = None
+
+    @property
+    def found(self) -> bool:
+        return self.matched is not None
+
+async def stream_probe(client: httpx.AsyncClient, url: str, signatures: Sequence[str],
+                       follow_redirects: bool = False, max_bytes: int = PROBE_MAX_BYTES,
+                       timeout: float = 3, headers: Optional[Dict[str, str]] = None) -> ProbeResult:
+    """
+    GETs `url` and checks the response against the signature ids `signatures`.
+
+    The body is never read when the status code or headers already decide the result:
+    anything but a 200 is a miss, and a matching header rule is a hit. Otherwise the body
+    goes through the signature automaton as it streams in (one pass for all patterns, no
+    copies), and reading stops at the first match or after `max_bytes`, whichever comes first.
+    `timeout` bounds the whole probe, so a slow-drip body cannot outlive it.
+    """
+    result = ProbeResult(url=url)
+    database = get_signatures()
+
+    async def run():
+        async with client.stream("GET", url, headers=headers, timeout=timeout, follow_redirects=follow_redirects) as response:
+            result.status_code = response.status_code
+            result.headers = {k.lower(): v for k, v in response.headers.items()}
+            if response.status_code != 200:
+                return
+
+            for signature, header, rule in database.header_rules(signatures):
+                if rule in result.headers.get(header, "").lower():
+                    result.matched = signature
+                    return
+            scan = database.scan(signatures)
+            if scan is None or result.headers.get("content-length") == "0":
+                return
+
+            async for chunk in response.aiter_bytes():
+                if result.bytes_read + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - result.bytes_read]
+                result.bytes_read += len(chunk)
+                result.matched = scan.feed(chunk)
+                if result.matched is not None or result.bytes_read >= max_bytes:
+                    return
+
+    try:
+        await asyncio.wait_for(run(), timeout=timeout)
+    except asyncio.TimeoutError:
+        result.error = f"Probe exceeded {timeout:g}s"
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    return result
@@ -0,0 +1,74 @@
+import ipaddress
+import os
+from typing import Dict, Optional
+
+# Snapshot of https://publicsuffix.org/list/public_suffix_list.dat (MPL-2.0).
+# Point PUBLIC_SUFFIX_LIST at a newer copy to update it without a release.
+DEFAULT_PSL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "public_suffix_list.dat")
+
+_RULE = "$" # marks "a rule ends at this node"
+
+class PublicSuffixList:
+    """
+    Label trie built once from the Public Suffix List, walked right to left.
+    Supports normal, wildcard (*.ck) and exception (!www.ck) rules.
+    """
+
+    def __init__(self, path: str = DEFAULT_PSL_PATH):
+        self._root: Dict[str, dict] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                rule = line.strip()
+                if not rule or rule.startswith("//"):
+                    continue
+                self._add(rule.split()[0].lower())
+
+    def _add(self, rule: str):
+        exception = rule.startswith("!")
+        node = self._root
+        for label in reversed(rule.lstrip("!").split(".")):
+            node = node.setdefault(label, {})
+        node[_RULE] = "!" if exception else True
+
+    def public_suffix_length(self, labels: list) -> int:
+        """Number of trailing labels of `labels` that form the public suffix."""
+        node = self._root
+        length = 1 # the implicit "*" rule: an unknown TLD is itself a public suffix
+        for depth, label in enumerate(reversed(labels), start=1):
+            child = node.get(label)
+            wildcard = node.get("*")
+            if child is not None and child.get(_RULE) == "!":
+                # Exception rules cut the suffix one label short of the match
+                return depth - 1
+            if child is None and wildcard is None:
+                break
+            if child is not None and child.get(_RULE):
+                length = depth
+            elif wildcard is not None and wildcard.get(_RULE):
+                length = depth
+            node = child if child is not None else wildcard
+        return length
+
+    def registrable_domain(self, hostname: str) -> Optional[str]:
+        """
+        The organizational domain of `hostname` (public suffix plus one label),
+        e.g. shop.example.co.uk -> example.co.uk. None for IP addresses and bare public suffixes.
+        """
+        try:
+            ipaddress.ip_address(hostname)
+            return None
+        except ValueError:
+            pass
+        labels = hostname.lower().rstrip(".").split(".")
+        suffix = self.public_suffix_length(labels)
+        if len(labels) <= suffix:
+            return None
+        return ".".join(labels[-(suffix + 1):])
+
+_psl: Optional[PublicSuffixList] = None
+
+def get_psl() -> PublicSuffixList:
+    global _psl
+    if _psl is None:
+        _psl = PublicSuffixList(os.environ.get("PUBLIC_SUFFIX_LIST", DEFAULT_PSL_PATH))
+    return _psl
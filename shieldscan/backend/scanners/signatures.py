@@ -0,0 +1,228 @@
+"""
+Signature database for the path probes of the exposure and MCP checkers.
+
+A signature names the paths to request and what in the response proves the finding:
+header rules (a substring of a header value, checked before any body is read) and body
+patterns (any of them). All body patterns of all signatures are compiled once into a
+single Aho-Corasick automaton, so a probe finds every relevant pattern in one pass over
+the streamed body, however many signatures there are.
+
+Every probe is a request to the target and counts against its politeness budget (see
+scanners/politeness.py), so only a signature's `paths` are probed on every scan; its
+`extended_paths` are added with SCAN_PROBES=extended (e.g. for monitors or audits).
+
+Point SCAN_SIGNATURES at a JSON list of signatures in the same shape to add to (or, with
+the same id, replace) the built-in ones. Patterns are text; "\\u001f\\u008b" style escapes
+give raw bytes (they are encoded as Latin-1).
+"""
+import json
+import operator
+import os
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# "core": each signature's `paths`; "extended": its `extended_paths` too
+SCAN_PROBES = os.environ.get("SCAN_PROBES", "core")
+
+# finding: "sensitive" (files and pages that leak secrets or internals), "admin" (login
+# pages) or "mcp" (MCP / agent endpoints and manifests). Body patterns are case-sensitive
+# unless ignore_case is set; headers are (header, lowercase substring of its value).
+SIGNATURES = (
+    {"id": "dotenv", "finding": "sensitive", "paths": ["/.env"],
+     "extended_paths": ["/.env.local", "/.env.production", "/.env.backup", "/.env.bak"],
+     "body": ["DB_", "APP_KEY=", "DATABASE_URL=", "SECRET_KEY=", "AWS_SECRET_ACCESS_KEY=", "API_KEY="]},
+    {"id": "git_config", "finding": "sensitive", "paths": ["/.git/config"], "body": ["repositoryformatversion"]},
+    {"id": "git_head", "finding": "sensitive", "extended_paths": ["/.git/HEAD"], "body": ["ref: refs/heads/"]},
+    {"id": "sql_dump", "finding": "sensitive", "extended_paths": ["/backup.sql", "/dump.sql", "/db.sql", "/database.sql"],
+     "body": ["CREATE TABLE", "INSERT INTO", "-- MySQL dump", "PostgreSQL database dump"]},
+    {"id": "archive_backup", "finding": "sensitive",
+     "extended_paths": ["/backup.zip", "/site.zip", "/backup.tar.gz", "/www.zip"],
+     "body": ["PK\u0003\u0004", "\u001f\u008b\u0008"]},
+    {"id": "config_backup", "finding": "sensitive",
+     "extended_paths": ["/wp-config.php.bak", "/wp-config.php~", "/wp-config.php.save", "/config.php.bak"],
+     "body": ["DB_PASSWORD", "<?php"]},
+    {"id": "ds_store", "finding": "sensitive", "extended_paths": ["/.DS_Store"], "body": ["\u0000\u0000\u0000\u0001Bud1"]},
+    {"id": "phpinfo", "finding": "sensitive", "extended_paths": ["/phpinfo.php", "/info.php", "/php_info.php"],
+     "body": ["<title>phpinfo()</title>", "PHP Extension Build"]},
+    {"id": "werkzeug_console", "finding": "sensitive", "extended_paths": ["/console"],
+     "body": ["__debugger__", "Werkzeug Debugger"]},
+    {"id": "symfony_profiler", "finding": "sensitive", "extended_paths": ["/_profiler"], "body": ["Symfony Profiler"]},
+    {"id": "laravel_ignition", "finding": "sensitive", "extended_paths": ["/_ignition/health-check"],
+     "body": ["can_execute_commands"]},
+    {"id": "spring_actuator", "finding": "sensitive", "extended_paths": ["/actuator/env"],
+     "headers": [("content-type", "application/vnd.spring-boot.actuator")], "body": ["propertySources"]},
+    {"id": "go_pprof", "finding": "sensitive", "extended_paths": ["/debug/pprof/"], "body": ["Types of profiles available"]},
+    {"id": "rails_info", "finding": "sensitive", "extended_paths": ["/rails/info/properties"], "body": ["Rails version"]},
+    {"id": "apache_status", "finding": "sensitive", "extended_paths": ["/server-status"], "body": ["Apache Server Status"]},
+    {"id": "aspnet_trace", "finding": "sensitive", "extended_paths": ["/elmah.axd", "/trace.axd"],
+     "body": ["Error Log for", "Application Trace"]},
+    {"id": "login_page", "finding": "admin", "paths": ["/wp-admin", "/admin", "/administrator", "/login"],
+     "body": ["login", "password", "username", "sign in"], "ignore_case": True, "follow_redirects": True},
+    {"id": "db_admin", "finding": "admin", "extended_paths": ["/phpmyadmin/", "/adminer.php"],
+     "body": ["phpMyAdmin", "Adminer"], "follow_redirects": True},
+    # A JSON answer on an MCP path decides it from the headers alone
+    {"id": "mcp_endpoint", "finding": "mcp", "paths": ["/.mcp/config.json", "/mcp", "/api/mcp", "/agent"],
+     "headers": [("content-type", "application/json")], "body": ["mcp"], "ignore_case": True},
+    {"id": "mcp_sse", "finding": "mcp", "extended_paths": ["/sse", "/mcp/sse"],
+     "headers": [("content-type", "text/event-stream")]},
+    {"id": "mcp_manifest", "finding": "mcp", "extended_paths": ["/.well-known/mcp.json", "/.well-known/mcp/server.json"], "body": ["mcpServers", "\"tools\"", "protocolVersion"]},
+    {"id": "agent_manifest", "finding": "mcp", "extended_paths": ["/.well-known/ai-plugin.json", "/.well-known/agent.json"],
+     "body": ["name_for_model", "defaultInputModes"]},
+)
+
+def _fold(byte: int) -> int:
+    return byte + 32 if 65 <= byte <= 90 else byte
+
+class Automaton:
+    """
+    Aho-Corasick automaton over bytes, expanded into a dense transition table (one
+    256-entry row per state) so matching is a single table lookup per input byte.
+    ASCII letters are folded; case-sensitive patterns are confirmed on a hit.
+    """
+
+    def __init__(self, patterns: Sequence[Tuple[bytes, bool]]):
+        self.patterns = list(patterns) # (pattern, case_sensitive)
+        self.max_length = max((len(pattern) for pattern, _ in self.patterns), default=0)
+        goto: List[Dict[int, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+        for pattern_id, (pattern, _) in enumerate(self.patterns):
+            state = 0
+            for byte in pattern:
+                byte = _fold(byte)
+                following = goto[state].get(byte)
+                if following is None:
+                    goto.append({})
+                    outputs.append([])
+                    following = goto[state][byte] = len(goto) - 1
+                state = following
+            outputs[state].append(pattern_id)
+
+        # Breadth-first, so a state's failure state (always shallower) is complete before it
+        delta: List[Optional[List[int]]] = [None] * len(goto)
+        fail = [0] * len(goto)
+        delta[0] = self._row([0] * 256, goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            for byte, following in goto[state].items():
+                fail[following] = delta[fail[state]][byte]
+                queue.append(following)
+            delta[state] = self._row(list(delta[fail[state]]), goto[state])
+        self.delta = delta
+        self.outputs = [tuple(ids) or None for ids in outputs]
+
+    @staticmethod
+    def _row(row: List[int], edges: Dict[int, int]) -> List[int]:
+        for byte, following in edges.items():
+            row[byte] = following
+            if 97 <= byte <= 122:
+                row[byte - 32] = following
+        return row
+
+class Scan:
+    """Matching state of one streamed body: feed it chunks in order."""
+
+    def __init__(self, automaton: Automaton, wanted: Dict[int, str]):
+        self.automaton = automaton
+        self.wanted = wanted # pattern id -> signature id, for the signatures this probe looks for
+        self.state = 0
+        self.tail = b"" # end of the previous chunks, to confirm a case-sensitive match spanning them
+
+    def feed(self, chunk: bytes) -> Optional[str]:
+        """The signature id of the first wanted pattern found, or None (so far)."""
+        delta, outputs = self.automaton.delta, self.automaton.outputs
+        state = self.state
+        # The inner loop is the hot path: one table lookup per byte and no position counter.
+        # The position is only needed on a hit, and the iterator knows how much is left.
+        remaining = iter(chunk)
+        while True:
+            for byte in remaining:
+                state = delta[state][byte]
+                if outputs[state] is not None:
+                    break
+            else:
+                break
+            hit = self._confirm(outputs[state], chunk, len(chunk) - operator.length_hint(remaining))
+            if hit is not None:
+                self.state = state
+                return hit
+        self.state = state
+        keep = self.automaton.max_length - 1
+        if keep > 0:
+            self.tail = (self.tail + chunk)[-keep:]
+        return None
+
+    def _confirm(self, pattern_ids: Tuple[int, ...], chunk: bytes, end: int) -> Optional[str]:
+        for pattern_id in pattern_ids:
+            signature = self.wanted.get(pattern_id)
+            if signature is None:
+                continue
+            pattern, case_sensitive = self.automaton.patterns[pattern_id]
+            if case_sensitive:
+                start = end - len(pattern)
+                text = chunk[start:end] if start >= 0 else self.tail[len(self.tail) + start:] + chunk[:end]
+                if text != pattern:
+                    continue
+            return signature
+        return None
+
+class SignatureDatabase:
+    def __init__(self, signatures: Iterable[dict]):
+        self.signatures: Dict[str, dict] = {}
+        for signature in signatures:
+            self.signatures[signature["id"]] = signature
+
+        pattern_ids: Dict[Tuple[bytes, bool], int] = {}
+        # signature id -> {pattern id: signature id}, merged per probe
+        self._wanted: Dict[str, Dict[int, str]] = {}
+        for signature_id, signature in self.signatures.items():
+            case_sensitive = not signature.get("ignore_case", False)
+            wanted = self._wanted[signature_id] = {}
+            for text in signature.get("body", ()):
+                pattern = text.encode("latin-1")
+                key = (pattern.lower() if not case_sensitive else pattern, case_sensitive)
+                wanted[pattern_ids.setdefault(key, len(pattern_ids))] = signature_id
+        self.automaton = Automaton(sorted(pattern_ids, key=pattern_ids.get))
+
+    def probes(self, finding: str, extended: bool = False) -> List[Tuple[str, bool, Tuple[str, ...]]]:
+        """(path, follow_redirects, signature ids) for every path a finding probes, in table order."""
+        probes: Dict[Tuple[str, bool], List[str]] = {}
+        for signature_id, signature in self.signatures.items():
+            if signature["finding"] != finding:
+                continue
+            paths = signature.get("paths", []) + (signature.get("extended_paths", []) if extended else [])
+            for path in paths:
+                probes.setdefault((path, signature.get("follow_redirects", False)), []).append(signature_id)
+        return [(path, follow, tuple(ids)) for (path, follow), ids in probes.items()]
+
+    def header_rules(self, signature_ids: Iterable[str]) -> List[Tuple[str, str, str]]:
+        """(signature id, header, substring) for the given signatures."""
+        return [(signature_id, header, value) for signature_id in signature_ids
+                for header, value in self.signatures[signature_id].get("headers", ())]
+
+    def scan(self, signature_ids: Iterable[str]) -> Optional[Scan]:
+        """A body scan for the given signatures; None when none of them has body patterns."""
+        wanted: Dict[int, str] = {}
+        for signature_id in signature_ids:
+            for pattern_id, owner in self._wanted[signature_id].items():
+                wanted.setdefault(pattern_id, owner)
+        return Scan(self.automaton, wanted) if wanted else None
+
+def load_signatures(path: Optional[str] = None) -> List[dict]:
+    """Built-in signatures plus those in $SCAN_SIGNATURES (or `path`)."""
+    signatures = [dict(signature) for signature in SIGNATURES]
+    path = path or os.environ.get("SCAN_SIGNATURES")
+    if path:
+        with open(path) as f:
+            signatures += [{**signature, "headers": [tuple(rule) for rule in signature.get("headers", ())]}
+                           for signature in json.load(f)]
+    return signatures
+
+_database: Optional[SignatureDatabase] = None
+
+def get_signatures() -> SignatureDatabase:
+    global _database
+    if _database is None:
+        _database = SignatureDatabase(load_signatures())
+    return _database
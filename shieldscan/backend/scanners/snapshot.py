@@ -0,0 +1,200 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+
+from scanners.cache import normalize_target
+from scanners.http import get_client
+from scanners.probe import ProbeResult, stream_probe, PROBE_MAX_BYTES
+from scanners.validators import validator_store
+from scanners.politeness import outbound
+
+# Analyzers only look for a few keywords, so we never keep more than this much of a body
+BODY_PREFIX_BYTES = int(os.environ.get("SCAN_BODY_PREFIX_BYTES", str(64 * 1024)))
+
+CORS_TEST_ORIGIN = "https://evil-untrusted-site.com"
+# A 429 is retried this many times, after the pause the target asked for
+RATE_LIMIT_RETRIES = 1
+# Longest a request waits for the target's stored validators before going without them
+VALIDATOR_LOAD_TIMEOUT = 1.0
+
+_saves: set = set() # validator writes still running, so they are not garbage collected
+
+@dataclass
+class PageFetch:
+    url: str
+    status_code: int = 0
+    headers: Dict[str, str] = field(default_factory=dict) # lowercased names
+    body: bytes = b"" # at most BODY_PREFIX_BYTES
+    encoding: str = "utf-8"
+    truncated: bool = False
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def text(self) -> str:
+        return self.body.decode(self.encoding, errors="replace")
+
+class TargetSnapshot:
+    """
+    Per-scan view of a target. Every unique request is sent at most once, no matter
+    how many analyzers ask for it, and only the headers plus a bounded body prefix are kept.
+    """
+
+    def __init__(self, url: str, body_limit: int = BODY_PREFIX_BYTES):
+        self.url = url
+        self.target = normalize_target(url)
+        self.hostname = urlparse(url).hostname
+        self.body_limit = body_limit
+        self._fetches: Dict[Tuple, asyncio.Task] = {}
+        self._validators: Optional[asyncio.Task] = None
+        self._changed: set = set() # request keys whose validators this scan updated
+        self._users = 0
+
+    def resolve(self, path: str) -> str:
+        return urljoin(self.url, path)
+
+    async def fetch(self, path: str = "", method: str = "GET", follow_redirects: bool = True,
+                    headers: Optional[Dict[str, str]] = None, timeout: float = 5, urgent: bool = False) -> PageFetch:
+        """
+        Returns the fetch for `path`, sending the request only if no analyzer asked for it yet.
+        Concurrent callers asking for the same request await the same task. `timeout` includes
+        the wait for an outbound slot; `urgent` requests get theirs ahead of the path probes.
+        """
+        target = self.resolve(path) if path else self.url
+        key = (method, target, follow_redirects, tuple(sorted((headers or {}).items())))
+        task = self._fetches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, target, method, follow_redirects, headers, timeout, urgent))
+            self._fetches[key] = task
+        # Shielded so one cancelled analyzer does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    async def probe(self, path: str, signatures: Iterable[str], follow_redirects: bool = False,
+                    max_bytes: int = PROBE_MAX_BYTES, timeout: float = 3) -> ProbeResult:
+        """
+        Streaming probe of `path` for the signature ids `signatures` (see scanners.probe.stream_probe),
+        deduplicated per scan like `fetch`. Use this instead of `fetch` when only a yes/no match is needed.
+        """
+        signatures = tuple(signatures)
+        target = self.resolve(path)
+        key = ("PROBE", target, follow_redirects, signatures, max_bytes)
+        task = self._fetches.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._probe(
+                key, target, signatures, follow_redirects=follow_redirects, max_bytes=max_bytes, timeout=timeout
+            ))
+            self._fetches[key] = task
+        return await asyncio.shield(task)
+
+    async def root(self) -> PageFetch:
+        # The root GET carries a foreign Origin so the CORS analyzer can reuse it; most checkers wait on it
+        return await self.fetch(headers={"Origin": CORS_TEST_ORIGIN}, urgent=True)
+
+    async def _load_validators(self, deadline: float):
+        # Validators from earlier scans of the target, possibly by another process or before a restart
+        if self._validators is None:
+            self._validators = asyncio.ensure_future(validator_store.load(self.target))
+        try:
+            await asyncio.wait_for(asyncio.shield(self._validators),
+                                   timeout=max(0.0, min(VALIDATOR_LOAD_TIMEOUT, deadline - time.monotonic())))
+        except asyncio.TimeoutError:
+            pass
+
+    def _validated(self, key: Tuple, *args):
+        if validator_store.put(key, *args):
+            self._changed.add(key)
+
+    async def _probe(self, key: Tuple, target: str, signatures, timeout: float, **options) -> ProbeResult:
+        # The timeout covers loading validators, the wait for a slot and any retry, not just the request itself
+        deadline = time.monotonic() + timeout
+        await self._load_validators(deadline)
+        # Probe hits are kept across scans: a 304 on the next scan stands for the same hit
+        cached = validator_store.get(key)
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                async with outbound.slot(target, timeout=deadline - time.monotonic()) as request:
+                    result = await stream_probe(get_client(), target, signatures,
+                                                timeout=max(0.1, deadline - time.monotonic()),
+                                                headers=cached.conditional_headers() if cached else None, **options)
+                    request.failed = result.error is not None
+            except asyncio.TimeoutError as e:
+                return ProbeResult(url=target, error=str(e))
+            outbound.observe(target, result.status_code, result.headers.get("retry-after"))
+            if result.status_code != 429:
+                break
+        if result.status_code == 304 and cached is not None:
+            return replace(cached.response)
+        if result.status_code == 200 and result.error is None:
+            self._validated(key, result.headers, result)
+        return result
+
+    async def _fetch(self, key: Tuple, target: str, method: str, follow_redirects: bool,
+                     headers: Optional[Dict[str, str]], timeout: float, urgent: bool) -> PageFetch:
+        deadline = time.monotonic() + timeout
+        if method == "GET":
+            await self._load_validators(deadline)
+        # GETs seen on an earlier scan are revalidated instead of downloaded again
+        cached = validator_store.get(key) if method == "GET" else None
+        if cached is not None:
+            headers = {**(headers or {}), **cached.conditional_headers()}
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            page = PageFetch(url=target)
+            try:
+                async with outbound.slot(target, timeout=deadline - time.monotonic(), urgent=urgent):
+                    async with get_client().stream(method, target, headers=headers,
+                                                   timeout=max(0.1, deadline - time.monotonic()),
+                                                   follow_redirects=follow_redirects) as response:
+                        outbound.observe(target, response.status_code, response.headers.get("retry-after"))
+                        if response.status_code == 429 and attempt < RATE_LIMIT_RETRIES:
+                            continue
+                        if response.status_code == 304 and cached is not None:
+                            page = replace(cached.response)
+                            # A 304 may carry updated metadata (e.g. a new ETag); the stored body is still current
+                            page.headers = {**page.headers, **{k.lower(): v for k, v in response.headers.items()
+                                                               if k.lower() != "content-length"}}
+                            self._validated(key, page.headers, page)
+                            return page
+                        page.status_code = response.status_code
+                        page.headers = {k.lower(): v for k, v in response.headers.items()}
+                        page.encoding = response.charset_encoding or "utf-8"
+                        body = bytearray()
+                        async for chunk in response.aiter_bytes():
+                            body += chunk
+                            if len(body) >= self.body_limit:
+                                # Stop reading; closing the stream drops the rest of the body
+                                page.truncated = True
+                                break
+                        page.body = bytes(body[:self.body_limit])
+            except Exception as e:
+                page.error = str(e) or type(e).__name__
+                return page
+            break
+
+        if method == "GET" and page.status_code == 200:
+            self._validated(key, page.headers, page)
+        return page
+
+    def acquire(self):
+        self._users += 1
+
+    def release(self):
+        # Checker runs can be shared with other scans, so the last one out cleans up
+        self._users -= 1
+        if self._users <= 0:
+            self.close()
+
+    def close(self):
+        for task in self._fetches.values():
+            if not task.done():
+                task.cancel()
+        if self._changed:
+            save = asyncio.ensure_future(validator_store.save(self.target, list(self._changed)))
+            _saves.add(save)
+            save.add_done_callback(_saves.discard)
+            self._changed = set()
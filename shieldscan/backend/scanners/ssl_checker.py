@@ -1,42 +1,189 @@
-import ssl
+import asyncio
+import os
 import socket
+import ssl
+import time
 from datetime import datetime
+from typing import Optional
 from urllib.parse import urlparse
 
-def check_ssl(url: str) -> dict:
-    parsed_url = urlparse(url)
+from scanners.politeness import outbound
+from scanners.snapshot import TargetSnapshot
+from scanners.tls_probe import (
+    VERSIONS, DEFAULT_CIPHERS, WEAK_CIPHER_GROUPS, CIPHER_SUITES, WEAK_CIPHERS,
+    probe_hello, parse_certificate, PROBE_TIMEOUT,
+)
+
+# Probes still running after this are reported as unknown (None) rather than holding up the scan
+TLS_INSPECTION_BUDGET = float(os.environ.get("TLS_INSPECTION_BUDGET_SECONDS", "4"))
+# Resolving and the base handshake (plus its unverified retry) together, slot waits included,
+# so an unreachable site is reported as such well inside the scan deadline
+TLS_HANDSHAKE_TIMEOUT = float(os.environ.get("TLS_HANDSHAKE_TIMEOUT_SECONDS", "5"))
+LEGACY_PROTOCOLS = ("SSLv3", "TLSv1", "TLSv1.1")
+MIN_KEY_BITS = {"RSA": 2048, "EC": 224}
+WEAK_CIPHER_NAMES = frozenset(CIPHER_SUITES[code] for code in WEAK_CIPHERS)
+
+async def _resolve(hostname: str, port: int) -> str:
+    infos = await asyncio.get_running_loop().getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    return infos[0][4][0]
+
+async def _handshake(address: str, port: int, hostname: str, deadline: float, verify: bool = True) -> dict:
+    """One full handshake with the local OpenSSL: certificate validity, negotiated version and cipher."""
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    # Every checker's verdict on the site waits on this one, so it goes ahead of the probes
+    async with outbound.slot(hostname, kind="tls", timeout=deadline - time.monotonic(), urgent=True):
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(address, port, ssl=context, server_hostname=hostname),
+            timeout=max(0.1, deadline - time.monotonic())
+        )
+    try:
+        ssl_object = writer.get_extra_info("ssl_object")
+        cipher = ssl_object.cipher()
+        return {
+            "cert": ssl_object.getpeercert(),
+            "der": ssl_object.getpeercert(binary_form=True),
+            "version": ssl_object.version(),
+            "cipher": cipher[0] if cipher else None,
+        }
+    finally:
+        writer.close()
+
+async def _probe(address: str, port: int, hostname: str, version: str, ciphers, full: bool = False):
+    async with outbound.slot(hostname, kind="tls", timeout=PROBE_TIMEOUT) as request:
+        return await probe_hello(address, port, hostname, VERSIONS[version], ciphers, full=full,
+                                 timeout=max(0.1, PROBE_TIMEOUT - request.waited))
+
+def _certificate_status(cert: dict) -> dict:
+    not_after = cert.get('notAfter')
+    if not not_after:
+        return {"valid": False, "error": "Could not determine expiry"}
+    expiry_date = datetime.strptime(str(not_after), '%b %d %H:%M:%S %Y %Z')
+    days_remaining = (expiry_date - datetime.utcnow()).days
+
+    issuer_info = cert.get('issuer', [])
+    try:
+        issuer_name = dict(x[0] for x in issuer_info).get('organizationName', 'Unknown')
+    except Exception:
+        issuer_name = 'Unknown'
+
+    return {
+        "valid": True,
+        "days_remaining": days_remaining,
+        "issuer": issuer_name,
+        "expiring_soon": days_remaining < 14
+    }
+
+def _key_info(der: Optional[bytes]) -> Optional[dict]:
+    if not der:
+        return None
+    try:
+        parsed = parse_certificate(der)
+    except (IndexError, ValueError):
+        return None
+    return {"type": parsed["key_type"], "bits": parsed["key_bits"]}
+
+def _chain_info(certificates) -> Optional[dict]:
+    if not certificates:
+        return None
+    try:
+        parsed = [parse_certificate(der) for der in certificates]
+    except (IndexError, ValueError):
+        return {"length": len(certificates), "ordered": None}
+    # Each certificate should be issued by the next one the server sends
+    ordered = all(cert["issuer"] == parent["subject"] for cert, parent in zip(parsed, parsed[1:]))
+    return {"length": len(certificates), "ordered": ordered}
+
+async def check_ssl(snapshot: TargetSnapshot) -> dict:
+    parsed_url = urlparse(snapshot.url)
     hostname = parsed_url.hostname
     port = parsed_url.port or 443
 
     if not hostname:
         return {"valid": False, "error": "Invalid hostname"}
 
-    context = ssl.create_default_context()
+    started = time.monotonic()
+    deadline = started + TLS_HANDSHAKE_TIMEOUT
+    try:
+        # Resolve once; the base handshake and every probe connect to the same address
+        address = await asyncio.wait_for(_resolve(hostname, port), TLS_HANDSHAKE_TIMEOUT)
+    except (OSError, asyncio.TimeoutError) as e:
+        return {"valid": False, "error": str(e) or type(e).__name__}
+
+    # Protocol and cipher probes only need the ServerHello, so they run alongside the base handshake
+    base_task = asyncio.ensure_future(_base_check(address, port, hostname, deadline))
+    probes = {
+        name: asyncio.ensure_future(_probe(address, port, hostname, name, DEFAULT_CIPHERS, full=name == "TLSv1.2"))
+        for name in ("TLSv1.2",) + LEGACY_PROTOCOLS
+    }
+    weak_probes = {
+        group: asyncio.ensure_future(_probe(address, port, hostname, "TLSv1.2", ciphers))
+        for group, ciphers in WEAK_CIPHER_GROUPS.items()
+    }
+    tasks = list(probes.values()) + list(weak_probes.values())
+    try:
+        result, base = await base_task
+        await asyncio.wait(tasks, timeout=max(0.0, TLS_INSPECTION_BUDGET - (time.monotonic() - started)))
+    finally:
+        for task in tasks + [base_task]:
+            task.cancel()
+
+    def outcome(task):
+        if not task.done() or task.cancelled() or task.exception() is not None:
+            return None
+        return task.result()
+
+    hellos = {name: outcome(task) for name, task in probes.items()}
+    protocols = {
+        name: None if hellos[name] is None else (hellos[name].accepted and hellos[name].version == name)
+        for name in LEGACY_PROTOCOLS + ("TLSv1.2",)
+    }
+    if base is not None:
+        # The base handshake offers everything up to TLS 1.3, so it settles 1.3 support
+        protocols["TLSv1.3"] = base["version"] == "TLSv1.3"
+        if protocols["TLSv1.2"] is None and base["version"] == "TLSv1.2":
+            protocols["TLSv1.2"] = True
+    else:
+        protocols["TLSv1.3"] = None
+
+    preferred = {name: hello.cipher for name, hello in hellos.items() if protocols.get(name)}
+    weak_ciphers = {hello.cipher for hello in map(outcome, weak_probes.values()) if hello and hello.accepted}
+    weak_ciphers |= {cipher for cipher in preferred.values() if cipher in WEAK_CIPHER_NAMES}
+
+    full_hello = hellos["TLSv1.2"]
+    certificates = full_hello.certificates if full_hello else []
+    key = _key_info(base["der"] if base else None) or _key_info(certificates[0] if certificates else None)
+
+    result.update({
+        "protocols": protocols,
+        "weak_protocols": [name for name in LEGACY_PROTOCOLS if protocols.get(name)],
+        "negotiated": {"version": base["version"], "cipher": base["cipher"]} if base else None,
+        "preferred_ciphers": preferred,
+        "weak_ciphers": sorted(weak_ciphers),
+        "chain": _chain_info(certificates),
+        "ocsp_stapled": full_hello.ocsp_stapled if full_hello and full_hello.accepted else None,
+        "key": key,
+        "weak_key": bool(key and key["bits"] and key["bits"] < MIN_KEY_BITS.get(key["type"], 0)),
+        "inspection_ms": round((time.monotonic() - started) * 1000),
+    })
+    return result
+
+async def _base_check(address: str, port: int, hostname: str, deadline: float):
+    """Returns (certificate status, handshake details or None)."""
     try:
-        with socket.create_connection((hostname, port), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=hostname) as ssock:
-                cert = ssock.getpeercert()
-                if not cert:
-                    return {"valid": False, "error": "No certificate presented"}
-                    
-                not_after = cert.get('notAfter')
-                if not_after:
-                    expiry_date = datetime.strptime(str(not_after), '%b %d %H:%M:%S %Y %Z')
-                    days_remaining = (expiry_date - datetime.utcnow()).days
-                    
-                    issuer_info = cert.get('issuer', [])
-                    try:
-                        issuer_name = dict(x[0] for x in issuer_info).get('organizationName', 'Unknown')
-                    except Exception:
-                        issuer_name = 'Unknown'
-                        
-                    return {
-                        "valid": True,
-                        "days_remaining": days_remaining,
-                        "issuer": issuer_name,
-                        "expiring_soon": days_remaining < 14
-                    }
-                return {"valid": False, "error": "Could not determine expiry"}
+        base = await _handshake(address, port, hostname, deadline)
+    except ssl.SSLCertVerificationError as e:
+        # Still inspect the server; only the certificate itself is untrusted
+        result = {"valid": False, "error": str(e) or type(e).__name__}
+        try:
+            return result, await _handshake(address, port, hostname, deadline, verify=False)
+        except Exception:
+            return result, None
     except Exception as e:
-        return {"valid": False, "error": str(e)}
+        return {"valid": False, "error": str(e) or type(e).__name__}, None
 
+    if not base["cert"]:
+        return {"valid": False, "error": "No certificate presented"}, base
+    return _certificate_status(base["cert"]), base
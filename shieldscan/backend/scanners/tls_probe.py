@@ -0,0 +1,269 @@
+import asyncio
+import os
+import struct
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Minimal TLS (<= 1.2) ClientHello prober: sends a hand-built hello and reads the server's
+# plaintext reply (ServerHello, Certificate, CertificateStatus) without finishing the
+# handshake. That is enough to learn which protocol versions and cipher suites a server
+# accepts, its certificate chain and whether it staples OCSP, and works for legacy
+# protocols the local OpenSSL refuses to speak.
+PROBE_TIMEOUT = float(os.environ.get("TLS_PROBE_TIMEOUT_SECONDS", "3"))
+MAX_REPLY_BYTES = 64 * 1024 # certificate chains are a few KB; stop reading well before this
+
+VERSIONS = {"SSLv3": 0x0300, "TLSv1": 0x0301, "TLSv1.1": 0x0302, "TLSv1.2": 0x0303}
+VERSION_NAMES = {code: name for name, code in VERSIONS.items()}
+
+CIPHER_SUITES = {
+    # Forward-secret AEAD and CBC suites
+    0xC02B: "ECDHE-ECDSA-AES128-GCM-SHA256",
+    0xC02C: "ECDHE-ECDSA-AES256-GCM-SHA384",
+    0xC02F: "ECDHE-RSA-AES128-GCM-SHA256",
+    0xC030: "ECDHE-RSA-AES256-GCM-SHA384",
+    0xCCA9: "ECDHE-ECDSA-CHACHA20-POLY1305",
+    0xCCA8: "ECDHE-RSA-CHACHA20-POLY1305",
+    0x009E: "DHE-RSA-AES128-GCM-SHA256",
+    0x009F: "DHE-RSA-AES256-GCM-SHA384",
+    0xC023: "ECDHE-ECDSA-AES128-SHA256",
+    0xC024: "ECDHE-ECDSA-AES256-SHA384",
+    0xC027: "ECDHE-RSA-AES128-SHA256",
+    0xC028: "ECDHE-RSA-AES256-SHA384",
+    0xC009: "ECDHE-ECDSA-AES128-SHA",
+    0xC00A: "ECDHE-ECDSA-AES256-SHA",
+    0xC013: "ECDHE-RSA-AES128-SHA",
+    0xC014: "ECDHE-RSA-AES256-SHA",
+    0x0033: "DHE-RSA-AES128-SHA",
+    0x0039: "DHE-RSA-AES256-SHA",
+    # Static RSA key exchange (no forward secrecy)
+    0x009C: "AES128-GCM-SHA256",
+    0x009D: "AES256-GCM-SHA384",
+    0x003C: "AES128-SHA256",
+    0x003D: "AES256-SHA256",
+    0x002F: "AES128-SHA",
+    0x0035: "AES256-SHA",
+    # Broken or obsolete
+    0x000A: "DES-CBC3-SHA",
+    0xC012: "ECDHE-RSA-DES-CBC3-SHA",
+    0x0016: "EDH-RSA-DES-CBC3-SHA",
+    0x0009: "DES-CBC-SHA",
+    0x0015: "EDH-RSA-DES-CBC-SHA",
+    0x0005: "RC4-SHA",
+    0x0004: "RC4-MD5",
+    0xC011: "ECDHE-RSA-RC4-SHA",
+    0xC007: "ECDHE-ECDSA-RC4-SHA",
+    0x0003: "EXP-RC4-MD5",
+    0x0008: "EXP-DES-CBC-SHA",
+    0x0014: "EXP-EDH-RSA-DES-CBC-SHA",
+    0x0001: "NULL-MD5",
+    0x0002: "NULL-SHA",
+    0x003B: "NULL-SHA256",
+    0x0018: "ADH-RC4-MD5",
+    0x0034: "ADH-AES128-SHA",
+    0xC018: "AECDH-AES128-SHA",
+}
+
+# Each group is offered on its own: any ServerHello means the server accepts one of them
+WEAK_CIPHER_GROUPS = {
+    "RC4": (0x0005, 0x0004, 0xC011, 0xC007),
+    "DES/3DES": (0x000A, 0xC012, 0x0016, 0x0009, 0x0015),
+    "NULL/EXPORT/anonymous": (0x0003, 0x0008, 0x0014, 0x0001, 0x0002, 0x003B, 0x0018, 0x0034, 0xC018),
+}
+WEAK_CIPHERS = frozenset(code for group in WEAK_CIPHER_GROUPS.values() for code in group)
+# Offered when probing a protocol version: everything a reasonable server might pick
+DEFAULT_CIPHERS = tuple(code for code in CIPHER_SUITES if code not in WEAK_CIPHERS) + WEAK_CIPHER_GROUPS["DES/3DES"]
+
+HANDSHAKE = 0x16
+ALERT = 0x15
+SERVER_HELLO = 2
+CERTIFICATE = 11
+SERVER_HELLO_DONE = 14
+CERTIFICATE_STATUS = 22
+EXT_SERVER_NAME = 0x0000
+EXT_STATUS_REQUEST = 0x0005
+
+class TLSProbeError(Exception):
+    pass
+
+@dataclass
+class HelloResult:
+    accepted: bool # False when the server answered with an alert or closed the connection
+    version: Optional[str] = None
+    cipher: Optional[str] = None
+    ocsp_stapled: Optional[bool] = None
+    certificates: List[bytes] = field(default_factory=list) # DER, leaf first
+
+def _extension(ext_type: int, data: bytes) -> bytes:
+    return struct.pack("!HH", ext_type, len(data)) + data
+
+def build_client_hello(hostname: str, version: int, ciphers: Sequence[int], status_request: bool = False) -> bytes:
+    extensions = b""
+    if hostname:
+        name = hostname.encode("idna")
+        entry = b"\x00" + struct.pack("!H", len(name)) + name
+        extensions += _extension(EXT_SERVER_NAME, struct.pack("!H", len(entry)) + entry)
+    if status_request:
+        extensions += _extension(EXT_STATUS_REQUEST, b"\x01\x00\x00\x00\x00") # OCSP, no responder ids or extensions
+    groups = (0x001D, 0x0017, 0x0018, 0x0019) # x25519, P-256, P-384, P-521
+    extensions += _extension(0x000A, struct.pack("!H", len(groups) * 2) + struct.pack(f"!{len(groups)}H", *groups))
+    extensions += _extension(0x000B, b"\x01\x00") # uncompressed points
+    signature_algorithms = (0x0403, 0x0503, 0x0603, 0x0804, 0x0805, 0x0806, 0x0401, 0x0501, 0x0601, 0x0203, 0x0201)
+    extensions += _extension(0x000D, struct.pack("!H", len(signature_algorithms) * 2)
+                             + struct.pack(f"!{len(signature_algorithms)}H", *signature_algorithms))
+    extensions += _extension(0xFF01, b"\x00") # empty renegotiation_info
+
+    body = (
+        struct.pack("!H", version)
+        + os.urandom(32)
+        + b"\x00" # no session id
+        + struct.pack("!H", len(ciphers) * 2) + struct.pack(f"!{len(ciphers)}H", *ciphers)
+        + b"\x01\x00" # null compression only
+        + struct.pack("!H", len(extensions)) + extensions
+    )
+    handshake = bytes([1]) + len(body).to_bytes(3, "big") + body
+    # Record layer version stays at TLS 1.0 for compatibility with old middleboxes
+    return struct.pack("!BHH", HANDSHAKE, min(version, 0x0301), len(handshake)) + handshake
+
+def _parse_server_hello(body: bytes, result: HelloResult):
+    version, = struct.unpack("!H", body[:2])
+    offset = 2 + 32
+    offset += 1 + body[offset]
+    cipher, = struct.unpack("!H", body[offset:offset + 2])
+    offset += 3 # cipher suite and compression method
+    result.version = VERSION_NAMES.get(version, hex(version))
+    result.cipher = CIPHER_SUITES.get(cipher, f"0x{cipher:04X}")
+    result.ocsp_stapled = False
+    if offset + 2 <= len(body):
+        end = offset + 2 + struct.unpack("!H", body[offset:offset + 2])[0]
+        offset += 2
+        while offset + 4 <= end:
+            ext_type, ext_length = struct.unpack("!HH", body[offset:offset + 4])
+            if ext_type == EXT_STATUS_REQUEST:
+                result.ocsp_stapled = True # the server commits to sending a CertificateStatus
+            offset += 4 + ext_length
+
+def _parse_certificates(body: bytes) -> List[bytes]:
+    certificates = []
+    offset = 3
+    while offset + 3 <= len(body):
+        length = int.from_bytes(body[offset:offset + 3], "big")
+        certificates.append(body[offset + 3:offset + 3 + length])
+        offset += 3 + length
+    return certificates
+
+async def probe_hello(address: str, port: int, hostname: str, version: int, ciphers: Sequence[int],
+                      full: bool = False, timeout: float = PROBE_TIMEOUT) -> HelloResult:
+    """
+    Offers `ciphers` at `version` and reports what the server picked. With `full` the reply is
+    read up to ServerHelloDone to collect the certificate chain and stapled OCSP response.
+    Raises TLSProbeError (or OSError / TimeoutError) when the outcome is unknown.
+    """
+    return await asyncio.wait_for(_probe_hello(address, port, hostname, version, ciphers, full), timeout)
+
+async def _probe_hello(address, port, hostname, version, ciphers, full) -> HelloResult:
+    reader, writer = await asyncio.open_connection(address, port)
+    try:
+        writer.write(build_client_hello(hostname, version, ciphers, status_request=full))
+        await writer.drain()
+
+        result = HelloResult(accepted=False)
+        buffer = b""
+        received = 0
+        while received < MAX_REPLY_BYTES:
+            try:
+                header = await reader.readexactly(5)
+            except asyncio.IncompleteReadError:
+                return result # closed without (or before finishing) a reply
+            content_type, _, length = struct.unpack("!BHH", header)
+            payload = await reader.readexactly(length)
+            received += 5 + length
+            if content_type == ALERT:
+                return result
+            if content_type != HANDSHAKE:
+                raise TLSProbeError(f"Unexpected TLS record type {content_type}")
+
+            buffer += payload
+            while len(buffer) >= 4:
+                message_length = int.from_bytes(buffer[1:4], "big")
+                if len(buffer) < 4 + message_length:
+                    break
+                message_type, body = buffer[0], buffer[4:4 + message_length]
+                buffer = buffer[4 + message_length:]
+                if message_type == SERVER_HELLO:
+                    _parse_server_hello(body, result)
+                    result.accepted = True
+                    if not full:
+                        return result
+                elif message_type == CERTIFICATE:
+                    result.certificates = _parse_certificates(body)
+                elif message_type == CERTIFICATE_STATUS:
+                    result.ocsp_stapled = True
+                elif message_type == SERVER_HELLO_DONE:
+                    return result
+        return result
+    finally:
+        writer.close()
+
+# --- Minimal DER reading, enough to compare names along a chain and size the public key
+
+OID_RSA = bytes.fromhex("2a864886f70d010101")
+OID_EC = bytes.fromhex("2a8648ce3d0201")
+OID_ED25519 = bytes.fromhex("2b6570")
+EC_CURVE_BITS = {
+    bytes.fromhex("2a8648ce3d030107"): 256, # P-256
+    bytes.fromhex("2b81040022"): 384, # P-384
+    bytes.fromhex("2b81040023"): 521, # P-521
+}
+
+def _der_item(data: bytes, offset: int) -> Tuple[int, int, int]:
+    """Returns (tag, content start, content end) of the DER element at `offset`."""
+    tag = data[offset]
+    length = data[offset + 1]
+    start = offset + 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[start:start + count], "big")
+        start += count
+    return tag, start, start + length
+
+def _der_children(data: bytes, start: int, end: int) -> List[Tuple[int, int, int, int]]:
+    """(tag, element start, content start, content end) for each element in data[start:end]."""
+    children = []
+    while start < end:
+        tag, content_start, content_end = _der_item(data, start)
+        children.append((tag, start, content_start, content_end))
+        start = content_end
+    return children
+
+def parse_certificate(der: bytes) -> Dict[str, object]:
+    """Issuer and subject (raw DER, for chain comparison) and the public key type and size."""
+    _, cert_start, cert_end = _der_item(der, 0)
+    _, tbs_start, tbs_end = _der_item(der, cert_start)
+    fields = _der_children(der, tbs_start, tbs_end)
+    if fields and fields[0][0] == 0xA0: # explicit version
+        fields = fields[1:]
+    issuer, subject, spki = fields[2], fields[4], fields[5]
+
+    algorithm, key = _der_children(der, spki[2], spki[3])[:2]
+    algorithm_parts = _der_children(der, algorithm[2], algorithm[3])
+    oid = der[algorithm_parts[0][2]:algorithm_parts[0][3]]
+    key_type, bits = "unknown", None
+    if oid == OID_RSA:
+        key_type = "RSA"
+        # BIT STRING: one "unused bits" byte, then SEQUENCE { modulus INTEGER, exponent INTEGER }
+        _, seq_start, seq_end = _der_item(der, key[2] + 1)
+        modulus = _der_children(der, seq_start, seq_end)[0]
+        bits = int.from_bytes(der[modulus[2]:modulus[3]], "big").bit_length()
+    elif oid == OID_EC:
+        key_type = "EC"
+        if len(algorithm_parts) > 1:
+            bits = EC_CURVE_BITS.get(der[algorithm_parts[1][2]:algorithm_parts[1][3]])
+    elif oid == OID_ED25519:
+        key_type, bits = "Ed25519", 256
+
+    return {
+        "issuer": der[issuer[1]:issuer[3]],
+        "subject": der[subject[1]:subject[3]],
+        "key_type": key_type,
+        "key_bits": bits,
+    }
@@ -0,0 +1,164 @@
+import base64
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from database import AsyncSessionLocal
+import models.db
+
+# Responses kept in memory for revalidation; one entry per distinct request (URL, method, headers)
+MAX_ENTRIES = int(os.environ.get("SCAN_VALIDATOR_MAX_ENTRIES", "5000"))
+# Stored validators of targets that have not been rescanned for this long are dropped
+MAX_AGE_DAYS = float(os.environ.get("SCAN_VALIDATOR_MAX_AGE_DAYS", "30"))
+PRUNE_INTERVAL_SECONDS = 3600
+# A scan typically sends ~20 requests, so this many targets' worth of entries fit in memory
+ENTRIES_PER_TARGET = 20
+
+def request_key(key: Hashable) -> str:
+    return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+
+@dataclass
+class Validated:
+    etag: Optional[str]
+    last_modified: Optional[str]
+    response: Any # the PageFetch / ProbeResult analyzers saw last time
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+def _response_types() -> dict:
+    # Imported here: scanners.snapshot imports this module
+    from scanners.probe import ProbeResult
+    from scanners.snapshot import PageFetch
+    return {"PageFetch": PageFetch, "ProbeResult": ProbeResult}
+
+def dump_response(response: Any) -> dict:
+    """JSON-safe form of a PageFetch / ProbeResult; bytes fields are base64."""
+    data = {"type": type(response).__name__, "fields": {}, "bytes": []}
+    for field in fields(response):
+        value = getattr(response, field.name)
+        if isinstance(value, bytes):
+            value = base64.b64encode(value).decode("ascii")
+            data["bytes"].append(field.name)
+        data["fields"][field.name] = value
+    return data
+
+def load_response(data: dict) -> Any:
+    values = dict(data["fields"])
+    for name in data.get("bytes", []):
+        values[name] = base64.b64decode(values[name])
+    return _response_types()[data["type"]](**values)
+
+class ValidatorStore:
+    """
+    LRU of the last response per request, with the validators needed to revalidate it.
+    Rescans send If-None-Match / If-Modified-Since, and a 304 reuses the stored response
+    instead of downloading and analyzing the body again.
+
+    The LRU is this process's copy of the response_validators table: a scan loads its
+    target's rows the first time the target comes up, and saves what changed when it ends,
+    so validators survive restarts and are shared between the API and the monitor.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Validated]" = OrderedDict() # request_key(key) -> entry
+        self._loaded: "OrderedDict[str, None]" = OrderedDict() # targets already read from the database
+        self._pruned_at = 0.0
+
+    def get(self, key: Hashable) -> Optional[Validated]:
+        key = request_key(key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, headers: Dict[str, str], response: Any) -> bool:
+        """
+        Stores `response` if the server gave validators for it (lowercased `headers`), so a
+        conditional request can get a 304 next time; without them it would only be dead weight.
+        True when the validators differ from the stored ones, i.e. the entry needs saving.
+        """
+        etag, last_modified = headers.get("etag"), headers.get("last-modified")
+        key = request_key(key)
+        if not (etag or last_modified):
+            self._entries.pop(key, None)
+            return False
+        previous = self._entries.get(key)
+        self._remember(key, Validated(etag, last_modified, response))
+        return previous is None or (previous.etag, previous.last_modified) != (etag, last_modified)
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(request_key(key), None)
+
+    def _remember(self, key: str, entry: Validated):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def load(self, target: str):
+        """
+        Reads the stored entries of `target` into memory, once per target while it stays
+        there. Entries already in memory are at least as new and win.
+        """
+        if target in self._loaded:
+            self._loaded.move_to_end(target)
+            return
+        Row = models.db.ResponseValidator
+        try:
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(select(Row).where(Row.target == target))).scalars().all()
+            for row in rows:
+                if row.request_key not in self._entries:
+                    self._remember(row.request_key, Validated(row.etag, row.last_modified, load_response(row.response)))
+        except Exception as e:
+            print(f"Loading validators for {target} failed:", e)
+            return
+        self._loaded[target] = None
+        while len(self._loaded) > self.max_entries // ENTRIES_PER_TARGET:
+            self._loaded.popitem(last=False)
+
+    async def save(self, target: str, keys: Iterable[Hashable]):
+        """Writes the current entries for `keys` (requests of `target`) to the database, and prunes old rows now and then."""
+        values = [
+            {"target": target, "request_key": key, "etag": entry.etag,
+             "last_modified": entry.last_modified,
+             "response": dump_response(entry.response), "updated_at": datetime.now(timezone.utc)}
+            for key, entry in ((key, self._entries.get(key)) for key in map(request_key, keys))
+            if entry is not None
+        ]
+        if not values:
+            return
+        Row = models.db.ResponseValidator
+        try:
+            async with AsyncSessionLocal() as db:
+                insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+                statement = insert(Row).values(values)
+                await db.execute(statement.on_conflict_do_update(
+                    index_elements=["target", "request_key"],
+                    set_={name: statement.excluded[name] for name in
+                          ("etag", "last_modified", "response", "updated_at")},
+                ))
+                if time.monotonic() - self._pruned_at > PRUNE_INTERVAL_SECONDS:
+                    self._pruned_at = time.monotonic()
+                    cutoff = datetime.now(timezone.utc) - timedelta(days=MAX_AGE_DAYS)
+                    await db.execute(delete(Row).where(Row.updated_at < cutoff))
+                await db.commit()
+        except Exception as e:
+            print(f"Saving validators for {target} failed:", e)
+
+validator_store = ValidatorStore()
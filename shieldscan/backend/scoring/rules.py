@@ -0,0 +1,190 @@
+"""
+Declarative scoring: every issue ShieldScan reports is one rule in RULES.
+
+A rule names the checker whose result it reads, the conditions (all must hold) under
+which the issue applies, and which result fields go into the issue details. Rules are
+compiled once at import into plain callables; `evaluate` is a single pass over them.
+The module does no I/O, so stored results can be re-scored offline with the same code.
+"""
+import json
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from ai.summary import ISSUE_TEMPLATES
+
+# Conditions are (op, dotted path into the checker result[, value]); "checker:path" reads another
+# checker's result. Rules run on timed-out results only when they say so with on_timeout.
+RULES = (
+    {"key": "ssl_invalid", "checker": "ssl", "when": [("falsy", "valid")],
+     "details": {"error": "error"}},
+    # No handshake before the deadline on a site whose root page was not fetched either
+    {"key": "ssl_invalid", "checker": "ssl", "on_timeout": True,
+     "when": [("truthy", "timed_out"), ("falsy", "headers:success")],
+     "details": {"error": "error"}},
+    {"key": "ssl_expiring", "checker": "ssl", "when": [("truthy", "valid"), ("truthy", "expiring_soon")],
+     "details": {"days_remaining": ("days_remaining", None)}},
+    {"key": "missing_csp", "checker": "headers", "when": [("truthy", "headers"), ("falsy", "headers.csp.present")]},
+    {"key": "missing_hsts", "checker": "headers", "when": [("truthy", "headers"), ("falsy", "headers.hsts.present")]},
+    {"key": "missing_x_frame", "checker": "headers", "when": [("truthy", "headers"), ("falsy", "headers.x_frame_options.present")]},
+    {"key": "over_permissive_cors", "checker": "cors", "when": [("truthy", "vulnerable")],
+     "details": {"allowed_origin": ("allowed", "*")}},
+    {"key": "mcp_exposed", "checker": "mcp", "when": [("truthy", "exposed")],
+     "details": {"exposed_paths": ("paths", [])}},
+    {"key": "admin_exposed", "checker": "exposure", "when": [("truthy", "admin_exposed")],
+     "details": {"exposed_paths": ("admin_paths", [])}},
+    {"key": "sensitive_files", "checker": "exposure", "when": [("truthy", "sensitive_files")],
+     "details": {"exposed_paths": ("sensitive_files", [])}},
+    {"key": "missing_dmarc", "checker": "dmarc", "when": [("falsy", "has_dmarc")]},
+    {"key": "weak_tls", "checker": "ssl", "when": [("truthy", "weak_protocols")],
+     "details": {"protocols": ("weak_protocols", [])}},
+    {"key": "weak_ciphers", "checker": "ssl", "when": [("truthy", "weak_ciphers")],
+     "details": {"ciphers": ("weak_ciphers", [])}},
+    {"key": "weak_key", "checker": "ssl", "when": [("truthy", "weak_key")],
+     "details": {"key": "key"}},
+    {"key": "blacklisted", "checker": "blacklist", "when": [("truthy", "listed")],
+     "details": {"lists": ("lists", []), "matches": ("matches", [])}},
+)
+
+# (minimum score, grade), checked top to bottom
+GRADE_THRESHOLDS = ((90, "A"), (75, "B"), (60, "C"), (40, "D"), (0, "F"))
+
+# Legacy report fields that hold each checker's output, for stored reports written
+# before the per-checker mcp_status / cors_status fields existed
+CHECKER_FIELDS = {
+    "ssl": "ssl_status",
+    "headers": "headers_status",
+    "cors": "cors_status",
+    "mcp": "mcp_status",
+    "blacklist": "blacklist_status",
+    "exposure": "exposure_status",
+    "dmarc": "dmarc_status",
+}
+
+def _lookup(result: Mapping, path: str, default=None):
+    value: Any = result
+    for part in path.split("."):
+        if not isinstance(value, Mapping):
+            return default
+        value = value.get(part, default)
+    return value
+
+def _compile_condition(condition: tuple) -> Callable[[Mapping, Mapping], bool]:
+    op, path = condition[0], condition[1]
+    checker, _, other_path = path.partition(":")
+    if other_path:
+        lookup = lambda result, results, default=None: _lookup(results.get(checker) or {}, other_path, default)
+    else:
+        lookup = lambda result, results, default=None: _lookup(result, path, default)
+    if op == "truthy":
+        return lambda result, results: bool(lookup(result, results))
+    if op == "falsy":
+        return lambda result, results: not lookup(result, results)
+    if op == "equals":
+        expected = condition[2]
+        return lambda result, results: lookup(result, results) == expected
+    raise ValueError(f"Unknown rule condition {op!r}")
+
+@dataclass(frozen=True)
+class CompiledRule:
+    key: str
+    checker: str
+    conditions: Tuple[Callable[[Mapping, Mapping], bool], ...] # (checker result, all results)
+    details: Tuple[Tuple[str, str, Any, bool], ...] # (detail name, path, default, has default)
+    issue: Mapping[str, Any] # frozen template with key and score impact filled in
+    on_timeout: bool = False
+
+    def build_issue(self, result: Mapping) -> dict:
+        issue = dict(self.issue)
+        details = {}
+        for name, path, default, has_default in self.details:
+            value = _lookup(result, path, default)
+            if value is not None or has_default:
+                details[name] = value
+        if details:
+            issue["details"] = details
+        return issue
+
+def compile_rules(rules=RULES, weights: Optional[Mapping[str, int]] = None) -> Tuple[CompiledRule, ...]:
+    """
+    Validates and compiles rule specs. `weights` overrides template score impacts by issue key.
+    """
+    weights = weights or {}
+    compiled = []
+    for spec in rules:
+        key = spec["key"]
+        if key not in ISSUE_TEMPLATES:
+            raise ValueError(f"Rule {key!r} has no issue template")
+        issue = dict(ISSUE_TEMPLATES[key], key=key)
+        issue["score_impact"] = int(weights.get(key, spec.get("score_impact", issue["score_impact"])))
+        details = []
+        for name, source in spec.get("details", {}).items():
+            path, default = source if isinstance(source, tuple) else (source, None)
+            details.append((name, path, default, isinstance(source, tuple)))
+        compiled.append(CompiledRule(
+            key=key,
+            checker=spec["checker"],
+            conditions=tuple(_compile_condition(c) for c in spec["when"]),
+            details=tuple(details),
+            issue=MappingProxyType(issue),
+            on_timeout=spec.get("on_timeout", False),
+        ))
+    return tuple(compiled)
+
+def load_weights() -> Dict[str, int]:
+    """Optional JSON file of {issue key: score impact} named by SCORING_WEIGHTS."""
+    path = os.environ.get("SCORING_WEIGHTS")
+    if not path:
+        return {}
+    with open(path) as f:
+        return {key: int(value) for key, value in json.load(f).items()}
+
+COMPILED_RULES = compile_rules(weights=load_weights())
+
+def grade_for(score: int) -> str:
+    for minimum, grade in GRADE_THRESHOLDS:
+        if score >= minimum:
+            return grade
+    return GRADE_THRESHOLDS[-1][1]
+
+def evaluate(results: Mapping[str, Mapping], rules: Tuple[CompiledRule, ...] = None) -> dict:
+    """
+    Scores one set of checker results. Checkers that timed out are reported, not penalized,
+    except by the rules marked on_timeout.
+    Returns {"score", "grade", "issues"} with issues ordered by score impact, largest first.
+    """
+    rules = rules if rules is not None else COMPILED_RULES
+    issues = []
+    for rule in rules:
+        result = results.get(rule.checker)
+        if result is None or (result.get("timed_out") and not rule.on_timeout):
+            continue
+        if all(condition(result, results) for condition in rule.conditions):
+            issues.append(rule.build_issue(result))
+
+    score = max(0, 100 - sum(issue["score_impact"] for issue in issues))
+    return {
+        "score": score,
+        "grade": grade_for(score),
+        "issues": sorted(issues, key=lambda x: x["score_impact"], reverse=True),
+    }
+
+def checker_results_from(report: Mapping) -> dict:
+    """Per-checker results of a stored report, including reports in the older field layout."""
+    results = {}
+    for name, field in CHECKER_FIELDS.items():
+        result = report.get(field)
+        if result is None and name == "mcp" and "mcp_exposed" in report:
+            result = {"exposed": report["mcp_exposed"]}
+        if result is None and name == "cors" and "cors_vulnerable" in report:
+            result = {"vulnerable": report["cors_vulnerable"]}
+        if result is not None:
+            results[name] = result
+    for name in report.get("timed_out") or []:
+        results[name] = dict(results.get(name) or {}, timed_out=True)
+    return results
+
+def evaluate_report(report: Mapping, rules: Tuple[CompiledRule, ...] = None) -> dict:
+    """Re-scores a stored report (a ScanHistory.raw_result dict) without any network I/O."""
+    return evaluate(checker_results_from(report), rules=rules)
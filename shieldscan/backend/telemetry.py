@@ -0,0 +1,184 @@
+"""
+Timing instrumentation and Prometheus metrics, served as text on GET /metrics.
+
+Histograms and counters are filled in by the code they measure; gauges are callbacks
+read at scrape time. While a scan runs, `scan_trace()` also collects its own breakdown
+(per-checker wall time, outbound requests) which is stored on its ScanHistory row.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Seconds; wide enough for a 5ms DB write and a 30s PDF render
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metrics: List["_Metric"] = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_text(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock() # DB writes are timed from worker threads too
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_label_text(self.labels, key)} {value:g}" for key, value in values]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._values: Dict[Tuple, list] = {} # key -> [count per bucket (last is +Inf), sum]
+
+    def observe(self, seconds: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            entry[1] += seconds
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_label_text(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+class Gauge(_Metric):
+    """Read at scrape time from `read`, which returns a number or {label value: number}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable, label: Optional[str] = None):
+        super().__init__(name, help, (label,) if label else ())
+        self.read = read
+
+    def samples(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return [] # a gauge that cannot be read right now is left out of this scrape
+        if isinstance(value, dict):
+            return [f"{self.name}{_label_text(self.labels, (key,))} {number:g}" for key, number in value.items()]
+        return [f"{self.name} {value:g}"]
+
+def render() -> str:
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+CHECKER_SECONDS = Histogram("shieldscan_checker_seconds", "Checker run time (runs served from the result cache excluded)", ("checker",))
+CHECKER_ERRORS = Counter("shieldscan_checker_errors_total", "Checker runs that raised or returned an error", ("checker",))
+CHECKER_TIMEOUTS = Counter("shieldscan_checker_timeouts_total", "Checkers cut off by the scan deadline", ("checker",))
+SCAN_SECONDS = Histogram("shieldscan_scan_seconds", "Checkers plus scoring for one report")
+OUTBOUND_SECONDS = Histogram("shieldscan_outbound_request_seconds", "Outbound request time, politeness wait excluded", ("kind",))
+OUTBOUND_WAIT_SECONDS = Histogram("shieldscan_outbound_wait_seconds", "Time spent waiting for a politeness slot", ("kind",))
+OUTBOUND_ERRORS = Counter("shieldscan_outbound_errors_total", "Outbound requests that failed (connect, TLS, read)", ("kind",))
+OUTBOUND_THROTTLED = Counter("shieldscan_outbound_throttled_total", "429 / 503 with Retry-After responses from targets")
+OPERATION_SECONDS = Histogram("shieldscan_operation_seconds", "Summaries, PDF renders and database writes", ("operation",))
+OPERATION_ERRORS = Counter("shieldscan_operation_errors_total", "Failed summaries, PDF renders and database writes", ("operation",))
+
+_trace: ContextVar[Optional[dict]] = ContextVar("scan_trace", default=None)
+
+def current_trace() -> Optional[dict]:
+    return _trace.get()
+
+@contextmanager
+def scan_trace() -> Iterator[dict]:
+    """
+    Collects the timing breakdown of the scan run inside the block. Tasks started inside
+    it (checkers, fetches) inherit it. The dict is complete when the block exits.
+    """
+    trace = {"total_ms": None, "checkers": {}, "outbound": {"requests": 0, "errors": 0, "ms": 0.0, "wait_ms": 0.0}}
+    token = _trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        elapsed = time.perf_counter() - started
+        try:
+            _trace.reset(token)
+        except ValueError:
+            pass # a streaming response closed from another task after its client went away
+        SCAN_SECONDS.observe(elapsed)
+        trace["total_ms"] = round(elapsed * 1000, 1)
+        outbound = trace["outbound"]
+        outbound["ms"], outbound["wait_ms"] = round(outbound["ms"], 1), round(outbound["wait_ms"], 1)
+
+def record_outbound(kind: str, wait: float, elapsed: float, failed: bool):
+    OUTBOUND_WAIT_SECONDS.observe(wait, kind=kind)
+    OUTBOUND_SECONDS.observe(elapsed, kind=kind)
+    if failed:
+        OUTBOUND_ERRORS.inc(kind=kind)
+    trace = _trace.get()
+    # Requests cancelled after the scan finished are left out of its (already stored) breakdown
+    if trace is not None and trace["total_ms"] is None:
+        outbound = trace["outbound"]
+        outbound["requests"] += 1
+        outbound["errors"] += failed
+        outbound["ms"] += elapsed * 1000
+        outbound["wait_ms"] += wait * 1000
+
+class Timer:
+    ms: Optional[float] = None
+
+@contextmanager
+def timed(operation: str) -> Iterator[Timer]:
+    """Times the block into shieldscan_operation_seconds; an exception also counts as an error."""
+    timer = Timer()
+    started = time.perf_counter()
+    try:
+        yield timer
+    except Exception:
+        OPERATION_ERRORS.inc(operation=operation)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        OPERATION_SECONDS.observe(elapsed, operation=operation)
+        timer.ms = round(elapsed * 1000, 1)
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# Tests import the backend's modules the way main.py does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# database.py builds its engines at import: point them at a throwaway file, never ./shieldscan.db
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="shieldscan-tests-"), "test.db")
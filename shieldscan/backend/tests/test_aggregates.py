@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from database import Base
+from models.db import DomainScore, GradeCount, IssuePrevalence, ScanHistory, ScanIssue
+import aggregates
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+def add_scan(session, url, grade, keys, score=50):
+    scan = ScanHistory.from_result({"url": url, "score": score, "grade": grade,
+                                    "issues": [{"key": key, "title": key, "score_impact": 10} for key in keys]})
+    session.add(scan)
+    session.flush()
+    return scan
+
+def totals(session):
+    # Counters that dropped to zero stay as rows when maintained incrementally; rebuild omits them
+    return {
+        "domains": {row.domain: (row.scan_id, row.score, row.grade, row.issue_keys)
+                    for row in session.scalars(select(DomainScore))},
+        "issues": {row.issue_key: row.sites for row in session.scalars(select(IssuePrevalence)) if row.sites},
+        "grades": {row.grade: row.sites for row in session.scalars(select(GradeCount)) if row.sites},
+    }
+
+def test_recorded_aggregates_match_a_rebuild(session):
+    first = add_scan(session, "https://a.example", "B", ["missing_csp", "missing_hsts"])
+    other = add_scan(session, "https://b.example/", "A", [], score=95)
+    aggregates.record_scans(session, [aggregates.scan_facts(first), aggregates.scan_facts(other)])
+
+    # The same domain under another spelling replaces its earlier scan
+    latest = add_scan(session, "https://A.example/login", "C", ["missing_csp", "mcp_exposed"])
+    blocked = add_scan(session, "https://c.example", "F", ["blacklisted"], score=10)
+    aggregates.record_scans(session, [aggregates.scan_facts(blocked)])
+    aggregates.record_scans(session, [aggregates.scan_facts(latest)])
+    # Finishing out of order: an older scan of a.example must not undo the newer one
+    aggregates.record_scans(session, [aggregates.scan_facts(first)])
+
+    # Re-scored in place: the scan replaces its own contribution
+    latest.grade, latest.score = "D", 45
+    latest.issues = [ScanIssue.from_issue({"key": "mcp_exposed", "title": "mcp_exposed"}, latest.target_url)]
+    session.flush()
+    aggregates.record_scans(session, [aggregates.scan_facts(latest)])
+
+    recorded = totals(session)
+    assert recorded == {
+        "domains": {
+            "a.example": (latest.id, 45, "D", ["mcp_exposed"]),
+            "b.example": (other.id, 95, "A", []),
+            "c.example": (blocked.id, 10, "F", ["blacklisted"]),
+        },
+        "issues": {"mcp_exposed": 1, "blacklisted": 1},
+        "grades": {"A": 1, "D": 1, "F": 1},
+    }
+
+    assert aggregates.rebuild(session, batch_size=2) == 3
+    assert totals(session) == recorded
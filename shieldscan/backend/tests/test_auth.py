@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ec
+
+import auth
+from auth import SessionVerifier, StreamTickets
+
+SECRET = "test-secret-at-least-32-bytes-long!"
+SUPABASE_URL = "https://project.supabase.co"
+
+def token(key=SECRET, algorithm="HS256", kid=None, **claims):
+    claims = {"sub": "user-1", "aud": "authenticated", "iss": f"{SUPABASE_URL}/auth/v1",
+              "exp": int(time.time()) + 3600, **claims}
+    return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": kid} if kid else None)
+
+def verify(verifier, value):
+    return asyncio.run(verifier.verify(value))
+
+def test_valid_token_names_the_user():
+    assert verify(SessionVerifier(SECRET, SUPABASE_URL), token()) == "user-1"
+
+def test_expired_token_is_rejected():
+    verifier = SessionVerifier(SECRET, SUPABASE_URL)
+    assert verify(verifier, token(exp=int(time.time()) - auth.CLOCK_SKEW_SECONDS - 60)) is None
+    # Within the allowed clock skew it still counts
+    assert verify(verifier, token(exp=int(time.time()) - 1)) == "user-1"
+
+def test_token_without_expiry_is_rejected():
+    claims = {"sub": "user-1", "aud": "authenticated", "iss": f"{SUPABASE_URL}/auth/v1"}
+    assert verify(SessionVerifier(SECRET, SUPABASE_URL), jwt.encode(claims, SECRET, algorithm="HS256")) is None
+
+def test_token_for_another_audience_is_rejected():
+    # Supabase tokens carry no azp; the audience is what tells a signed-in user from the anon key
+    verifier = SessionVerifier(SECRET, SUPABASE_URL)
+    assert verify(verifier, token(aud="anon")) is None
+    assert verify(verifier, token(iss="https://other.supabase.co/auth/v1")) is None
+    assert verify(verifier, token(key="another-secret-at-least-32-bytes!")) is None
+
+def test_unknown_key_id_refetches_the_key_set_at_most_once_a_minute():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    verifier = SessionVerifier(None, SUPABASE_URL)
+    fetches = []
+
+    async def refresh():
+        fetches.append(time.monotonic())
+        verifier._fetched_at = time.monotonic()
+        verifier._keys = {"known": private_key.public_key()}
+    verifier._refresh = refresh
+
+    assert verify(verifier, token(private_key, "ES256", kid="known")) == "user-1"
+    assert len(fetches) == 1
+    assert verify(verifier, token(private_key, "ES256", kid="unknown")) is None
+    assert verify(verifier, token(private_key, "ES256", kid="unknown")) is None
+    # Right after a fetch an unknown key id does not trigger another one
+    assert len(fetches) == 1
+
+    verifier._fetched_at -= auth.JWKS_MIN_REFRESH_SECONDS + 1
+    assert verify(verifier, token(private_key, "ES256", kid="unknown")) is None
+    assert len(fetches) == 2
+
+def test_stream_ticket_is_single_use_and_expires():
+    tickets = StreamTickets()
+    ticket = tickets.issue("user-1")
+    assert tickets.redeem(ticket) == "user-1"
+    assert tickets.redeem(ticket) is None
+
+    expired = StreamTickets(ttl=-1)
+    assert expired.redeem(expired.issue("user-1")) is None
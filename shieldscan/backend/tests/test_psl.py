@@ -0,0 +1,25 @@
+import pytest
+
+from scanners.psl import get_psl
+
+@pytest.mark.parametrize("hostname, expected", [
+    ("example.com", "example.com"),
+    ("www.example.com", "example.com"),
+    ("shop.example.co.uk", "example.co.uk"),
+    ("Mail.Example.CO.UK.", "example.co.uk"),
+    # Wildcard rule *.ck: every second-level name is itself a public suffix
+    ("a.b.ck", "a.b.ck"),
+    # Exception rule !www.ck cuts the wildcard short
+    ("www.ck", "www.ck"),
+    ("x.www.ck", "www.ck"),
+    ("x.city.kawasaki.jp", "city.kawasaki.jp"),
+    ("a.b.kawasaki.jp", "a.b.kawasaki.jp"),
+    # An unknown TLD is a public suffix by the implicit * rule
+    ("host.example.unknowntld", "example.unknowntld"),
+])
+def test_registrable_domain(hostname, expected):
+    assert get_psl().registrable_domain(hostname) == expected
+
+@pytest.mark.parametrize("hostname", ["com", "co.uk", "b.ck", "x.kawasaki.jp", "192.0.2.1", "2001:db8::1"])
+def test_public_suffixes_and_addresses_have_no_registrable_domain(hostname):
+    assert get_psl().registrable_domain(hostname) is None
@@ -0,0 +1,36 @@
+from scoring.rules import compile_rules, evaluate, evaluate_report, grade_for
+
+def keys(result):
+    return [issue["key"] for issue in result["issues"]]
+
+def test_timed_out_checker_is_not_penalized():
+    result = evaluate({"headers": {"timed_out": True, "headers": {}}, "dmarc": {"timed_out": True}})
+    assert result["issues"] == []
+    assert (result["score"], result["grade"]) == (100, "A")
+
+def test_on_timeout_rule_runs_on_a_timed_out_result():
+    # No handshake before the deadline and no root page either: the site is treated as having no valid TLS
+    result = evaluate({"ssl": {"timed_out": True}, "headers": {"success": False}})
+    assert keys(result) == ["ssl_invalid"]
+    # The root page loaded, so the timeout is just a slow handshake
+    assert evaluate({"ssl": {"timed_out": True}, "headers": {"success": True}})["issues"] == []
+
+def test_rules_without_on_timeout_skip_timed_out_results():
+    rules = compile_rules([
+        {"key": "missing_dmarc", "checker": "dmarc", "when": [("falsy", "has_dmarc")]},
+        {"key": "missing_csp", "checker": "headers", "on_timeout": True, "when": [("falsy", "headers.csp.present")]},
+    ])
+    result = evaluate({"dmarc": {"timed_out": True}, "headers": {"timed_out": True}}, rules=rules)
+    assert keys(result) == ["missing_csp"]
+
+def test_issues_carry_details_and_are_ordered_by_impact():
+    rules = compile_rules(weights={"missing_dmarc": 5, "mcp_exposed": 30})
+    result = evaluate({"mcp": {"exposed": True, "paths": ["/mcp"]}, "dmarc": {"has_dmarc": False}}, rules=rules)
+    assert keys(result) == ["mcp_exposed", "missing_dmarc"]
+    assert result["issues"][0]["details"] == {"exposed_paths": ["/mcp"]}
+    assert result["score"] == 65
+    assert result["grade"] == grade_for(65) == "C"
+
+def test_stored_report_timeouts_are_applied():
+    report = {"ssl_status": {"valid": False}, "headers_status": {"success": False}, "timed_out": ["ssl"]}
+    assert keys(evaluate_report(report)) == ["ssl_invalid"]
@@ -0,0 +1,46 @@
+from scanners.signatures import Automaton, Scan, SignatureDatabase
+
+def matches(automaton, text):
+    """(end offset, pattern) of every pattern occurrence, straight from the transition table."""
+    found, state = [], 0
+    for end, byte in enumerate(text, start=1):
+        state = automaton.delta[state][byte]
+        for pattern_id in automaton.outputs[state] or ():
+            found.append((end, automaton.patterns[pattern_id][0]))
+    return sorted(found)
+
+def test_overlapping_patterns_are_all_found():
+    automaton = Automaton([(b"he", False), (b"she", False), (b"his", False), (b"hers", False)])
+    assert matches(automaton, b"ushers") == [(4, b"he"), (4, b"she"), (6, b"hers")]
+    assert matches(automaton, b"ahishers") == [(4, b"his"), (6, b"he"), (6, b"she"), (8, b"hers")]
+
+def test_letters_are_case_folded():
+    automaton = Automaton([(b"password", False), (b"DB_", True)])
+    assert matches(automaton, b"PassWord db_") == [(8, b"password"), (12, b"DB_")]
+
+def test_case_sensitive_pattern_is_confirmed_on_a_hit():
+    automaton = Automaton([(b"password", False), (b"DB_", True)])
+    assert Scan(automaton, {1: "dotenv"}).feed(b"db_host=x") is None
+    assert Scan(automaton, {1: "dotenv"}).feed(b"DB_HOST=x") == "dotenv"
+    assert Scan(automaton, {0: "login"}).feed(b"<input name=PASSWORD>") == "login"
+
+def test_match_spanning_chunks():
+    automaton = Automaton([(b"CREATE TABLE", True)])
+    scan = Scan(automaton, {0: "sql_dump"})
+    assert scan.feed(b"-- dump\nCREAT") is None
+    assert scan.feed(b"E TABLE users") == "sql_dump"
+
+    # The case-sensitive confirmation looks back into the previous chunk too
+    scan = Scan(automaton, {0: "sql_dump"})
+    assert scan.feed(b"create tab") is None
+    assert scan.feed(b"le users") is None
+
+def test_only_wanted_signatures_are_reported():
+    database = SignatureDatabase([
+        {"id": "git_config", "finding": "sensitive", "body": ["repositoryformatversion"]},
+        {"id": "login_page", "finding": "admin", "body": ["Sign In"], "ignore_case": True},
+    ])
+    body = b"[core]\nrepositoryformatversion = 0\n<a>SIGN IN</a>"
+    assert database.scan(["login_page"]).feed(body) == "login_page"
+    assert database.scan(["git_config"]).feed(body) == "git_config"
+    assert database.scan(["git_config"]).feed(b"<a>SIGN IN</a>") is None
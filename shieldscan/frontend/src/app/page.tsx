@@ -21,9 +21,11 @@ interface ScanResult {
   grade: string;
   issues: Issue[];
   ai_summary: string;
+  ai_summary_pending?: boolean;
 }
 import { motion, AnimatePresence } from "framer-motion";
 import clsx from "clsx";
+import { createClient } from "@/utils/supabase/client";
 
 export default function Home() {
   const [url, setUrl] = useState("");
@@ -33,6 +35,7 @@ export default function Home() {
   const [error, setError] = useState("");
   const [expandedIssue, setExpandedIssue] = useState<number | null>(null);
   const [isPremium, setIsPremium] = useState(false);
+  const [progress, setProgress] = useState<{ completed: number; total: number; score: number; grade: string } | null>(null);
 
   useEffect(() => {
     if (typeof window !== "undefined") {
@@ -77,33 +80,69 @@ export default function Home() {
     setIsScanning(true);
     setError("");
     setResult(null);
+    setProgress(null);
 
-    try {
-      const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
-      const res = await fetch(`${apiUrl}/api/scan`, {
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
+    let streamUrl = `${apiUrl}/api/scan/stream?url=${encodeURIComponent(formattedUrl)}`;
+    // EventSource cannot send the access token, so signed-in users trade it for a single-use ticket;
+    // the scan then counts against their plan and lands in their history
+    const { data: { session } } = await createClient().auth.getSession();
+    if (session) {
+      const ticket = await fetch(`${apiUrl}/api/scan/stream/ticket`, {
         method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
-        body: JSON.stringify({ url: formattedUrl }),
-      });
-
-      if (!res.ok) {
-        throw new Error("Failed to scan website.");
-      }
-
-      const data = await res.json();
+        headers: { Authorization: `Bearer ${session.access_token}` },
+      }).then((response) => (response.ok ? response.json() : null)).catch(() => null);
+      if (ticket) streamUrl += `&ticket=${encodeURIComponent(ticket.ticket)}`;
+    }
+    // Checker results stream in as they finish; the last event is the saved report
+    const scan = new EventSource(streamUrl);
+    let finished = false;
+
+    scan.addEventListener("checker", (event) => {
+      const { completed, total, score, grade } = JSON.parse((event as MessageEvent).data);
+      setProgress({ completed, total, score, grade });
+    });
+
+    scan.addEventListener("result", (event) => {
+      finished = true;
+      scan.close();
+      const data: ScanResult = JSON.parse((event as MessageEvent).data);
       setResult(data);
+      setProgress(null);
+      setIsScanning(false);
       localStorage.setItem("lastScanResult", JSON.stringify(data));
-    } catch (err: unknown) {
-      if (err instanceof Error) {
-        setError(err.message);
-      } else {
-        setError("An error occurred");
+
+      // The AI summary is generated after the scan returns; swap it in when it arrives
+      if (data.id && data.ai_summary_pending) {
+        const events = new EventSource(`${apiUrl}/api/scans/${data.id}/summary`);
+        events.addEventListener("summary", (event) => {
+          const { ai_summary } = JSON.parse((event as MessageEvent).data);
+          setResult((prev) => {
+            if (!prev || prev.id !== data.id) return prev;
+            const next = { ...prev, ai_summary, ai_summary_pending: false };
+            localStorage.setItem("lastScanResult", JSON.stringify(next));
+            return next;
+          });
+          events.close();
+        });
+        events.onerror = () => events.close();
       }
-    } finally {
+    });
+
+    const fail = (message: string) => {
+      finished = true;
+      scan.close();
+      setProgress(null);
       setIsScanning(false);
-    }
+      setError(message);
+    };
+    scan.addEventListener("failed", (event) => {
+      fail(JSON.parse((event as MessageEvent).data).detail || "Failed to scan website.");
+    });
+    // Refused (e.g. rate limited) or dropped connections only show up here
+    scan.onerror = () => {
+      if (!finished) fail("Failed to scan website.");
+    };
   };
 
   return (
@@ -214,7 +253,11 @@ export default function Home() {
                 <Shield className="w-12 h-12 text-emerald-500 absolute top-1/2 left-1/2 transform -translate-x-1/2 -translate-y-1/2" />
               </div>
               <h2 className="text-2xl font-semibold mb-2">Analyzing Target...</h2>
-              <p className="text-slate-400">Checking SSL, headers, and AI specific attack surfaces.</p>
+              <p className="text-slate-400">
+                {progress
+                  ? `${progress.completed} of ${progress.total} checks done · score so far ${progress.score} (${progress.grade})`
+                  : "Checking SSL, headers, and AI specific attack surfaces."}
+              </p>
             </motion.div>
           )}
 